@@ -0,0 +1,388 @@
+"""Reproducible benchmarks for the editor's search, replace and file I/O paths.
+
+    python regex_bench.py                                   default suite (1M and 10M corpora), printed as a table
+    python regex_bench.py --sizes 1M,100M,1G --json out.json
+    python regex_bench.py --save-baseline                   store this run as the baseline
+    python regex_bench.py --compare                         flag results slower than the baseline
+
+Corpora (logs, CSV, prose) are generated from fixed seeds and cached in --corpus-dir, so every run
+and every machine scans the same text. Each pattern in the catalogue (literal-heavy,
+alternation-heavy, backtracking-prone) is timed through the matching core that Find All, Find Next
+and Replace All use, and, when a display is available, through the editor's Tk widget as well
+(a private Xvfb server is started if DISPLAY is unset and Xvfb is installed).
+
+Exit status is 0, 1 if --compare flagged a regression, and 2 on errors.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from bisect import bisect_right
+
+from regex_core import (LineIndex, LiteralPrefilter, STREAM_CHUNK_SIZE, compile_pattern, match_batches, read_chunks,
+                        replacement_regions, stream_scan)
+
+DEFAULT_SIZES = "1M,10M"
+CORPUS_KINDS = ("logs", "csv", "prose")
+CORPUS_DIR = os.path.expanduser("~/.cache/regex_editor/bench")
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+DEFAULT_REPEAT = 3 # Runs per benchmark; the fastest is reported (the least disturbed by other load)
+DEFAULT_THRESHOLD = 0.15 # Slowdown over the baseline flagged as a regression
+MIN_REGRESSION_SECONDS = 0.005 # Differences below this are noise, whatever the ratio
+FIND_NEXT_STEPS = 1000
+REPLACE_MERGE_GAP = 80 # As in the editor
+WIDGET_WAIT_SECONDS = 600.0 # Longest a widget benchmark may wait for the editor's worker
+
+# (category, id, pattern, flags, replacement); every pattern runs on every corpus
+PATTERNS = [
+    ("literal", "plain", "ERROR", 0, "ERR"),
+    ("literal", "word", r"\bthe\b", 0, "THE"),
+    ("literal", "inner", r"\w+@example\.com", 0, "<email>"),
+    ("literal", "ignore-case", r"timeout", re.IGNORECASE, "TIMEOUT"),
+    ("alternation", "levels", r"\b(?:ERROR|WARN|FATAL|CRITICAL|DEBUG)\b", 0, "<level>"),
+    ("alternation", "nouns", r"\b(?:time|year|people|way|day|man|thing|woman|life|child|world)\b", 0, "<noun>"),
+    ("alternation", "ignore-case", r"\b(?:refused|reset|unreachable|timeout|denied)\b", re.IGNORECASE, "<net>"),
+    ("backtracking", "greedy-line", r"^.*(\d+)ms.*$", re.MULTILINE, r"\1"),
+    ("backtracking", "adjacent-words", r"\w+\s*\w+=", 0, "="),
+    ("backtracking", "nested-digits", r"(\d+)+\.", 0, "."),
+]
+
+# --- Corpora ---
+WORDS = ("the of and to in is was for that with on as by at from this be are it an or have not which but had his "
+         "they were her been one all their has there would will more when who time year people way day man thing "
+         "woman life child world system request server client timeout refused reset unreachable denied retry "
+         "connection session user account value error warning failed started finished").split()
+LEVELS = ("INFO",) * 17 + ("WARN", "WARN", "ERROR", "DEBUG")
+COMPONENTS = ("api", "db", "auth", "cache", "scheduler", "worker", "http")
+NAMES = ("alice", "bob", "carol", "dave", "erin", "frank", "grace", "heidi", "ivan", "judy")
+COUNTRIES = ("DE", "FR", "US", "GB", "JP", "BR", "IN", "NL")
+
+def _words(rng, count):
+    # Rank-weighted choice gives prose a Zipf-like word distribution
+    return rng.choices(WORDS, cum_weights=_CUMULATIVE_WEIGHTS, k=count)
+
+_CUMULATIVE_WEIGHTS = []
+for _rank in range(len(WORDS)):
+    _CUMULATIVE_WEIGHTS.append((_CUMULATIVE_WEIGHTS[-1] if _CUMULATIVE_WEIGHTS else 0) + 1 / (_rank + 1))
+
+def _log_line(rng, n):
+    level = rng.choice(LEVELS)
+    message = " ".join(_words(rng, rng.randint(4, 12)))
+    line = (f"2024-{1 + n % 12:02d}-{1 + n % 28:02d}T{n % 24:02d}:{n % 60:02d}:{n * 7 % 60:02d}.{n % 1000:03d}Z {level} "
+            f"[{rng.choice(COMPONENTS)}] {message} user={rng.choice(NAMES)}@example.com ip=10.{n % 256}.{n * 3 % 256}.{n * 7 % 256} "
+            f"took={rng.randint(1, 99999)}ms")
+    return line + (f" status=failed reason={rng.choice(('timeout', 'refused', 'reset'))}\n" if level == "ERROR" else "\n")
+
+def _csv_line(rng, n):
+    if n == 0:
+        return "id,name,email,amount,date,country,note\n"
+    name = rng.choice(NAMES)
+    return (f"{n},{name.title()},{name}.{n % 977}@example.com,{rng.randint(1, 99999)}.{rng.randint(0, 99):02d},"
+            f"2024-{1 + n % 12:02d}-{1 + n % 28:02d},{rng.choice(COUNTRIES)},\"{' '.join(_words(rng, rng.randint(2, 8)))}\"\n")
+
+def _prose_line(rng, n):
+    sentences = []
+    for _ in range(rng.randint(2, 6)):
+        words = _words(rng, rng.randint(6, 20))
+        sentences.append(" ".join(words).capitalize() + rng.choice(".....?!"))
+    return " ".join(sentences) + ("\n\n" if n % 5 == 4 else "\n")
+
+LINE_GENERATORS = {"logs": _log_line, "csv": _csv_line, "prose": _prose_line}
+
+def parse_size(text):
+    """'512K', '10M' or '1G' (binary units) -> characters."""
+    match = re.fullmatch(r"(\d+)([KMG]?)", text.strip().upper())
+    if not match:
+        raise ValueError(f"bad size {text!r}; use e.g. 512K, 10M or 1G")
+    return int(match.group(1)) * {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}[match.group(2)]
+
+def corpus_path(corpus_dir, kind, size):
+    """Generate the kind/size corpus in corpus_dir unless it is already there; returns its path.
+
+    The text is ASCII, so its size in characters and bytes agree; it ends on a whole line.
+    """
+    path = os.path.join(corpus_dir, f"{kind}-{size}.txt")
+    if os.path.exists(path) and os.path.getsize(path) == size:
+        return path
+    os.makedirs(corpus_dir, exist_ok=True)
+    rng = random.Random(f"{kind}-{size}") # Same seed, same text, on every machine
+    make_line = LINE_GENERATORS[kind]
+    fd, temp_path = tempfile.mkstemp(dir=corpus_dir, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="ascii", newline="") as f:
+        written, n = 0, 0
+        while written < size:
+            pieces = []
+            for _ in range(1000):
+                pieces.append(make_line(rng, n))
+                n += 1
+            block = "".join(pieces)[:size - written]
+            f.write(block)
+            written += len(block)
+    os.replace(temp_path, path)
+    return path
+
+# --- Timing ---
+def measure(function, repeat, setup=None):
+    """Run function repeat times (after setup, untimed); returns (seconds of each run, the last run's result)."""
+    runs, result = [], None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        result = function()
+        runs.append(time.perf_counter() - started)
+    return runs, result
+
+def record(results, name, runs, chars, matches=None):
+    results[name] = {"seconds": min(runs), "runs": [round(run, 6) for run in runs], "chars": chars, "matches": matches}
+    seconds = min(runs)
+    rate = f"{chars / seconds / 1e6:10,.1f} MB/s" if chars and seconds else " " * 15
+    print(f"{name:70} {seconds:9.4f}s {rate}" + (f"  {matches:,} matches" if matches is not None else ""), flush=True)
+
+# --- Matching core ---
+def find_all_spans(text, pattern, flags):
+    """What the Find All worker does for an in-memory buffer: compile, prefilter, collect span batches."""
+    regex = compile_pattern.__wrapped__(pattern, flags) # Bypass the cache so compiling is timed too
+    starts, ends = [], []
+    for batch_starts, batch_ends, _, _ in match_batches(regex, text, prefilter=LiteralPrefilter.for_pattern(pattern, flags)):
+        starts.extend(batch_starts)
+        ends.extend(batch_ends)
+    return starts, ends
+
+def replace_all_regions(text, pattern, flags, replacement):
+    """The Replace All worker's expansion plus the grouping into widget edits, applied to a string instead of Tk."""
+    regex = compile_pattern(pattern, flags)
+    starts, ends, replacements = [], [], []
+    for batch in match_batches(regex, text, replacement=replacement, prefilter=LiteralPrefilter.for_pattern(pattern, flags)):
+        starts.extend(batch[0])
+        ends.extend(batch[1])
+        replacements.extend(batch[2])
+    regions = list(replacement_regions(text, starts, ends, replacements, REPLACE_MERGE_GAP))
+    pieces, previous_end = [], 0
+    for start, end, new_text in regions:
+        pieces.append(text[previous_end:start])
+        pieces.append(new_text)
+        previous_end = end
+    pieces.append(text[previous_end:])
+    return "".join(pieces), len(starts)
+
+def step_matches(text, starts, ends, steps):
+    """Find Next stepping: bisect from the cursor, then map the span to widget indices."""
+    line_index = LineIndex(text)
+    cursor = 0
+    for _ in range(steps):
+        i = bisect_right(starts, cursor)
+        if i == len(starts):
+            i = 0 # Wrap around
+        line_index.to_index(starts[i])
+        line_index.to_index(ends[i])
+        cursor = starts[i]
+
+def stream_find_all(path, pattern, flags):
+    """Large-file mode's scan: stream the file in chunks."""
+    regex = compile_pattern(pattern, flags)
+    prefilter = LiteralPrefilter.for_pattern(pattern, flags)
+    with open(path, "r", encoding="utf-8", errors="replace", newline="") as f:
+        return sum(1 for _, match, _, _, _ in stream_scan(read_chunks(f, STREAM_CHUNK_SIZE), regex, prefilter=prefilter) if match is not None)
+
+def core_benchmarks(results, path, label, patterns, repeat, scratch_dir):
+    """Time the headless paths for one corpus file."""
+    runs, text = measure(lambda: open(path, "r", encoding="utf-8").read(), repeat)
+    record(results, f"core/open/{label}", runs, len(text))
+    output_path = os.path.join(scratch_dir, "save.txt")
+    def save():
+        with open(output_path, "w", encoding="utf-8") as f:
+            f.write(text)
+    runs, _ = measure(save, repeat)
+    record(results, f"core/save/{label}", runs, len(text))
+
+    for category, pattern_id, pattern, flags, replacement in patterns:
+        name = f"{label}/{category}:{pattern_id}"
+        runs, (starts, ends) = measure(lambda: find_all_spans(text, pattern, flags), repeat)
+        record(results, f"core/find_all/{name}", runs, len(text), len(starts))
+        if starts:
+            runs, _ = measure(lambda: step_matches(text, starts, ends, FIND_NEXT_STEPS), repeat)
+            record(results, f"core/find_next_x{FIND_NEXT_STEPS}/{name}", runs, None)
+        runs, (_, count) = measure(lambda: replace_all_regions(text, pattern, flags, replacement), repeat)
+        record(results, f"core/replace_all/{name}", runs, len(text), count)
+        runs, count = measure(lambda: stream_find_all(path, pattern, flags), repeat)
+        record(results, f"core/find_all_streamed/{name}", runs, len(text), count)
+
+# --- Tk widget ---
+def start_display():
+    """Make sure Tk has a display: returns (ok, Xvfb process to stop afterwards or None, note)."""
+    if os.environ.get("DISPLAY") or sys.platform in ("darwin", "win32"):
+        return True, None, "native display"
+    xvfb = shutil.which("Xvfb")
+    if xvfb is None:
+        return False, None, "skipped: no DISPLAY and Xvfb is not installed"
+    for number in range(99, 120):
+        if os.path.exists(f"/tmp/.X11-unix/X{number}"):
+            continue
+        process = subprocess.Popen([xvfb, f":{number}", "-screen", "0", "1920x1080x24", "-nolisten", "tcp"],
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        for _ in range(50):
+            if os.path.exists(f"/tmp/.X11-unix/X{number}"):
+                os.environ["DISPLAY"] = f":{number}"
+                return True, process, f"Xvfb :{number}"
+            if process.poll() is not None:
+                break
+            time.sleep(0.1)
+        process.terminate()
+    return False, None, "skipped: Xvfb did not start"
+
+def _wait_for_job(editor):
+    """Pump the Tk event loop until the editor's search/replace worker or background save has finished."""
+    deadline = time.monotonic() + WIDGET_WAIT_SECONDS
+    while editor.search_job is not None or editor.save_job is not None:
+        if time.monotonic() > deadline:
+            raise RuntimeError("the editor's worker did not finish in time")
+        editor.root.update()
+        time.sleep(0.002)
+    editor.root.update_idletasks()
+
+def widget_benchmarks(results, path, label, patterns, repeat, scratch_dir):
+    """Time the same operations through a real RegexEditor: file loading, Find All, Find Next, Replace All and Save."""
+    import tkinter as tk
+    import regex_editor # Imported here so the headless benchmarks don't need Tk or the AI client
+    root = tk.Tk()
+    try:
+        editor = regex_editor.RegexEditor(root)
+        editor.live_search_var.set(False) # Typing patterns in below shouldn't start searches of its own
+        editor.search_time_budget = WIDGET_WAIT_SECONDS
+        root.update()
+        chars = os.path.getsize(path)
+        load = lambda: (editor._load_file(path), root.update_idletasks())
+        runs, _ = measure(load, repeat)
+        record(results, f"widget/open/{label}", runs, chars)
+        editor.current_file_path = os.path.join(scratch_dir, "save.txt")
+        runs, _ = measure(lambda: (editor.save_file(), _wait_for_job(editor)), repeat)
+        record(results, f"widget/save/{label}", runs, chars)
+
+        for category, pattern_id, pattern, flags, replacement in patterns:
+            name = f"{label}/{category}:{pattern_id}"
+            editor.pattern_entry.delete(0, tk.END)
+            editor.pattern_entry.insert(0, pattern)
+            editor.replace_entry.delete(0, tk.END)
+            editor.replace_entry.insert(0, replacement)
+            editor.ignore_case_var.set(bool(flags & re.IGNORECASE))
+            editor.multiline_var.set(bool(flags & re.MULTILINE))
+            editor.dotall_var.set(bool(flags & re.DOTALL))
+            editor._accepted_risks.add((pattern, flags)) # No backtracking warning dialog
+
+            runs, _ = measure(lambda: (editor.find_all(), _wait_for_job(editor)), repeat)
+            count = len(editor.match_spans) if editor.match_spans is not None else 0
+            record(results, f"widget/find_all/{name}", runs, chars, count)
+            if count:
+                editor.text_area.mark_set(tk.INSERT, "1.0")
+                def step():
+                    for _ in range(FIND_NEXT_STEPS):
+                        editor.find_next()
+                    root.update_idletasks()
+                runs, _ = measure(step, repeat)
+                record(results, f"widget/find_next_x{FIND_NEXT_STEPS}/{name}", runs, None)
+            runs, _ = measure(lambda: (editor.replace_all(), _wait_for_job(editor)), repeat, setup=load)
+            record(results, f"widget/replace_all/{name}", runs, chars, count)
+            load()
+    finally:
+        root.destroy()
+
+# --- Baselines ---
+def compare(results, baseline, threshold):
+    """Print how results moved against baseline; returns the names that regressed."""
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None or not before["seconds"]:
+            continue
+        ratio = result["seconds"] / before["seconds"]
+        regressed = ratio > 1 + threshold and result["seconds"] - before["seconds"] > MIN_REGRESSION_SECONDS
+        if regressed:
+            regressions.append(name)
+        if regressed or ratio < 1 - threshold:
+            print(f"{'REGRESSION' if regressed else 'improved':10} {name}: {before['seconds']:.4f}s -> {result['seconds']:.4f}s ({ratio:.2f}x)")
+    missing = sorted(set(baseline) - set(results))
+    if missing:
+        print(f"{len(missing)} baseline benchmarks were not run this time.")
+    return regressions
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="regex_bench.py", description="Benchmark the regex editor's search, replace and file I/O paths.")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help=f"corpus sizes, comma-separated (default {DEFAULT_SIZES}; e.g. 1M,10M,100M,1G)")
+    parser.add_argument("--kinds", default=",".join(CORPUS_KINDS), help=f"corpora to use (default {','.join(CORPUS_KINDS)})")
+    parser.add_argument("--patterns", default="", metavar="FILTER", help="only patterns whose category:id contains FILTER (e.g. literal, backtracking:nested)")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help=f"runs per benchmark, fastest reported (default {DEFAULT_REPEAT})")
+    parser.add_argument("--no-widget", action="store_true", help="skip the Tk widget benchmarks")
+    parser.add_argument("--corpus-dir", default=CORPUS_DIR, help=f"where generated corpora are cached (default {CORPUS_DIR})")
+    parser.add_argument("--json", metavar="FILE", help="write the results as JSON")
+    parser.add_argument("--baseline", default=BASELINE_FILE, metavar="FILE", help=f"baseline file (default {BASELINE_FILE})")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run's results as the baseline")
+    parser.add_argument("--compare", action="store_true", help="compare with the baseline; exit status 1 on a regression")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help=f"slowdown ratio flagged as a regression (default {DEFAULT_THRESHOLD})")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        sizes = [parse_size(size) for size in args.sizes.split(",") if size.strip()]
+    except ValueError as e:
+        print(f"regex_bench.py: {e}", file=sys.stderr)
+        return 2
+    kinds = [kind.strip() for kind in args.kinds.split(",") if kind.strip()]
+    unknown = [kind for kind in kinds if kind not in LINE_GENERATORS]
+    if unknown or args.repeat < 1:
+        print(f"regex_bench.py: unknown corpus kinds {unknown}" if unknown else "regex_bench.py: --repeat must be positive", file=sys.stderr)
+        return 2
+    patterns = [entry for entry in PATTERNS if args.patterns in f"{entry[0]}:{entry[1]}"]
+    baseline = None
+    if args.compare:
+        try:
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                baseline = json.load(f)["results"]
+        except (OSError, ValueError, KeyError) as e:
+            print(f"regex_bench.py: can't read baseline {args.baseline}: {e}", file=sys.stderr)
+            return 2
+
+    widget_ok, xvfb, widget_note = (False, None, "skipped: --no-widget") if args.no_widget else start_display()
+    print(f"Widget benchmarks: {widget_note}")
+    results = {}
+    try:
+        with tempfile.TemporaryDirectory(prefix="regex_bench-") as scratch_dir:
+            for size in sizes:
+                for kind in kinds:
+                    print(f"Preparing {kind} corpus of {size:,} chars...", flush=True)
+                    path = corpus_path(args.corpus_dir, kind, size)
+                    label = f"{kind}-{size // 1024 ** 2}M" if size >= 1024 ** 2 else f"{kind}-{size // 1024}K"
+                    core_benchmarks(results, path, label, patterns, args.repeat, scratch_dir)
+                    if widget_ok:
+                        widget_benchmarks(results, path, label, patterns, args.repeat, scratch_dir)
+    finally:
+        if xvfb is not None:
+            xvfb.terminate()
+
+    report = {"meta": {"python": sys.version.split()[0], "platform": platform.platform(), "machine": platform.machine(),
+                       "cpus": os.cpu_count(), "date": time.strftime("%Y-%m-%dT%H:%M:%S"), "sizes": sizes, "kinds": kinds,
+                       "repeat": args.repeat, "widget": widget_note},
+              "results": results}
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.baseline}.")
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold)
+        print(f"{len(regressions)} regressions beyond {args.threshold:.0%}." if regressions else "No regressions.")
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
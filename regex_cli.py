@@ -0,0 +1,233 @@
+"""Headless find/replace with the editor's regex semantics, streaming input in bounded chunks.
+
+    python regex_cli.py PATTERN [FILE ...]                   print matches as [file:]line:column:text
+    python regex_cli.py PATTERN --count [FILE ...]           print the number of matches
+    python regex_cli.py PATTERN -r REPLACEMENT [FILE ...]    write the replaced text to stdout
+    python regex_cli.py PATTERN -r REPLACEMENT --in-place FILE ...
+    python regex_cli.py --recipe NAME [--in-place] [FILE ...]  apply a recipe saved in the editor
+    python regex_cli.py PATTERN --extract [--format jsonl] [FILE ...]   write each match and its groups as CSV/JSONL rows
+    python regex_cli.py PATTERN --count-by GROUP [--top K] [--histogram GROUP] [FILE ...]   summarize group values
+
+With no FILE (or FILE "-") standard input is read. Exit status is 0 if anything matched,
+1 if nothing did and 2 on errors, like grep.
+"""
+import argparse
+import io
+import os
+import re
+import sys
+
+from regex_core import (COUNT_CAPACITY, EXTRACT_FORMATS, RECIPES_FILE, STREAM_CHUNK_SIZE, STREAM_MARGIN, GroupCounter, Histogram, LiteralPrefilter,
+                        RowWriter, compile_pattern, extract, extract_columns, load_recipes, read_chunks, recipe_in_file, regex_flags,
+                        replace_in_file, resolve_group, stream_recipe, stream_replace, stream_scan)
+
+# surrogateescape + newline="" pass undecodable bytes and \r\n endings through unchanged
+ENCODING_ARGS = dict(encoding="utf-8", errors="surrogateescape", newline="")
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="regex_cli.py", description="Find or replace a regex in files or stdin without starting the editor.")
+    parser.add_argument("pattern", nargs="?", help="Python regular expression (omit with --recipe)")
+    parser.add_argument("files", nargs="*", metavar="FILE", help="files to process (default: stdin)")
+    parser.add_argument("-r", "--replace", metavar="REPLACEMENT", help="replacement template (\\1, \\g<name> ...); output goes to stdout unless --in-place")
+    parser.add_argument("-i", "--ignore-case", action="store_true", help="re.IGNORECASE")
+    parser.add_argument("-m", "--multiline", action="store_true", help="re.MULTILINE: ^ and $ match at every line")
+    parser.add_argument("-s", "--dotall", action="store_true", help="re.DOTALL: . matches newlines")
+    parser.add_argument("-c", "--count", action="store_true", help="only print the number of matches")
+    parser.add_argument("--in-place", action="store_true", help="rewrite each FILE with the replacements (requires --replace or --recipe)")
+    parser.add_argument("--recipe", metavar="NAME", help="apply the saved recipe NAME (its rules, in order) instead of PATTERN/--replace")
+    parser.add_argument("--recipes-file", default=RECIPES_FILE, metavar="PATH", help=f"where recipes are saved (default {RECIPES_FILE})")
+    parser.add_argument("--list-recipes", action="store_true", help="print the saved recipes and exit")
+    parser.add_argument("--extract", action="store_true", help="write line, column, offset, match and every group of each match as rows")
+    parser.add_argument("--format", choices=EXTRACT_FORMATS, default="csv", help="row format for --extract, --count-by and --histogram (default csv)")
+    parser.add_argument("--count-by", metavar="GROUP", help="count how often each value of GROUP (a name or number; 0 is the whole match) occurs")
+    parser.add_argument("--top", type=int, metavar="K", help="with --count-by, only list the K most frequent values")
+    parser.add_argument("--max-values", type=int, default=COUNT_CAPACITY, metavar="N",
+                        help=f"distinct values --count-by keeps once there are too many to count exactly (default {COUNT_CAPACITY})")
+    parser.add_argument("--histogram", metavar="GROUP", help="bucket the numeric values of GROUP by powers of two")
+    parser.add_argument("--max-match", type=int, default=STREAM_MARGIN, metavar="CHARS",
+                        help=f"longest match guaranteed to be found across chunk boundaries (default {STREAM_MARGIN})")
+    parser.add_argument("--chunk-size", type=int, default=STREAM_CHUNK_SIZE, metavar="CHARS", help=f"characters read at a time (default {STREAM_CHUNK_SIZE})")
+    return parser
+
+def open_input(name):
+    if name == "-":
+        return io.TextIOWrapper(sys.stdin.buffer, **ENCODING_ARGS)
+    return open(name, "r", **ENCODING_ARGS)
+
+def find_matches(stream, regex, args, output, prefix, prefilter=None):
+    """Print every match (or just count them); returns the number found."""
+    count = 0
+    for _, match, _, line, column in stream_scan(read_chunks(stream, args.chunk_size), regex, args.max_match, prefilter):
+        if match is None:
+            continue
+        count += 1
+        if not args.count:
+            text = match.group().replace("\n", "\\n") # Keep one match per output line
+            output.write(f"{prefix}{line + 1}:{column + 1}:{text}\n")
+    return count
+
+def run_extract(args, regex, flags, names, output):
+    """--extract/--count-by/--histogram: stream every input once; returns (matches, whether any input failed).
+
+    Rows are written as the scan goes, and the summaries follow them (each CSV table after a blank line).
+    """
+    aggregates = []
+    if args.count_by is not None:
+        aggregates.append(GroupCounter(resolve_group(regex, args.count_by), max(args.max_values, args.top or 0), args.count_by))
+    if args.histogram is not None:
+        aggregates.append(Histogram(resolve_group(regex, args.histogram), args.histogram))
+    writer = None
+    if args.extract:
+        columns = (["file"] if len(names) > 1 else []) + extract_columns(regex)
+        writer = RowWriter(output, columns, args.format)
+    total, failed = 0, False
+    for name in names:
+        try:
+            prefilter = LiteralPrefilter.for_pattern(args.pattern, flags)
+            with open_input(name) as stream:
+                total += extract(read_chunks(stream, args.chunk_size), regex, writer, aggregates, args.max_match, prefilter,
+                                 (name,) if len(names) > 1 else ())
+        except BrokenPipeError:
+            raise
+        except OSError as e:
+            print(f"regex_cli.py: {name}: {e}", file=sys.stderr)
+            failed = True
+    for aggregate in aggregates:
+        if isinstance(aggregate, GroupCounter):
+            columns, rows = aggregate.table(args.top)
+            if not aggregate.exact:
+                print(f"regex_cli.py: group {aggregate.name} took too many distinct values to count exactly; counts may overstate by up to their error",
+                      file=sys.stderr)
+        else:
+            columns, rows = aggregate.table()
+            mean = "" if aggregate.mean is None else f", min {aggregate.min:g}, max {aggregate.max:g}, mean {aggregate.mean:g}"
+            print(f"regex_cli.py: histogram of group {aggregate.name}: {aggregate.count} values{mean}, {aggregate.skipped} not numeric", file=sys.stderr)
+        if args.format == "csv" and (writer is not None or aggregate is not aggregates[0]):
+            output.write("\n") # Blank line between CSV tables
+        table = RowWriter(output, columns, args.format)
+        for row in rows:
+            table.write(row)
+    return total, failed
+
+def list_recipes(recipes, output):
+    for name, rules in sorted(recipes.items()):
+        output.write(f"{name} ({len(rules)} rules)\n")
+        for rule in rules:
+            flags = "".join(letter for letter, bit in (("i", re.IGNORECASE), ("m", re.MULTILINE), ("s", re.DOTALL)) if rule.flags & bit)
+            output.write(f"    {rule.pattern!r} -> {rule.replacement!r}{' (' + flags + ')' if flags else ''}\n")
+
+def run_recipe(args, rules, names, output):
+    """--recipe: stream each input through the rules; returns (total replacements, whether any input failed)."""
+    total, failed = 0, False
+    for name in names:
+        try:
+            if args.in_place:
+                counts = recipe_in_file(name, rules, args.chunk_size, args.max_match)
+            else:
+                with open_input(name) as stream:
+                    counts, _ = stream_recipe(read_chunks(stream, args.chunk_size), rules,
+                                              (lambda text: None) if args.count else output.write, args.max_match)
+            if args.count:
+                output.write(f"{name}:{sum(counts)}\n" if len(names) > 1 or args.in_place else f"{sum(counts)}\n")
+            total += sum(counts)
+        except BrokenPipeError:
+            raise
+        except (OSError, re.error) as e:
+            print(f"regex_cli.py: {name}: {e}", file=sys.stderr)
+            failed = True
+    return total, failed
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_intermixed_args(argv) # Options may follow the FILE list
+    if args.list_recipes or args.recipe is not None:
+        try:
+            recipes = load_recipes(args.recipes_file)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"regex_cli.py: {args.recipes_file}: {e}", file=sys.stderr)
+            return 2
+        if args.list_recipes:
+            list_recipes(recipes, sys.stdout)
+            return 0
+        if args.recipe not in recipes:
+            print(f"regex_cli.py: no recipe named {args.recipe!r} in {args.recipes_file}", file=sys.stderr)
+            return 2
+        if args.pattern is not None: # With --recipe there's no PATTERN, so the first FILE landed there
+            args.files.insert(0, args.pattern)
+        if args.replace is not None:
+            parser.error("--recipe and --replace can't be combined")
+    elif args.pattern is None:
+        parser.error("PATTERN is required unless --recipe or --list-recipes is given")
+    if args.in_place and ((args.replace is None and args.recipe is None) or not args.files or "-" in args.files):
+        parser.error("--in-place needs --replace or --recipe and at least one FILE (not stdin)")
+    extracting = args.extract or args.count_by is not None or args.histogram is not None
+    if extracting and (args.recipe is not None or args.replace is not None or args.count or args.in_place):
+        parser.error("--extract, --count-by and --histogram can't be combined with --recipe, --replace, --count or --in-place")
+    if args.top is not None and (args.count_by is None or args.top < 1):
+        parser.error("--top needs --count-by and a positive K")
+    if args.max_match < 1 or args.chunk_size < 1:
+        parser.error("--max-match and --chunk-size must be positive")
+
+    if args.recipe is not None:
+        output = io.TextIOWrapper(sys.stdout.buffer, **ENCODING_ARGS)
+        try:
+            total, failed = run_recipe(args, recipes[args.recipe], args.files or ["-"], output)
+            output.flush()
+        except BrokenPipeError:
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+            return 0
+        if failed:
+            return 2
+        return 0 if total else 1
+
+    flags = regex_flags(args.ignore_case, args.multiline, args.dotall)
+    try:
+        regex = compile_pattern(args.pattern, flags)
+    except re.error as e:
+        print(f"regex_cli.py: invalid regular expression: {e}", file=sys.stderr)
+        return 2
+
+    names = args.files or ["-"]
+    output = io.TextIOWrapper(sys.stdout.buffer, **ENCODING_ARGS)
+    total, failed = 0, False
+    try:
+        if extracting:
+            total, failed = run_extract(args, regex, flags, names, output)
+        else:
+            for name in names:
+                try:
+                    if args.in_place:
+                        count = replace_in_file(name, args.pattern, flags, args.replace, args.chunk_size, args.max_match)
+                        if args.count:
+                            output.write(f"{name}:{count}\n")
+                    else:
+                        prefix = f"{name}:" if len(names) > 1 else ""
+                        prefilter = LiteralPrefilter.for_pattern(args.pattern, flags) # Fresh per file: it may fall back
+                        with open_input(name) as stream:
+                            if args.replace is not None:
+                                count = stream_replace(read_chunks(stream, args.chunk_size), regex, args.replace,
+                                                       (lambda text: None) if args.count else output.write, args.max_match, prefilter)
+                            else:
+                                count = find_matches(stream, regex, args, output, prefix, prefilter)
+                        if args.count:
+                            output.write(f"{prefix}{count}\n")
+                    total += count
+                except BrokenPipeError:
+                    raise
+                except (OSError, re.error) as e: # re.error: bad group reference in the replacement
+                    print(f"regex_cli.py: {name}: {e}", file=sys.stderr)
+                    failed = True
+        output.flush()
+    except ValueError as e: # --count-by/--histogram named a group the pattern doesn't have
+        print(f"regex_cli.py: {e}", file=sys.stderr)
+        return 2
+    except BrokenPipeError:
+        # Reader went away (e.g. piped into head); point stdout at devnull so the exit flush stays quiet
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 0
+    if failed:
+        return 2
+    return 0 if total else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
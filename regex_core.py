@@ -0,0 +1,1959 @@
+"""GUI-free regex matching core shared by the editor and the command-line tool.
+
+Everything here works on plain strings (or streams of them), so it can run in worker
+processes and batch jobs without importing Tk.
+"""
+import re
+import codecs
+import csv
+import os
+import json
+import fnmatch
+import tempfile
+import shutil
+import functools
+import heapq
+import math
+import queue
+import threading
+import time
+from collections import deque, namedtuple
+from contextlib import contextmanager, nullcontext
+from array import array # Compact line/match offset storage
+from bisect import bisect_left, bisect_right
+from itertools import accumulate, chain
+
+
+STREAM_CHUNK_SIZE = 1024 * 1024 # Characters/bytes read per chunk when streaming a document
+STREAM_MARGIN = 64 * 1024 # Longest match (lookahead included) guaranteed to be found across chunk boundaries
+STREAM_CONTEXT = 1024 # Text kept before the scan position so ^, \b and lookbehinds see what precedes it
+REPLACE_REGION_CHARS = 64 * 1024 # Most original text one grouped replacement edit may cover
+WRITER_PENDING_CHUNKS = 8 # Chunks a BackgroundWriter holds before write() blocks (bounds memory while saving)
+
+try:
+    import re._parser as sre_parse # Python 3.11+
+    from re._constants import MAXREPEAT
+except ImportError:
+    import sre_parse
+    from sre_constants import MAXREPEAT
+
+def regex_flags(ignore_case=False, multiline=False, dotall=False):
+    """Build re flags from the Ignore Case / Multiline / Dotall switches."""
+    flags = 0
+    if ignore_case:
+        flags |= re.IGNORECASE
+    if multiline:
+        flags |= re.MULTILINE
+    if dotall:
+        flags |= re.DOTALL
+    return flags
+
+@functools.lru_cache(maxsize=64)
+def compile_pattern(pattern, flags):
+    """Compile a pattern, caching by (pattern, flags) so repeated searches skip re.compile."""
+    return re.compile(pattern, flags)
+
+def pattern_newline_reach(pattern, flags):
+    """Return the most newlines a match of pattern (lookarounds included) can touch, or None if unbounded.
+
+    0 means every match, and everything the pattern looks at, stays within one line.
+    """
+    parsed = sre_parse.parse(pattern, flags)
+    group_reach = {}
+
+    def set_matches_newline(items):
+        negated = False
+        hit = False
+        for op, av in items:
+            name = op.name
+            if name == "NEGATE":
+                negated = True
+            elif name == "LITERAL":
+                hit = hit or av == 10
+            elif name == "RANGE":
+                hit = hit or av[0] <= 10 <= av[1]
+            elif name == "CATEGORY":
+                hit = hit or av.name in ("CATEGORY_SPACE", "CATEGORY_NOT_DIGIT", "CATEGORY_NOT_WORD")
+            else:
+                hit = True # Anything unexpected: assume it may match a newline
+        return hit != negated
+
+    def reach(items, dotall):
+        total = 0
+        for op, av in items:
+            name = op.name
+            if name in ("LITERAL", "NOT_LITERAL"):
+                n = int((av == 10) == (name == "LITERAL"))
+            elif name == "ANY":
+                n = int(dotall)
+            elif name == "IN":
+                n = int(set_matches_newline(av))
+            elif name in ("MAX_REPEAT", "MIN_REPEAT", "POSSESSIVE_REPEAT"):
+                low, high, sub = av
+                n = reach(sub, dotall)
+                if n:
+                    n = None if high == MAXREPEAT else n * high
+            elif name == "SUBPATTERN":
+                group, add_flags, del_flags, sub = av
+                sub_dotall = (dotall or bool(add_flags & re.DOTALL)) and not del_flags & re.DOTALL
+                n = reach(sub, sub_dotall)
+                if group is not None:
+                    group_reach[group] = n
+            elif name == "BRANCH":
+                n = 0
+                for branch in av[1]:
+                    b = reach(branch, dotall)
+                    n = None if b is None or n is None else max(n, b)
+            elif name in ("ASSERT", "ASSERT_NOT"):
+                n = reach(av[1], dotall)
+            elif name == "ATOMIC_GROUP":
+                n = reach(av, dotall)
+            elif name == "GROUPREF":
+                n = group_reach.get(av)
+            elif name == "GROUPREF_EXISTS":
+                yes = reach(av[1], dotall)
+                no = reach(av[2], dotall) if av[2] else 0
+                n = None if yes is None or no is None else max(yes, no)
+            elif name in ("AT", "CATEGORY"):
+                n = 0 if name == "AT" else int(av.name in ("CATEGORY_SPACE", "CATEGORY_NOT_DIGIT", "CATEGORY_NOT_WORD"))
+            else:
+                n = None # Unknown opcode: be conservative
+            if n is None:
+                return None
+            total += n
+        return total
+
+    return reach(parsed, bool(parsed.state.flags & re.DOTALL))
+
+def chunkable_pattern(pattern, flags):
+    """True if scanning a text a block of whole lines at a time finds exactly the matches of one scan over all of it.
+
+    That holds when nothing a match touches (lookarounds included) can cross a newline, and the pattern has no
+    anchor tied to the ends of the whole text: \\A, \\Z, or ^ and $ without Multiline.
+    """
+    if pattern_newline_reach(pattern, flags) != 0:
+        return False
+
+    def line_anchors_only(items, multiline):
+        for op, av in items:
+            if op.name == "AT":
+                if av.name in ("AT_BEGINNING_STRING", "AT_END_STRING") or (not multiline and av.name in ("AT_BEGINNING", "AT_END")):
+                    return False
+            elif op.name == "SUBPATTERN":
+                _, add_flags, del_flags, sub = av
+                if not line_anchors_only(sub, (multiline or bool(add_flags & re.MULTILINE)) and not del_flags & re.MULTILINE):
+                    return False
+            elif not all(line_anchors_only(sub, multiline) for sub in _child_sequences(op, av)):
+                return False
+        return True
+
+    parsed = sre_parse.parse(pattern, flags)
+    return line_anchors_only(parsed, bool(parsed.state.flags & re.MULTILINE))
+
+def line_start_offsets(text, base=0):
+    """Return the offsets (shifted by base) just past every newline in text (str or bytes)."""
+    # split + accumulate keeps the per-line work in C, which matters for huge buffers
+    newline = b"\n" if isinstance(text, (bytes, bytearray)) else "\n"
+    lengths = (len(line) + 1 for line in text.split(newline)[:-1])
+    return array('q', accumulate(lengths, initial=base))[1:]
+
+class LineIndex:
+    """Maps character offsets in a buffer snapshot to Tk 'line.column' indices.
+
+    Holds the offset at which every line starts, so translating a match span is a
+    bisect in Python instead of an `index` round-trip into Tcl.
+    """
+
+    def __init__(self, text):
+        self.line_starts = array('q', [0])
+        self.line_starts.extend(line_start_offsets(text))
+        self.length = len(text)
+
+    def to_index(self, offset):
+        """Convert a character offset into a Tk 'line.column' index string."""
+        line = bisect_right(self.line_starts, offset) - 1
+        return f"{line + 1}.{offset - self.line_starts[line]}"
+
+    def line_of(self, offset):
+        """Return the 0-based line number containing offset."""
+        return bisect_right(self.line_starts, offset) - 1
+
+    def line_start(self, line):
+        """Return the offset at which 0-based line starts, clamped to the buffer."""
+        if line <= 0:
+            return 0
+        if line >= len(self.line_starts):
+            return self.length
+        return self.line_starts[line]
+
+    def to_offset(self, index):
+        """Convert a normalized Tk 'line.column' index string into a character offset."""
+        line, column = index.split(".")
+        line = int(line) - 1
+        if line >= len(self.line_starts):
+            return self.length # Past the last line, i.e. Tk's "end"
+        return min(self.line_starts[line] + int(column), self.length)
+
+    def patch(self, offset, removed_len, inserted=""):
+        """Update the index in place after removed_len chars at offset were replaced by inserted."""
+        starts = self.line_starts
+        lo = bisect_right(starts, offset) # Line starts inside the edit begin after this
+        hi = bisect_right(starts, offset + removed_len)
+        delta = len(inserted) - removed_len
+        tail = starts[hi:]
+        if delta:
+            tail = array('q', (start + delta for start in tail))
+        starts[lo:] = line_start_offsets(inserted, offset) + tail
+        self.length += delta
+
+class SpanIndex:
+    """Sorted, non-overlapping match spans stored as parallel start/end offset arrays."""
+
+    def __init__(self):
+        self.starts = array('q')
+        self.ends = array('q')
+
+    def __len__(self):
+        return len(self.starts)
+
+    def add(self, start, end):
+        """Append a span; spans must be added in document order (as finditer yields them)."""
+        self.starts.append(start)
+        self.ends.append(end)
+
+    def overlapping(self, lo, hi):
+        """Return the range of span positions intersecting the offset window [lo, hi)."""
+        return range(bisect_right(self.ends, lo), bisect_left(self.starts, hi))
+
+    def extend(self, starts, ends):
+        """Append a batch of spans (arrays of starts and ends) that follow the existing ones."""
+        self.starts.extend(starts)
+        self.ends.extend(ends)
+
+    def replace_range(self, i, j, starts, ends):
+        """Replace span positions [i, j) with the given (sorted) start/end arrays."""
+        self.starts[i:j] = starts
+        self.ends[i:j] = ends
+
+    def apply_edit(self, offset, removed_len, inserted_len, shift_until=None):
+        """Adjust spans for an edit; returns the (lo, hi) extent of dropped spans in new offsets, or None.
+
+        Spans touching the edited range are dropped (an insert right after a match can extend it);
+        spans after it (up to shift_until, if given) are shifted by the change in length.
+        """
+        i = bisect_left(self.ends, offset)
+        j = bisect_right(self.starts, offset + removed_len)
+        k = len(self.starts) if shift_until is None else max(j, bisect_left(self.starts, shift_until))
+        delta = inserted_len - removed_len
+        dropped = None
+        if i < j:
+            dropped = (self.starts[i], max(self.ends[j - 1] + delta, offset + inserted_len))
+        if delta:
+            self.starts[j:k] = array('q', (start + delta for start in self.starts[j:k]))
+            self.ends[j:k] = array('q', (end + delta for end in self.ends[j:k]))
+        del self.starts[i:j]
+        del self.ends[i:j]
+        return dropped
+
+# --- Incremental Re-search ---
+def merge_dirty_range(dirty, offset, removed_len, inserted_len, dropped=None):
+    """Return the (lo, hi) range to re-search after an edit, in post-edit offsets.
+
+    dirty is the range still waiting to be re-searched (or None) and dropped is what
+    SpanIndex.apply_edit returned for this edit; the earlier range is carried across the edit.
+    """
+    lo, hi = offset, offset + inserted_len
+    if dropped:
+        lo, hi = min(lo, dropped[0]), max(hi, dropped[1])
+    if dirty:
+        delta = inserted_len - removed_len
+        old_lo, old_hi = dirty
+        old_lo = old_lo + delta if old_lo >= offset + removed_len else min(old_lo, offset)
+        old_hi = old_hi + delta if old_hi >= offset + removed_len else min(old_hi, offset + inserted_len)
+        lo, hi = min(lo, old_lo), max(hi, old_hi)
+    return lo, hi
+
+def plan_rescan(line_index, spans, reach, lo, hi):
+    """Return (base, scan_from, window_hi, safe_end, text_end) for re-searching the dirty range [lo, hi).
+
+    The region is text[base:text_end], scanned from scan_from; pass the first four values to
+    splice_rescan with the matches found. reach is pattern_newline_reach's line count.
+    """
+    # Whole dirty lines, widened by the number of lines a match (and its lookarounds) can reach
+    hi_line = line_index.line_of(hi)
+    window_lo = line_index.line_start(line_index.line_of(lo) - reach)
+    window_hi = line_index.line_start(hi_line + reach + 1)
+    safe_end = line_index.line_start(hi_line + reach + 2) # Matches starting before here fit in the region
+    region_end = line_index.line_start(hi_line + 2 * reach + 2)
+    # Resume right after the last kept match so the scan is in phase with a full one
+    k = bisect_left(spans.starts, window_lo) - 1
+    scan_from = max(window_lo, spans.ends[k]) if k >= 0 else window_lo
+    # One character of context either side keeps ^, $, \b and lookbehinds honest
+    base = max(scan_from - 1, 0)
+    text_end = min(region_end + 1, line_index.length)
+    if text_end >= line_index.length:
+        # The region runs to the end: keep everything found, an empty match at the very end included
+        window_hi = safe_end = line_index.length + 1
+    return base, scan_from, window_hi, safe_end, text_end
+
+def splice_rescan(spans, region, starts, ends):
+    """Splice a region rescan's matches (offsets relative to base) into spans, resyncing with the old matches after it.
+
+    Returns False, leaving spans untouched, if the rescan couldn't get back in phase inside the region;
+    the caller then has to search the whole buffer again.
+    """
+    base, scan_from, window_hi, safe_end = region
+    new_starts = array('q', (start + base for start in starts))
+    new_ends = array('q', (end + base for end in ends))
+
+    i = bisect_left(spans.starts, scan_from)
+    stop_at = window_hi
+    kept = 0
+    for start, end in zip(new_starts, new_ends):
+        # An old match straddling stop_at means the old scan was out of phase until it ended
+        j = bisect_left(spans.starts, stop_at)
+        if j > i and spans.ends[j - 1] > stop_at:
+            stop_at = spans.ends[j - 1]
+        if start >= stop_at:
+            break # Back in phase: old matches from here on are still valid
+        if start >= safe_end:
+            stop_at = safe_end + 1 # Ran past the fetched region
+            break
+        kept += 1
+        stop_at = max(stop_at, end)
+    else:
+        j = bisect_left(spans.starts, stop_at)
+        if j > i and spans.ends[j - 1] > stop_at:
+            stop_at = spans.ends[j - 1]
+    if stop_at > safe_end:
+        return False
+    spans.replace_range(i, bisect_left(spans.starts, stop_at), new_starts[:kept], new_ends[:kept])
+    return True
+
+def position_key(line, column):
+    """Pack a 0-based (line, column) into one sortable int; large-file mode stores match spans this way."""
+    return (line << 32) | column
+
+def key_line(key):
+    return key >> 32
+
+def key_column(key):
+    return key & 0xFFFFFFFF
+
+# --- Streaming Scanner ---
+def stream_scan(chunks, regex, margin=STREAM_MARGIN, prefilter=None):
+    """Search text that arrives as an iterable of str chunks, holding only about a chunk in memory.
+
+    Yields (gap, match, offset, line, column) in document order, where gap is the text since the
+    previous event, offset the match's absolute start and line/column its 0-based position. Tuples
+    with match None just carry text (the last one is the tail). Matches up to margin characters long,
+    lookahead included, come out exactly as one finditer over the whole text would produce them.
+    A LiteralPrefilter for regex, if given, does the matching.
+    """
+    finditer = prefilter.finditer if prefilter is not None else regex.finditer
+    buf = ""
+    base = 0 # Absolute offset of buf[0]
+    pos = 0 # Where scanning resumes in buf
+    emitted = 0 # buf[:emitted] has been yielded
+    counted = 0 # Newlines before buf[counted] are included in line
+    line, line_start = 0, 0
+    last_span = None
+    chunks = iter(chunks)
+    at_eof = False
+    while not at_eof:
+        chunk = next(chunks, None)
+        if chunk is None:
+            at_eof = True
+        elif not chunk:
+            continue
+        else:
+            buf += chunk
+        # Matches ending past limit might still change once more text arrives
+        limit = len(buf) if at_eof else len(buf) - margin
+        if pos >= limit and not at_eof:
+            continue
+
+        for match in finditer(buf, pos):
+            if match.end() > limit:
+                break
+            span = (base + match.start(), base + match.end())
+            if span == last_span:
+                continue # Empty match found again after resuming at its position
+            newlines = buf.count("\n", counted, match.start())
+            if newlines:
+                line += newlines
+                line_start = base + buf.rindex("\n", counted, match.start()) + 1
+            counted = match.start()
+            yield buf[emitted:match.start()], match, span[0], line, span[0] - line_start
+            emitted = pos = match.end()
+            last_span = span
+        else:
+            pos = max(pos, limit) # Nothing else can start before limit
+
+        if pos > emitted:
+            yield buf[emitted:pos], None, None, None, None
+            emitted = pos
+        # Drop text that has been handed out, keeping a little context for the next scan
+        keep_from = max(0, pos - STREAM_CONTEXT)
+        if keep_from > counted:
+            newlines = buf.count("\n", counted, keep_from)
+            if newlines:
+                line += newlines
+                line_start = base + buf.rindex("\n", counted, keep_from) + 1
+            counted = keep_from
+        buf = buf[keep_from:]
+        base += keep_from
+        pos -= keep_from
+        emitted -= keep_from
+        counted -= keep_from
+
+    if emitted < len(buf):
+        yield buf[emitted:], None, None, None, None
+
+def read_chunks(stream, size=STREAM_CHUNK_SIZE):
+    """Yield successive reads of size from a text stream until it is exhausted."""
+    while True:
+        chunk = stream.read(size)
+        if not chunk:
+            return
+        yield chunk
+
+def line_chunk_bounds(data, size, start=0, end=None):
+    """Yield (start, end) ranges covering data[start:end] (str, bytes or an mmap), each about size long and cut
+    just after a newline, so every block holds whole lines (one longer line stays in one block)."""
+    newline = "\n" if isinstance(data, str) else b"\n"
+    end = len(data) if end is None else end
+    while start < end:
+        stop = min(start + size, end)
+        if stop < end:
+            cut = data.rfind(newline, start, stop)
+            if cut < 0: # One very long line: read on to its end
+                cut = data.find(newline, stop, end)
+            stop = end if cut < 0 else cut + 1
+        yield start, stop
+        start = stop
+
+def stream_replace(chunks, regex, replacement, write, margin=STREAM_MARGIN, prefilter=None):
+    """Pass the chunked text to write with every match replaced by its expanded template; returns the count."""
+    count = 0
+    literal = "\\" not in replacement # No escapes or group references: skip per-match expansion
+    for gap, match, _, _, _ in stream_scan(chunks, regex, margin, prefilter):
+        write(gap)
+        if match is not None:
+            write(replacement if literal else match.expand(replacement))
+            count += 1
+    return count
+
+def match_batches(regex, text, start=0, replacement=None, prefilter=None, batch_size=50000, flush_interval=0.1):
+    """Yield (starts, ends, replacements, scanned_to) for the matches in text from start, in batches.
+
+    A batch is cut after batch_size matches or flush_interval seconds, so results can be shown as they
+    arrive. replacements holds each match's expanded template when replacement is given (else it is empty).
+    """
+    starts, ends, replacements = array('q'), array('q'), []
+    last_flush = time.monotonic()
+    for match in (prefilter or regex).finditer(text, start):
+        starts.append(match.start())
+        ends.append(match.end())
+        if replacement is not None:
+            replacements.append(match.expand(replacement))
+        if len(starts) >= batch_size or time.monotonic() - last_flush > flush_interval:
+            yield starts, ends, replacements, match.end()
+            starts, ends, replacements = array('q'), array('q'), []
+            last_flush = time.monotonic()
+    if starts:
+        yield starts, ends, replacements, len(text)
+
+def apply_replacements(text, starts, ends, replacements):
+    """Return text with each [start, end) span (sorted, non-overlapping) swapped for its replacement."""
+    pieces, previous_end = [], 0
+    for start, end, replacement in zip(starts, ends, replacements):
+        pieces.append(text[previous_end:start])
+        pieces.append(replacement)
+        previous_end = end
+    pieces.append(text[previous_end:])
+    return "".join(pieces)
+
+def replacement_regions(text, starts, ends, replacements, max_gap=None, max_span=REPLACE_REGION_CHARS):
+    """Group sorted spans into (start, end, new_text) edits of text, in document order.
+
+    Consecutive spans at most max_gap characters apart (any distance when max_gap is None) share
+    one edit as long as it covers no more than max_span characters of the original, so millions of
+    matches can become a bounded number of region rewrites.
+    """
+    count, i = len(starts), 0
+    while i < count:
+        j = i + 1
+        while j < count and (max_gap is None or starts[j] - ends[j - 1] <= max_gap) and ends[j] - starts[i] <= max_span:
+            j += 1
+        lo, hi = starts[i], ends[j - 1]
+        yield lo, hi, apply_replacements(text[lo:hi], [start - lo for start in starts[i:j]], [end - lo for end in ends[i:j]], replacements[i:j])
+        i = j
+
+# --- Byte Search ---
+def compile_bytes_pattern(pattern, flags):
+    """Compile pattern for matching raw bytes, with the same flags as a text search.
+
+    Non-ASCII characters in the pattern stand for their UTF-8 encoding (so a class like [é] matches
+    either of its two bytes), and \\w, \\d, \\s, \\b and Ignore Case only know ASCII.
+    """
+    return compile_pattern(pattern.encode("utf-8"), flags)
+
+def _count_newlines(data, start, end):
+    """Count b"\\n" in data[start:end] a block at a time (an mmap has no count of its own)."""
+    return sum(data[i:min(i + STREAM_CHUNK_SIZE, end)].count(b"\n") for i in range(start, end, STREAM_CHUNK_SIZE))
+
+def _utf8_char_bounds(data, offset):
+    """(start, end) of the multi-byte UTF-8 character data[offset] lies inside, or None if offset starts a character."""
+    if offset >= len(data) or not 0x80 <= data[offset] < 0xC0:
+        return None
+    for lead in range(offset - 1, max(offset - 4, -1), -1):
+        byte = data[lead]
+        if byte < 0x80 or byte >= 0xF8:
+            return None
+        if byte >= 0xC0:
+            end = lead + (2 if byte < 0xE0 else 3 if byte < 0xF0 else 4)
+            if end <= offset or end > len(data) or any(not 0x80 <= data[i] < 0xC0 for i in range(lead + 1, end)):
+                return None # A truncated sequence decodes as replacement characters, one per stray byte
+            return lead, end
+    return None # A stray continuation byte is a character of its own
+
+def byte_match_positions(data, regex, errors="replace"):
+    """Yield (match, line, column, end_line, end_column) for each match of a bytes regex in data (bytes or an mmap).
+
+    Lines are 0-based and columns count characters as the line decodes from UTF-8 with errors, so they
+    address the same text an editor showing the leniently decoded file has. Newlines between hits are
+    counted, never decoded; only the part of a matched line up to the match is. A match starting or
+    ending inside a multi-byte character is widened to whole characters; one that then overlaps the
+    previous match, or was empty, is dropped, so positions are strictly increasing and never empty mid-character.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")(errors)
+    line, line_start = 0, 0
+    counted = 0 # Newlines before data[counted] are included in line
+    decoded_to, column = 0, 0 # data[line_start:decoded_to] has been decoded into column characters
+
+    def locate(offset):
+        nonlocal line, line_start, counted, decoded_to, column
+        newlines = _count_newlines(data, counted, offset)
+        counted = offset
+        if newlines:
+            line += newlines
+            line_start = data.rfind(b"\n", 0, offset) + 1
+            decoder.reset()
+            decoded_to, column = line_start, 0
+        for block in range(decoded_to, offset, STREAM_CHUNK_SIZE): # One huge line is decoded a block at a time
+            column += len(decoder.decode(data[block:min(block + STREAM_CHUNK_SIZE, offset)]))
+        decoded_to = max(decoded_to, offset)
+        return line, column
+
+    previous_end = 0
+    for match in regex.finditer(data):
+        start, end = match.span()
+        inside_start, inside_end = _utf8_char_bounds(data, start), _utf8_char_bounds(data, end)
+        if inside_start or inside_end:
+            if start == end:
+                continue
+            start = inside_start[0] if inside_start else start
+            end = inside_end[1] if inside_end else end
+            if start < previous_end:
+                continue
+        previous_end = end
+        start_line, start_column = locate(start)
+        yield (match, start_line, start_column) + locate(end)
+
+# --- Literal Prefilter ---
+PREFILTER_PROBE_CHARS = 16 * 1024 # Text timed with a plain scan to estimate the prefilter's speedup
+PREFILTER_MIN_CANDIDATES = 64 # Candidates seen before deciding whether the prefilter pays off
+PREFILTER_MAX_COVERAGE = 0.5 # Line mode falls back to a plain scan once candidate lines cover more than this share
+PREFILTER_MIN_SPACING = 64 # Anchored mode falls back when candidates come more often than once per this many chars
+
+PrefilterStats = namedtuple("PrefilterStats", "literals coverage speedup") # speedup is None after a fallback
+PrefilterCounts = namedtuple("PrefilterCounts", "scanned covered work_time probe_chars probe_time fell_back")
+
+@functools.lru_cache(maxsize=64)
+def prefilter_literals(pattern, flags):
+    """Return (literals, anchored) for a literal prefilter, or None if pattern has no safe literal set.
+
+    anchored: every match starts with one of the literals (after zero-width assertions), so the regex
+    need only be tried where one occurs. Otherwise every match contains one, and the pattern neither
+    looks across a line nor cares where the string ends ($ without MULTILINE, \\Z), so only lines
+    holding one need scanning. Patterns that simply begin with a literal get None: re's own prefix
+    search already skips ahead in C. Case-insensitive letters never count as literal.
+    """
+    parsed = sre_parse.parse(pattern, flags)
+    multiline = bool(parsed.state.flags & re.MULTILINE)
+
+    def is_literal(op, av, ignore_case):
+        return op.name == "LITERAL" and not (ignore_case and chr(av).lower() != chr(av).upper())
+
+    def sub_ignore_case(av, ignore_case):
+        _, add_flags, del_flags, _ = av
+        return (ignore_case or bool(add_flags & re.IGNORECASE)) and not del_flags & re.IGNORECASE
+
+    def better(a, b):
+        """Prefer the set whose shortest literal is longest, then the smaller set."""
+        if a is None or b is None:
+            return a or b
+        return max(a, b, key=lambda c: (min(map(len, c)), -len(c)))
+
+    def leading(items, ignore_case):
+        """Literals one of which every match of items starts with, or None."""
+        items = list(items)
+        i = 0
+        while i < len(items) and items[i][0].name in ("AT", "ASSERT", "ASSERT_NOT"):
+            i += 1 # Zero-width: the match still starts at the literal
+        run = []
+        while i < len(items) and is_literal(*items[i], ignore_case):
+            run.append(chr(items[i][1]))
+            i += 1
+        if run:
+            return frozenset(["".join(run)])
+        if i == len(items):
+            return None
+        op, av = items[i]
+        if op.name == "SUBPATTERN":
+            return leading(av[3], sub_ignore_case(av, ignore_case))
+        if op.name in _REPEATS and av[0] >= 1:
+            return leading(av[2], ignore_case)
+        if op.name == "ATOMIC_GROUP":
+            return leading(av, ignore_case)
+        if op.name == "BRANCH":
+            alternatives = [leading(branch, ignore_case) for branch in av[1]]
+            return frozenset().union(*alternatives) if all(alternatives) else None
+        return None
+
+    def contained(items, ignore_case):
+        """Literals one of which every match of items contains, or None."""
+        best, run = None, []
+        for op, av in list(items) + [(None, None)]: # Sentinel flushes the last run
+            if op is not None and is_literal(op, av, ignore_case):
+                run.append(chr(av))
+                continue
+            if run:
+                best = better(best, frozenset(["".join(run)]))
+                run = []
+            name = op.name if op is not None else None
+            if name == "SUBPATTERN":
+                best = better(best, contained(av[3], sub_ignore_case(av, ignore_case)))
+            elif name in _REPEATS and av[0] >= 1:
+                best = better(best, contained(av[2], ignore_case))
+            elif name == "ATOMIC_GROUP":
+                best = better(best, contained(av, ignore_case))
+            elif name == "BRANCH":
+                alternatives = [contained(branch, ignore_case) for branch in av[1]]
+                if all(alternatives):
+                    best = better(best, frozenset().union(*alternatives))
+            # Sets, optional parts and lookarounds guarantee no literal
+        return best
+
+    def ends_sensitive(items):
+        for op, av in items:
+            if op.name == "AT" and (av.name == "AT_END_STRING" or (av.name == "AT_END" and not multiline)):
+                return True
+            if any(ends_sensitive(sub) for sub in _child_sequences(op, av)):
+                return True
+        return False
+
+    ignore_case = bool(parsed.state.flags & re.IGNORECASE)
+    if parsed and is_literal(*parsed[0], ignore_case):
+        return None
+    literals = leading(parsed, ignore_case)
+    if literals:
+        return literals, True
+    if pattern_newline_reach(pattern, flags) != 0 or ends_sensitive(parsed):
+        return None
+    literals = contained(parsed, ignore_case)
+    return (literals, False) if literals else None
+
+class LiteralPrefilter:
+    """finditer that only runs the regex where one of its required literals occurs.
+
+    Yields exactly what regex.finditer(text, pos) would: in anchored mode the regex is tried at each
+    literal occurrence, otherwise on each line holding one. Candidates turning out too dense switch
+    the rest of the scan back to plain finditer. Statistics accumulate across finditer calls.
+    """
+
+    def __init__(self, regex, literals, anchored):
+        self.regex = regex
+        self.literals = literals
+        self.anchored = anchored
+        if len(literals) == 1:
+            literal = next(iter(literals))
+            self._find = lambda text, at: text.find(literal, at)
+        else:
+            # Longest first so the alternation prefers the fullest literal at a position
+            scanner = re.compile("|".join(re.escape(literal) for literal in sorted(literals, key=len, reverse=True)))
+            def find(text, at):
+                match = scanner.search(text, at)
+                return match.start() if match else -1
+            self._find = find
+        self.scanned = 0 # Characters the scans advanced over
+        self.covered = 0 # Characters (line mode) or positions (anchored mode) the regex ran on
+        self.work_time = 0.0 # Seconds spent finding literals and matching
+        self.probe_chars, self.probe_time = 0, 0.0
+        self.fell_back = False
+
+    @classmethod
+    def for_pattern(cls, pattern, flags):
+        """A prefilter for pattern, or None when it has no safe literal set."""
+        found = prefilter_literals(pattern, flags)
+        return cls(compile_pattern(pattern, flags), *found) if found else None
+
+    def finditer(self, text, pos=0):
+        regex = self.regex
+        if self.fell_back:
+            yield from regex.finditer(text, pos)
+            return
+        # Time a plain scan of a small copy; it's what the speedup estimate compares against
+        probe = text[pos:pos + PREFILTER_PROBE_CHARS]
+        started = time.perf_counter()
+        for _ in regex.finditer(probe):
+            pass
+        self.probe_time += time.perf_counter() - started
+        self.probe_chars += len(probe)
+        yield from (self._anchored if self.anchored else self._lines)(text, pos)
+
+    def _anchored(self, text, pos):
+        clock, match_at, length = time.perf_counter, self.regex.match, len(text)
+        at, candidates = pos, 0
+        while at < length:
+            started = clock()
+            hit = self._find(text, at)
+            if hit < 0:
+                self.work_time += clock() - started
+                self.scanned += length - at
+                return
+            match = match_at(text, hit) # pos=hit keeps lookbehinds and \b looking at the real text
+            self.work_time += clock() - started
+            candidates += 1
+            self.covered += 1
+            if match is None:
+                self.scanned += hit + 1 - at
+                at = hit + 1
+                continue
+            self.scanned += match.end() - at
+            yield match
+            at = match.end()
+            if candidates >= PREFILTER_MIN_CANDIDATES and candidates * PREFILTER_MIN_SPACING > at - pos:
+                break # Literal everywhere: per-candidate overhead costs more than it saves
+        else:
+            return
+        self.fell_back = True
+        yield from self.regex.finditer(text, at)
+
+    def _lines(self, text, pos):
+        clock, regex, length = time.perf_counter, self.regex, len(text)
+        at, lines, covered = pos, 0, 0
+        while at < length:
+            started = clock()
+            hit = self._find(text, at)
+            if hit < 0:
+                self.work_time += clock() - started
+                self.scanned += length - at
+                return
+            line_start = max(text.rfind("\n", 0, hit) + 1, at)
+            line_end = text.find("\n", hit)
+            line_end = length if line_end < 0 else line_end
+            # Matches can't cross the line, and the pattern can't tell a line end from the string's end
+            matches = list(regex.finditer(text, line_start, line_end))
+            self.work_time += clock() - started
+            lines += 1
+            covered += line_end - line_start
+            self.covered += line_end - line_start
+            self.scanned += line_end + 1 - at
+            yield from matches
+            at = line_end + 1
+            if lines >= PREFILTER_MIN_CANDIDATES and covered > PREFILTER_MAX_COVERAGE * (at - pos):
+                self.fell_back = True # Literal on most lines: the per-line overhead costs more than it saves
+                yield from regex.finditer(text, at)
+                return
+
+    def counts(self):
+        """The raw counters behind stats(), to send back from a process that scanned part of the text."""
+        return PrefilterCounts(self.scanned, self.covered, self.work_time, self.probe_chars, self.probe_time, self.fell_back)
+
+    def stats(self, counts=None):
+        """PrefilterStats from this prefilter's counters, or from counts (e.g. merge_prefilter_counts of parallel blocks)."""
+        scanned, covered, work_time, probe_chars, probe_time, fell_back = counts or self.counts()
+        coverage = covered / scanned if scanned else 1.0
+        speedup = None
+        if not fell_back and probe_chars and probe_time and work_time:
+            speedup = (probe_time / probe_chars * scanned) / work_time
+        return PrefilterStats(sorted(self.literals), coverage, speedup)
+
+def merge_prefilter_counts(counts):
+    """Sum the PrefilterCounts of prefilters that each scanned part of one text; it fell back only if all of them did."""
+    counts = list(counts)
+    return PrefilterCounts(*(sum(field) for field in list(zip(*counts))[:5]), all(count.fell_back for count in counts))
+
+# --- Files ---
+FILE_PREVIEW_CHARS = 200 # Longest line preview returned per match
+FILE_MAX_RESULTS = 1000 # Matches per file returned with previews; the count covers all of them
+BINARY_SNIFF_BYTES = 8192
+
+# Result of searching or rewriting one file; matches holds (line, column, preview) tuples
+FileResult = namedtuple("FileResult", "path size count matches error")
+
+def split_globs(text):
+    """Split a "*.py; *.txt, docs/*" style list into glob patterns."""
+    return [glob.strip() for glob in re.split(r"[;,]", text) if glob.strip()]
+
+def iter_project_files(root, include=(), exclude=()):
+    """Yield files under root whose name (or path relative to root) matches include and not exclude.
+
+    Excluded directory names are pruned rather than walked.
+    """
+    def matches(name, relative, globs):
+        return any(fnmatch.fnmatch(name, glob) or fnmatch.fnmatch(relative, glob) for glob in globs)
+
+    for directory, dirnames, filenames in os.walk(root):
+        relative_dir = os.path.relpath(directory, root)
+        dirnames[:] = sorted(d for d in dirnames if not matches(d, os.path.normpath(os.path.join(relative_dir, d)), exclude))
+        for name in sorted(filenames):
+            relative = os.path.normpath(os.path.join(relative_dir, name))
+            if include and not matches(name, relative, include):
+                continue
+            if not matches(name, relative, exclude):
+                yield os.path.join(directory, name)
+
+def is_binary_file(path):
+    """Guess whether path is binary (a NUL byte near the start), so project searches skip it."""
+    with open(path, "rb") as f:
+        return b"\0" in f.read(BINARY_SNIFF_BYTES)
+
+def search_file(path, pattern, flags, max_results=FILE_MAX_RESULTS):
+    """Stream one file through the pattern (a process-pool task); returns a FileResult."""
+    try:
+        size = os.path.getsize(path)
+        if is_binary_file(path):
+            return FileResult(path, size, 0, [], None)
+        regex = compile_pattern(pattern, flags)
+        count, results = 0, []
+        # Universal newlines, like the editor, so line numbers and columns agree with it
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            for _, match, _, line, column in stream_scan(read_chunks(f), regex, prefilter=LiteralPrefilter.for_pattern(pattern, flags)):
+                if match is None:
+                    continue
+                count += 1
+                if len(results) < max_results:
+                    # The scanner's buffer still holds the text around the match
+                    text, start = match.string, match.start()
+                    line_start = text.rfind("\n", 0, start) + 1
+                    line_end = text.find("\n", start)
+                    preview = text[max(line_start, start - FILE_PREVIEW_CHARS // 2):line_end if line_end >= 0 else len(text)]
+                    results.append((line, column, preview[:FILE_PREVIEW_CHARS]))
+        return FileResult(path, size, count, results, None)
+    except (OSError, re.error) as e:
+        return FileResult(path, 0, 0, [], str(e))
+
+def replace_in_file(path, pattern, flags, replacement, chunk_size=STREAM_CHUNK_SIZE, margin=STREAM_MARGIN):
+    """Rewrite path with every match replaced, atomically (temp file beside it, then rename); returns the count.
+
+    Files without matches are left untouched. Undecodable bytes and line endings are preserved.
+    """
+    regex = compile_pattern(pattern, flags)
+    prefilter = LiteralPrefilter.for_pattern(pattern, flags)
+    return rewrite_file(path, lambda chunks, write: stream_replace(chunks, regex, replacement, write, margin, prefilter), chunk_size)
+
+def rewrite_file(path, rewrite, chunk_size=STREAM_CHUNK_SIZE):
+    """Atomically replace path's text with rewrite(chunks, write)'s output; rewrite returns a change count.
+
+    Nothing is written when the count is 0.
+    """
+    encoding_args = dict(encoding="utf-8", errors="surrogateescape", newline="")
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=".regex_editor-", suffix=".tmp")
+    try:
+        with open(path, "r", **encoding_args) as input_file, os.fdopen(fd, "w", **encoding_args) as output_file:
+            count = rewrite(read_chunks(input_file, chunk_size), output_file.write)
+        if count:
+            shutil.copymode(path, temp_path)
+            os.replace(temp_path, path)
+        else:
+            os.remove(temp_path)
+        return count
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+class BackgroundWriter:
+    """Write a stream of str/bytes chunks to path from a thread: temp file beside it, fsync, then atomic rename.
+
+    path is either left as it was or replaced whole, never truncated, even if the process dies mid-write.
+    At most max_pending chunks wait in memory; call writable() before write() to avoid blocking.
+    """
+
+    def __init__(self, path, encoding="utf-8", newline=None, max_pending=WRITER_PENDING_CHUNKS):
+        self.path = path
+        self.encoding = encoding
+        self.newline = os.linesep if newline is None else newline # As with open(): None means the platform's
+        self.written = 0 # Bytes written so far
+        self.error = None # Exception that stopped the write
+        self.started_at = self.finished_at = None # perf_counter times, for traces
+        self.done = threading.Event() # Set once the file is in place, or the write failed or was aborted
+        self._queue = queue.Queue(max_pending)
+        self._aborted = False
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def writable(self):
+        """True if write() (or close()) won't block."""
+        return not self._queue.full()
+
+    def write(self, chunk):
+        """Queue chunk, waiting for room if needed; dropped if the write has already failed."""
+        while not self.done.is_set():
+            try:
+                self._queue.put(chunk, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def close(self):
+        """No more chunks: finish the file and rename it over path."""
+        self.write(None)
+
+    def abort(self):
+        """Give up: drop queued chunks and remove the temp file; path is untouched."""
+        self._aborted = True
+        try:
+            while True:
+                self._queue.get_nowait()
+        except queue.Empty:
+            pass
+        self._queue.put(None)
+
+    def _run(self):
+        self.started_at = time.perf_counter()
+        directory = os.path.dirname(os.path.abspath(self.path))
+        temp_path = None
+        try:
+            fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".regex_editor-", suffix=".tmp")
+            with os.fdopen(fd, "wb") as output_file:
+                while True:
+                    chunk = self._queue.get()
+                    if chunk is None or self._aborted:
+                        break
+                    if isinstance(chunk, str):
+                        if self.newline != "\n":
+                            chunk = chunk.replace("\n", self.newline)
+                        chunk = chunk.encode(self.encoding)
+                    output_file.write(chunk)
+                    self.written += len(chunk)
+                if not self._aborted:
+                    output_file.flush()
+                    os.fsync(output_file.fileno()) # The data is on disk before the rename makes it visible
+            if self._aborted:
+                os.remove(temp_path)
+                return
+            if os.path.exists(self.path):
+                shutil.copymode(self.path, temp_path)
+            os.replace(temp_path, self.path)
+            temp_path = None
+            _fsync_directory(directory) # ...and the rename itself survives a crash
+        except Exception as e:
+            self.error = e
+            if temp_path is not None and os.path.exists(temp_path):
+                os.remove(temp_path)
+        finally:
+            self.finished_at = time.perf_counter()
+            self.done.set()
+
+def _fsync_directory(directory):
+    """Flush a directory entry change to disk where the platform allows it (not on Windows)."""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def replace_file(path, pattern, flags, replacement):
+    """Process-pool task wrapping replace_in_file; binary files are skipped. Returns a FileResult."""
+    try:
+        size = os.path.getsize(path)
+        if is_binary_file(path):
+            return FileResult(path, size, 0, [], None)
+        return FileResult(path, size, replace_in_file(path, pattern, flags, replacement), [], None)
+    except (OSError, re.error) as e:
+        return FileResult(path, 0, 0, [], str(e))
+
+# --- Extraction ---
+EXTRACT_FIELDS = ("line", "column", "offset", "match") # Columns every extracted row starts with
+EXTRACT_FORMATS = ("csv", "jsonl")
+COUNT_CAPACITY = 10000 # Distinct values a GroupCounter keeps after evicting rare ones (it holds up to twice this)
+
+def resolve_group(regex, group):
+    """Return the number of a group given by name or number (as text); raises ValueError if regex has no such group."""
+    group = str(group)
+    if group.isdigit() and int(group) <= regex.groups:
+        return int(group)
+    if group in regex.groupindex:
+        return regex.groupindex[group]
+    raise ValueError(f"the pattern has no group {group!r}")
+
+def group_names(regex):
+    """Name of every group of regex in order: its name if it has one, else its number."""
+    names = {number: name for name, number in regex.groupindex.items()}
+    return [names.get(number, str(number)) for number in range(1, regex.groups + 1)]
+
+def extract_columns(regex):
+    """Column names of extract_rows' rows: EXTRACT_FIELDS, then one per group (renamed if it clashes with them)."""
+    return list(EXTRACT_FIELDS) + [f"group_{name}" if name in EXTRACT_FIELDS else name for name in group_names(regex)]
+
+def extract_rows(chunks, regex, margin=STREAM_MARGIN, prefilter=None):
+    """Yield (line, column, offset, match, *groups) for each match in text streamed as chunks.
+
+    line and column are 1-based and offset a 0-based character offset; groups that took no part in
+    the match are None. Rows come out as the scan goes, so nothing accumulates.
+    """
+    for _, match, offset, line, column in stream_scan(chunks, regex, margin, prefilter):
+        if match is not None:
+            yield (line + 1, column + 1, offset, match.group()) + match.groups()
+
+class RowWriter:
+    """Writes rows to a text stream one at a time, as CSV (after a header row) or JSON Lines objects."""
+
+    def __init__(self, stream, columns, format="csv"):
+        if format not in EXTRACT_FORMATS:
+            raise ValueError(f"unknown format {format!r}")
+        self.stream = stream
+        self.columns = list(columns)
+        self.format = format
+        self.rows = 0
+        if format == "csv":
+            self._csv = csv.writer(stream)
+            self._csv.writerow(self.columns)
+
+    def write(self, row):
+        if self.format == "csv":
+            self._csv.writerow(row) # None is written as an empty field
+        else:
+            self.stream.write(json.dumps(dict(zip(self.columns, row)), ensure_ascii=False) + "\n")
+        self.rows += 1
+
+class GroupCounter:
+    """How often each value of one group occurs, in bounded memory.
+
+    Exact until the group has taken 2 * capacity distinct values. Each time the table fills up after
+    that, only the capacity most frequent values are kept (a batched Space-Saving sketch), so frequent
+    values survive and a count can overstate the true one by at most its error.
+    """
+
+    def __init__(self, group, capacity=COUNT_CAPACITY, name=None):
+        self.group = group # Group number whose values are counted
+        self.name = str(group) if name is None else name # How the group is labelled in summaries
+        self.capacity = capacity
+        self.counts = {} # value -> [count, error]
+        self.floor = 0 # Highest count evicted so far: a value first seen after that may have occurred this often before
+        self.total = 0
+
+    @property
+    def exact(self):
+        return self.floor == 0
+
+    def add(self, value):
+        self.total += 1
+        entry = self.counts.get(value)
+        if entry is not None:
+            entry[0] += 1
+            return
+        if len(self.counts) >= 2 * self.capacity:
+            ranked = sorted(self.counts.items(), key=lambda item: item[1][0], reverse=True)
+            self.floor = max(self.floor, ranked[self.capacity][1][0])
+            self.counts = dict(ranked[:self.capacity])
+        self.counts[value] = [self.floor + 1, self.floor]
+
+    def top(self, k=None):
+        """Return (value, count, error) for the k most frequent values (all kept values if k is None), most frequent first."""
+        items = ((value, count, error) for value, (count, error) in self.counts.items())
+        key = lambda item: (-item[1], "" if item[0] is None else item[0])
+        return sorted(items, key=key) if k is None else heapq.nsmallest(k, items, key=key)
+
+    def table(self, k=None):
+        """(columns, rows) summarizing the counts for a RowWriter."""
+        return ("aggregate", "group", "value", "count", "error"), [("count", self.name, value, count, error) for value, count, error in self.top(k)]
+
+class Histogram:
+    """The distribution of one group's numeric values, in bounded memory.
+
+    Keeps the count, sum, minimum and maximum, and counts per power-of-two bucket ([1, 2), [2, 4),
+    [0.5, 1), ... mirrored for negatives, with 0 on its own), so a few thousand buckets at most.
+    Values that aren't numbers (or didn't participate) are only counted as skipped.
+    """
+
+    def __init__(self, group, name=None):
+        self.group = group
+        self.name = str(group) if name is None else name
+        self.buckets = {} # (sign, exponent) -> count; the bucket holds magnitudes in [2**(exponent - 1), 2**exponent)
+        self.count = self.skipped = 0
+        self.sum = 0.0
+        self.min = self.max = None
+
+    def add(self, value):
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            self.skipped += 1
+            return
+        if not math.isfinite(number):
+            self.skipped += 1
+            return
+        self.count += 1
+        self.sum += number
+        self.min = number if self.min is None else min(self.min, number)
+        self.max = number if self.max is None else max(self.max, number)
+        key = (0, 0) if number == 0 else ((1 if number > 0 else -1), math.frexp(number)[1])
+        self.buckets[key] = self.buckets.get(key, 0) + 1
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else None
+
+    def rows(self):
+        """Return (low, high, count) per non-empty bucket, lowest first."""
+        rows = []
+        for (sign, exponent), count in self.buckets.items():
+            if sign == 0:
+                rows.append((0.0, 0.0, count))
+            else:
+                low, high = math.ldexp(1, exponent - 1), math.ldexp(1, exponent)
+                rows.append((low, high, count) if sign > 0 else (-high, -low, count))
+        return sorted(rows)
+
+    def table(self):
+        """(columns, rows) listing the buckets for a RowWriter."""
+        return ("aggregate", "group", "low", "high", "count"), [("histogram", self.name, low, high, count) for low, high, count in self.rows()]
+
+def extract(chunks, regex, writer=None, aggregates=(), margin=STREAM_MARGIN, prefilter=None, prefix=()):
+    """Stream each match of regex in chunks to writer (a RowWriter, with prefix prepended to its rows) and
+    feed its group values to the aggregates (GroupCounters and Histograms); returns the number of matches."""
+    count = 0
+    for row in extract_rows(chunks, regex, margin, prefilter):
+        count += 1
+        if writer is not None:
+            writer.write(prefix + row)
+        for aggregate in aggregates:
+            aggregate.add(row[len(EXTRACT_FIELDS) - 1 + aggregate.group]) # Group 0 is the match column
+    return count
+
+# --- Rewrite Recipes ---
+RECIPES_FILE = os.path.expanduser("~/.config/regex_editor/recipes.json") # Beside the editor's config.json
+RECIPE_RANGE_LIMIT = 0x30000 # Character ranges wider than this count as "any character" when checking independence
+RECIPE_OUTPUT_CHUNK = 256 * 1024 # Output of one streamed pass is regrouped into pieces this big for the next
+RECIPE_SAMPLE_CHARS = 256 * 1024 # Text timed to decide whether a fused pass beats running its rules one by one
+RECIPE_FUSED_MARGIN = 0.9 # A fused pass must take at most this share of the one-by-one time to be kept
+
+RecipeRule = namedtuple("RecipeRule", "pattern replacement flags") # flags: re flag bits, as from regex_flags
+
+def rule_to_json(rule):
+    return {"pattern": rule.pattern, "replacement": rule.replacement, "ignore_case": bool(rule.flags & re.IGNORECASE),
+            "multiline": bool(rule.flags & re.MULTILINE), "dotall": bool(rule.flags & re.DOTALL)}
+
+def rule_from_json(data):
+    return RecipeRule(data["pattern"], data.get("replacement", ""),
+                      regex_flags(data.get("ignore_case"), data.get("multiline"), data.get("dotall")))
+
+def load_recipes(path=RECIPES_FILE):
+    """Return {name: [RecipeRule, ...]} from path; {} if it doesn't exist."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return {name: [rule_from_json(rule) for rule in rules] for name, rules in json.load(f).items()}
+
+def save_recipes(recipes, path=RECIPES_FILE):
+    """Write {name: [RecipeRule, ...]} to path atomically (temp file beside it, fsync, then rename)."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    # A private temp file, so two editors saving at once can't write into each other's
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".regex_editor-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({name: [rule_to_json(rule) for rule in rules] for name, rules in recipes.items()}, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    _fsync_directory(directory)
+
+@functools.lru_cache(maxsize=None)
+def _category_chars(category, ascii_only):
+    """Every code point a \\d, \\w or \\s class matches."""
+    class_text = {"CATEGORY_DIGIT": r"\d", "CATEGORY_WORD": r"\w", "CATEGORY_SPACE": r"\s"}[category]
+    return frozenset(chain.from_iterable(range(match.start(), match.end())
+                                         for match in re.finditer(class_text + "+", _code_points(), re.ASCII if ascii_only else 0)))
+
+@functools.lru_cache(maxsize=None)
+def _code_points():
+    """A string of every code point in order, so a match's offsets are its code points."""
+    return "".join(map(chr, range(0x110000)))
+
+@functools.lru_cache(maxsize=None)
+def _case_variants():
+    """Code point -> every code point IGNORECASE may equate it with (closed over lower() and upper())."""
+    parent = {}
+    def root(code):
+        while parent.get(code, code) != code:
+            code = parent[code]
+        return code
+    for code in range(0x20000): # No cased letters beyond this plane
+        ch = chr(code)
+        for other in (ch.lower(), ch.upper(), ch.casefold()):
+            if len(other) == 1 and other != ch:
+                parent[root(code)] = root(ord(other))
+    groups = {}
+    for code in parent:
+        groups.setdefault(root(code), set()).add(code)
+    for group in groups.values():
+        group.add(root(next(iter(group))))
+    return {code: frozenset(group) for group in groups.values() for code in group}
+
+# scoped: the pattern in a scoped-flags group; literal: its text if it matches one fixed string; chars: the
+# code points a match can contain (None: any); anchors: the AT codes it uses (^, $, \\b ...); lookaround: whether it has any
+_RuleShape = namedtuple("_RuleShape", "scoped literal chars anchors lookaround ascii_only")
+
+@functools.lru_cache(maxsize=256)
+def _rule_shape(pattern, flags):
+    """What the recipe planner needs to know about a rule's pattern (a _RuleShape), or None if it can't be fused."""
+    parsed = sre_parse.parse(pattern, flags)
+    effective = parsed.state.flags
+    if effective & (re.LOCALE | re.DEBUG) or parsed.getwidth()[0] == 0:
+        return None # Empty matches interleave differently once fused
+    ascii_only = bool(effective & re.ASCII)
+    state = {"anchors": set(), "lookaround": False, "backref": False}
+
+    def chars_of(items, ignore_case):
+        chars = set()
+        for op, av in items:
+            name = op.name
+            if name == "LITERAL":
+                chars.add(av)
+            elif name in ("NOT_LITERAL", "ANY"):
+                return None
+            elif name == "IN":
+                for item_op, item_av in av:
+                    item = item_op.name
+                    if item == "NEGATE":
+                        return None
+                    if item == "LITERAL":
+                        chars.add(item_av)
+                    elif item == "RANGE":
+                        if item_av[1] - item_av[0] > RECIPE_RANGE_LIMIT:
+                            return None
+                        chars.update(range(item_av[0], item_av[1] + 1))
+                    elif item == "CATEGORY" and not item_av.name.startswith("CATEGORY_NOT_"):
+                        chars |= _category_chars(item_av.name.replace("CATEGORY_UNI_", "CATEGORY_").replace("CATEGORY_LOC_", "CATEGORY_"), ascii_only)
+                    else:
+                        return None
+            elif name == "AT":
+                state["anchors"].add(av.name)
+            elif name in ("ASSERT", "ASSERT_NOT"):
+                state["lookaround"] = True # What lookarounds see isn't consumed, so it adds no characters
+            elif name in ("GROUPREF", "GROUPREF_EXISTS", "GROUPREF_IGNORE"):
+                state["backref"] = True
+            elif name == "SUBPATTERN":
+                _, add_flags, del_flags, sub = av
+                sub_chars = chars_of(sub, (ignore_case or bool(add_flags & re.IGNORECASE)) and not del_flags & re.IGNORECASE)
+                if sub_chars is None:
+                    return None
+                chars |= sub_chars
+                continue
+            else:
+                for sub in _child_sequences(op, av):
+                    sub_chars = chars_of(sub, ignore_case)
+                    if sub_chars is None:
+                        return None
+                    chars |= sub_chars
+                continue
+            if ignore_case and name in ("LITERAL", "IN"):
+                variants = _case_variants()
+                chars |= set().union(*(variants.get(code, ()) for code in list(chars)))
+        return chars
+
+    chars = chars_of(parsed, bool(effective & re.IGNORECASE))
+    if state["backref"]:
+        return None # Group numbers shift inside the combined pattern
+    literal = None
+    if not effective & re.IGNORECASE and all(op.name == "LITERAL" for op, _ in parsed):
+        literal = "".join(chr(av) for _, av in parsed)
+    # Leading global flags become a scoped group; any other inline global flag can't be scoped
+    body = re.sub(r"\A(?:\(\?[aiLmsux]+\))+", "", pattern)
+    letters = "".join(letter for letter, bit in (("a", re.ASCII), ("i", re.IGNORECASE), ("m", re.MULTILINE),
+                                                 ("s", re.DOTALL), ("x", re.VERBOSE)) if effective & bit)
+    scoped = f"(?{letters}:{body}{chr(10) if effective & re.VERBOSE else ''})" # A newline ends a trailing verbose comment
+    try:
+        re.compile(scoped)
+    except re.error:
+        return None
+    return _RuleShape(scoped, literal, frozenset(chars) if chars is not None else None, frozenset(state["anchors"]),
+                      state["lookaround"], ascii_only)
+
+def _texts_overlap(a, b):
+    """Whether occurrences of the strings a and b can share a character."""
+    return a in b or b in a or any(a.endswith(b[:k]) or b.endswith(a[:k]) for k in range(1, min(len(a), len(b))))
+
+def _can_overlap(a, b):
+    """Whether text described by a and b, each ("literal", text) or ("chars", set or None), can share a character."""
+    if a[0] == b[0] == "literal":
+        return _texts_overlap(a[1], b[1])
+    if a[1] is None or b[1] is None:
+        return True
+    return not _ords(a[1]).isdisjoint(_ords(b[1]))
+
+def _ords(chars):
+    """Code points of a string, or a set of code points as is."""
+    return set(map(ord, chars)) if isinstance(chars, str) else chars
+
+class RecipeStage:
+    """One pass over the text: a single rule, or consecutive independent rules fused into one alternation.
+
+    Each fused rule is followed by an empty marker group; the last group closed tells which rule matched.
+    Markers (rather than a named group around each rule) keep alternatives that start with a literal
+    eligible for re's first-character search.
+    """
+
+    def __init__(self, rules):
+        self.rules = rules
+        self.counts = [0] * len(rules)
+        self._rule_regexes = [compile_pattern(rule.pattern, rule.flags) for rule in rules]
+        self._markers = {} # Marker group number -> rule index
+        if len(rules) == 1:
+            self.pattern, self.flags = rules[0].pattern, rules[0].flags
+        else:
+            alternatives, groups = [], 0
+            for i, (rule, regex) in enumerate(zip(rules, self._rule_regexes)):
+                alternatives.append(_rule_shape(rule.pattern, rule.flags).scoped + "()")
+                groups += regex.groups + 1
+                self._markers[groups] = i
+            self.pattern, self.flags = "|".join(alternatives), 0
+        self.regex = compile_pattern(self.pattern, self.flags)
+        self.prefilter = LiteralPrefilter.for_pattern(self.pattern, self.flags)
+
+    def expand(self, match):
+        """The replacement text for a match of self.regex, counting it against its rule."""
+        i = self._markers[match.lastindex] if self._markers else 0
+        self.counts[i] += 1
+        template = self.rules[i].replacement
+        if "\\" not in template:
+            return template
+        if len(self.rules) > 1:
+            # Re-match the rule alone so its own group numbers apply; it finds the same span
+            match = self._rule_regexes[i].match(match.string, match.start())
+        return match.expand(template)
+
+    def apply(self, text):
+        if self.prefilter is not None and not self.prefilter.fell_back and len(text) > 2 * RECIPE_SAMPLE_CHARS:
+            for _ in self.prefilter.finditer(text[:RECIPE_SAMPLE_CHARS]):
+                pass # A trial run: if the literal turns out to be everywhere, sub's C loop is the faster way
+        if self.prefilter is None or self.prefilter.fell_back:
+            if len(self.rules) == 1 and "\\" not in self.rules[0].replacement:
+                text, count = self.regex.subn(self.rules[0].replacement, text) # Entirely in C
+                self.counts[0] += count
+                return text
+            return self.regex.sub(self.expand, text)
+        pieces, last = [], 0
+        for match in (self.prefilter or self.regex).finditer(text):
+            pieces.append(text[last:match.start()])
+            pieces.append(self.expand(match))
+            last = match.end()
+        pieces.append(text[last:])
+        return "".join(pieces)
+
+    def stream(self, chunks, margin=STREAM_MARGIN):
+        """Yield the rewritten text of a chunk stream, in pieces of about RECIPE_OUTPUT_CHUNK characters."""
+        pending, size = [], 0
+        for gap, match, _, _, _ in stream_scan(chunks, self.regex, margin, self.prefilter):
+            pending.append(gap)
+            size += len(gap)
+            if match is not None:
+                replacement = self.expand(match)
+                pending.append(replacement)
+                size += len(replacement)
+            if size >= RECIPE_OUTPUT_CHUNK:
+                yield "".join(pending)
+                pending, size = [], 0
+        if pending:
+            yield "".join(pending)
+
+def plan_recipe(rules, sample=None):
+    """Group consecutive rules into RecipeStages; rules are fused only where one pass gives what running them in turn would.
+
+    A rule joins the current stage if, for every earlier member, its matches can't overlap that member's
+    matches or replacement text (by character sets, or exact string overlap for plain literals), the
+    member always writes something, and any anchors it has (\\b, ^, $) read the same on either side of
+    that member's edits. Then neither rule can see the other's edits, so the leftmost-first single scan
+    agrees with replacing rule by rule.
+
+    re tries every alternative at each position, so a fused pass isn't always faster (it is when the
+    alternatives share a prefix or start with distinct literals). Given a sample of the text, each fused
+    stage is timed on it against its rules run one by one, and split up again unless it wins.
+    """
+    groups, current, shapes, names = [], [], [], set()
+    for rule in rules:
+        shape = _rule_shape(rule.pattern, rule.flags)
+        if shape is not None and current and shapes[0] is not None:
+            group_names = set(re.compile(shape.scoped).groupindex)
+            if not group_names & names and all(_independent(earlier, earlier_shape, shape) for earlier, earlier_shape in zip(current, shapes)):
+                current.append(rule)
+                shapes.append(shape)
+                names |= group_names
+                continue
+        if current:
+            groups.append(current)
+        current, shapes = [rule], [shape]
+        names = set(re.compile(shape.scoped).groupindex) if shape is not None else set()
+    if current:
+        groups.append(current)
+
+    stages = []
+    for group in groups:
+        if len(group) > 1 and sample:
+            sample_text = sample
+            started = time.perf_counter()
+            for rule in group:
+                sample_text = RecipeStage([rule]).apply(sample_text)
+            one_by_one = time.perf_counter() - started
+            started = time.perf_counter()
+            RecipeStage(group).apply(sample)
+            if time.perf_counter() - started > RECIPE_FUSED_MARGIN * one_by_one:
+                stages.extend(RecipeStage([rule]) for rule in group)
+                continue
+        stages.append(RecipeStage(group))
+    return stages
+
+def _independent(earlier, earlier_shape, shape):
+    """Whether a rule shaped like shape, run after earlier, can share earlier's pass (see plan_recipe)."""
+    if shape.lookaround or not _writes_something(earlier.replacement):
+        return False
+    matched = ("literal", shape.literal) if shape.literal is not None else ("chars", shape.chars)
+    earlier_matched = ("literal", earlier_shape.literal) if earlier_shape.literal is not None else ("chars", earlier_shape.chars)
+    written = _output_text(earlier, earlier_shape.chars)
+    if _can_overlap(matched, earlier_matched) or _can_overlap(matched, written):
+        return False
+    if shape.anchors:
+        # A neighbour of the match may be earlier's matched text in one order and its replacement in the other
+        touched = _ords(earlier_matched[1]) | _ords(written[1]) if earlier_matched[1] is not None and written[1] is not None else None
+        if touched is None:
+            return False
+        words = _category_chars("CATEGORY_WORD", shape.ascii_only)
+        for anchor in shape.anchors:
+            if "BOUNDARY" in anchor and not (touched <= words or touched.isdisjoint(words)):
+                return False # \\b could flip
+            if anchor in ("AT_BEGINNING", "AT_END") and 10 in touched:
+                return False # ^ and $ look for newlines
+    return True
+
+def _writes_something(template):
+    """Whether a replacement template always expands to a non-empty string."""
+    return bool(re.sub(r"\\(?:g<[^>]*>|\d{1,2})", "", template))
+
+def _output_text(rule, match_chars):
+    """Describe what rule's replacements can contain, like _can_overlap's arguments."""
+    if "\\" not in rule.replacement:
+        return ("literal", rule.replacement)
+    if match_chars is None:
+        return ("chars", None)
+    # Group references copy matched text; escapes such as \\n or octal ones yield code points below 0o1000
+    return ("chars", _ords(rule.replacement) | match_chars | set(range(0o1000)))
+
+def apply_recipe(text, rules):
+    """Run rules in order over text; returns (new text, replacements per rule, passes made)."""
+    stages = plan_recipe(rules, text[:RECIPE_SAMPLE_CHARS] if len(text) > 2 * RECIPE_SAMPLE_CHARS else None)
+    for stage in stages:
+        text = stage.apply(text)
+    return text, list(chain.from_iterable(stage.counts for stage in stages)), len(stages)
+
+def stream_recipe(chunks, rules, write, margin=STREAM_MARGIN):
+    """Streaming apply_recipe: each pass consumes the previous one's output as it is produced.
+
+    Returns (replacements per rule, passes made).
+    """
+    chunks = iter(chunks)
+    first = next(chunks, "")
+    stages = plan_recipe(rules, first[:RECIPE_SAMPLE_CHARS] if len(first) > RECIPE_SAMPLE_CHARS else None)
+    chunks = chain([first], chunks)
+    for stage in stages:
+        chunks = stage.stream(chunks, margin)
+    for piece in chunks:
+        write(piece)
+    return list(chain.from_iterable(stage.counts for stage in stages)), len(stages)
+
+def recipe_in_file(path, rules, chunk_size=STREAM_CHUNK_SIZE, margin=STREAM_MARGIN):
+    """Rewrite path with the recipe applied, atomically; returns the replacements per rule."""
+    counts = []
+    def rewrite(chunks, write):
+        counts[:] = stream_recipe(chunks, rules, write, margin)[0]
+        return sum(counts)
+    rewrite_file(path, rewrite, chunk_size)
+    return counts
+
+# --- Performance Analysis ---
+RISK_PROBE_CHARS = "aZ0_ \t\n-.\u00e9\x00" # One character per common class; the pattern's own literals are added
+RISK_REPEAT_BOUND = 10 # Repeats allowing this many iterations are treated like * and +
+PROFILE_FIRST_PREFIX = 64 * 1024 # Smallest prefix timed by profile_pattern; each next one doubles
+PROFILE_WORST_LINES = 10
+
+BacktrackingRisk = namedtuple("BacktrackingRisk", "severity description") # severity: "exponential" or "polynomial"
+
+_REPEATS = ("MAX_REPEAT", "MIN_REPEAT", "POSSESSIVE_REPEAT")
+_AT_CODES = {"AT_BEGINNING": "^", "AT_BEGINNING_STRING": r"\A", "AT_END": "$", "AT_END_STRING": r"\Z",
+             "AT_BOUNDARY": r"\b", "AT_NON_BOUNDARY": r"\B"}
+_CATEGORY_CODES = {"CATEGORY_DIGIT": r"\d", "CATEGORY_NOT_DIGIT": r"\D", "CATEGORY_SPACE": r"\s",
+                   "CATEGORY_NOT_SPACE": r"\S", "CATEGORY_WORD": r"\w", "CATEGORY_NOT_WORD": r"\W"}
+
+def _child_sequences(op, av):
+    """The nested item lists of a parsed node."""
+    name = op.name
+    if name in _REPEATS:
+        return [av[2]]
+    if name == "SUBPATTERN":
+        return [av[3]]
+    if name == "BRANCH":
+        return av[1]
+    if name in ("ASSERT", "ASSERT_NOT"):
+        return [av[1]]
+    if name == "ATOMIC_GROUP":
+        return [av]
+    if name == "GROUPREF_EXISTS":
+        return [av[1], av[2]] if av[2] else [av[1]]
+    return []
+
+def _escape_char(code):
+    ch = chr(code)
+    return {"\n": r"\n", "\t": r"\t"}.get(ch, "\\" + ch if ch in r".^$*+?{}[]\|()" else ch)
+
+def _unparse(items):
+    """Approximate source text for a parsed (sub)pattern, to name it in warnings."""
+    out = []
+    for op, av in items:
+        name = op.name
+        if name == "LITERAL":
+            out.append(_escape_char(av))
+        elif name == "NOT_LITERAL":
+            out.append(f"[^{_escape_char(av)}]")
+        elif name == "ANY":
+            out.append(".")
+        elif name == "IN":
+            if len(av) == 1 and av[0][0].name == "CATEGORY":
+                out.append(_CATEGORY_CODES.get(av[0][1].name, "[...]"))
+                continue
+            parts = []
+            for set_op, set_av in av:
+                if set_op.name == "NEGATE":
+                    parts.append("^")
+                elif set_op.name == "LITERAL":
+                    parts.append(_escape_char(set_av))
+                elif set_op.name.startswith("RANGE"):
+                    parts.append(f"{_escape_char(set_av[0])}-{_escape_char(set_av[1])}")
+                elif set_op.name == "CATEGORY":
+                    parts.append(_CATEGORY_CODES.get(set_av.name, ""))
+            out.append("[" + "".join(parts) + "]")
+        elif name in _REPEATS:
+            low, high, sub = av
+            body = _unparse(sub)
+            if len(sub) != 1 or sub[0][0].name in _REPEATS or sub[0][0].name == "BRANCH":
+                body = f"(?:{body})"
+            if high == MAXREPEAT:
+                quantifier = {0: "*", 1: "+"}.get(low, f"{{{low},}}")
+            else:
+                quantifier = "?" if (low, high) == (0, 1) else f"{{{low}}}" if low == high else f"{{{low},{high}}}"
+            out.append(body + quantifier + {"MIN_REPEAT": "?", "POSSESSIVE_REPEAT": "+"}.get(name, ""))
+        elif name == "SUBPATTERN":
+            out.append(("(" if av[0] else "(?:") + _unparse(av[3]) + ")")
+        elif name == "BRANCH":
+            branches = "|".join(_unparse(branch) for branch in av[1])
+            out.append(f"(?:{branches})" if len(items) > 1 or not all(av[1]) else branches)
+        elif name == "ATOMIC_GROUP":
+            out.append(f"(?>{_unparse(av)})")
+        elif name == "AT":
+            out.append(_AT_CODES.get(av.name, ""))
+        elif name == "GROUPREF":
+            out.append(f"\\{av}")
+        else:
+            out.append("...")
+    return "".join(out)
+
+@functools.lru_cache(maxsize=64)
+def backtracking_risks(pattern, flags):
+    """Find shapes that can make the backtracking engine take exponential or polynomial time.
+
+    Nested repeats where an inner repeat can also consume what follows it (``(a+)+``,
+    ``(\\w+\\s?)*``, ``([a-z]+.)+``), optional parts that can also start the next iteration (``(a|aa)+``, ``(aa?)+``)
+    and repeated alternations with overlapping branches (``(\\d+|\\w+)*``) are exponential; adjacent repeats that
+    can split the same text (``\\w+\\s*\\w+``) are polynomial.
+    Character sets are compared by probing representative characters, so this is a heuristic.
+    Returns a tuple of BacktrackingRisk; raises re.error for invalid patterns.
+    """
+    parsed = sre_parse.parse(pattern, flags)
+    probes = set(RISK_PROBE_CHARS)
+    risks = []
+
+    def collect_literals(items):
+        for op, av in items:
+            if op.name in ("LITERAL", "NOT_LITERAL"):
+                probes.add(chr(av))
+            elif op.name == "IN":
+                for set_op, set_av in av:
+                    if set_op.name == "LITERAL":
+                        probes.add(chr(set_av))
+                    elif set_op.name.startswith("RANGE"):
+                        probes.update((chr(set_av[0]), chr(set_av[1])))
+            for sub in _child_sequences(op, av):
+                collect_literals(sub)
+
+    collect_literals(parsed)
+    everything = frozenset(probes)
+
+    def category_has(name, ch):
+        kind = name.rsplit("_", 1)[-1]
+        hit = {"DIGIT": ch.isdecimal(), "SPACE": ch.isspace(), "WORD": ch.isalnum() or ch == "_", "LINEBREAK": ch == "\n"}.get(kind, True)
+        return hit != ("_NOT_" in name)
+
+    def in_set(items, code):
+        negated = hit = False
+        for op, av in items:
+            name = op.name
+            if name == "NEGATE":
+                negated = True
+            elif name == "LITERAL":
+                hit = hit or code == av
+            elif name.startswith("RANGE"):
+                hit = hit or av[0] <= code <= av[1]
+            elif name == "CATEGORY":
+                hit = hit or category_has(av.name, chr(code))
+            else:
+                hit = True
+        return hit != negated
+
+    def atom_chars(op, av, mode):
+        """Probe characters a single-character opcode matches, or None for other opcodes."""
+        ignore_case, dotall = mode
+        name = op.name
+        if name == "LITERAL":
+            test = lambda code: code == av
+        elif name == "NOT_LITERAL":
+            test = lambda code: code != av
+        elif name == "ANY":
+            test = lambda code: dotall or code != 10
+        elif name == "IN":
+            test = lambda code: in_set(av, code)
+        else:
+            return None
+        chars = set()
+        for ch in everything:
+            variants = {ch, ch.lower(), ch.upper()} if ignore_case else (ch,)
+            if any(len(v) == 1 and test(ord(v)) for v in variants):
+                chars.add(ch)
+        return frozenset(chars)
+
+    def sub_mode(av, mode):
+        _, add_flags, del_flags, _ = av
+        return tuple((on or bool(add_flags & flag)) and not del_flags & flag for on, flag in zip(mode, (re.IGNORECASE, re.DOTALL)))
+
+    def node_info(op, av, mode):
+        """(chars a match can start with, chars it can contain, can it be empty)."""
+        name = op.name
+        atom = atom_chars(op, av, mode)
+        if atom is not None:
+            return atom, atom, False
+        if name in _REPEATS:
+            first, chars, nullable = info(av[2], mode)
+            return first, chars, nullable or av[0] == 0
+        if name == "SUBPATTERN":
+            return info(av[3], sub_mode(av, mode))
+        if name == "ATOMIC_GROUP":
+            return info(av, mode)
+        if name in ("BRANCH", "GROUPREF_EXISTS"):
+            branches = av[1] if name == "BRANCH" else [av[1], av[2] or []]
+            parts = [info(branch, mode) for branch in branches]
+            return (frozenset().union(*(p[0] for p in parts)), frozenset().union(*(p[1] for p in parts)), any(p[2] for p in parts))
+        if name in ("AT", "ASSERT", "ASSERT_NOT"):
+            return frozenset(), frozenset(), True
+        return everything, everything, True # Backreferences and anything unknown: assume the worst
+
+    def info(items, mode):
+        first, chars, nullable = set(), set(), True
+        for op, av in items:
+            node_first, node_chars, node_nullable = node_info(op, av, mode)
+            if nullable:
+                first |= node_first
+            chars |= node_chars
+            nullable = nullable and node_nullable
+        return first, chars, nullable
+
+    def is_open(op, av):
+        """A backtracking repeat with many possible iteration counts."""
+        return op.name in ("MAX_REPEAT", "MIN_REPEAT") and av[1] - av[0] >= RISK_REPEAT_BOUND
+
+    def ambiguous_repeats(items, follow, mode):
+        """Variable-length parts of items that could also consume what comes after them (follow: chars that may come after items).
+
+        These are repeats with more than one possible count (``a+``, ``a?``, ``a{1,2}``) and alternations with an empty
+        branch, which is how the parser factors ``a|aa`` into ``a(?:|a)``.
+        """
+        for i, (op, av) in enumerate(items):
+            rest_first, _, rest_nullable = info(items[i + 1:], mode)
+            after = rest_first | follow if rest_nullable else rest_first
+            if op.name in ("MAX_REPEAT", "MIN_REPEAT") and av[1] > av[0]:
+                if info(av[2], mode)[1] & after:
+                    yield op, av
+            elif op.name == "SUBPATTERN":
+                yield from ambiguous_repeats(av[3], after, sub_mode(av, mode))
+            elif op.name == "BRANCH":
+                if not all(av[1]) and node_info(op, av, mode)[1] & after:
+                    yield op, av
+                    continue
+                for branch in av[1]:
+                    yield from ambiguous_repeats(branch, after, mode)
+
+    def branches_in(items):
+        """BRANCH nodes in items, looking through groups but not into nested repeats."""
+        for op, av in items:
+            if op.name == "BRANCH":
+                yield op, av
+            elif op.name == "SUBPATTERN":
+                yield from branches_in(av[3])
+
+    def check_repeat(op, av, mode):
+        body = av[2]
+        first, _, body_nullable = info(body, mode)
+        # Each iteration can hand characters between an inner repeat and what follows it: 2^n ways to fail
+        for inner_op, inner_av in ambiguous_repeats(body, first, mode):
+            if is_open(inner_op, inner_av):
+                risks.append(BacktrackingRisk("exponential", f"nested quantifier: {_unparse([(inner_op, inner_av)])} inside "
+                                                  f"{_unparse([(op, av)])} can split the same text into iterations in many ways"))
+            elif not body_nullable: # An iteration that can be empty just ends the repeat
+                risks.append(BacktrackingRisk("exponential", f"optional part {_unparse([(inner_op, inner_av)])} inside "
+                                                  f"{_unparse([(op, av)])} can end one iteration or start the next, so the same "
+                                                  f"text splits into iterations in many ways"))
+        for branch_op, branch_av in branches_in(body):
+            firsts = [info(branch, mode)[0] for branch in branch_av[1]]
+            if any(a & b for i, a in enumerate(firsts) for b in firsts[i + 1:]):
+                risks.append(BacktrackingRisk("exponential", f"overlapping alternation {_unparse([(branch_op, branch_av)])} inside "
+                                              f"{_unparse([(op, av)])}: several branches can match the same text"))
+
+    def check_adjacent(items, mode):
+        for i, (op, av) in enumerate(items):
+            if not is_open(op, av):
+                continue
+            chars = info(av[2], mode)[1]
+            for next_op, next_av in items[i + 1:]:
+                if is_open(next_op, next_av) and chars & info(next_av[2], mode)[0]:
+                    risks.append(BacktrackingRisk("polynomial", f"{_unparse([(op, av)])} and {_unparse([(next_op, next_av)])} "
+                                                  f"can split the same text between them"))
+                    break
+                if not node_info(next_op, next_av, mode)[2]:
+                    break # Something required sits between them
+
+    def walk(items, mode):
+        for op, av in items:
+            name = op.name
+            if name in _REPEATS:
+                if is_open(op, av):
+                    check_repeat(op, av, mode)
+                walk(av[2], mode)
+            elif name == "SUBPATTERN":
+                walk(av[3], sub_mode(av, mode))
+            elif name == "BRANCH":
+                for branch in av[1]:
+                    walk(branch, mode)
+            elif name in ("ASSERT", "ASSERT_NOT"):
+                walk(av[1], mode)
+            elif name == "ATOMIC_GROUP":
+                walk(av, mode)
+            elif name == "GROUPREF_EXISTS":
+                walk(av[1], mode)
+                if av[2]:
+                    walk(av[2], mode)
+        check_adjacent(items, mode)
+
+    walk(parsed, (bool(parsed.state.flags & re.IGNORECASE), bool(parsed.state.flags & re.DOTALL)))
+    return tuple(dict.fromkeys(risks)) # Drop duplicates, keep order
+
+def profile_pattern(regex, text, first_prefix=PROFILE_FIRST_PREFIX, worst_lines=PROFILE_WORST_LINES):
+    """Time regex over doubling prefixes of text, then line by line.
+
+    Yields ("prefix", chars, seconds, matches) per prefix (each cut at a line end), then
+    ("lines", [(seconds, line_number, preview), ...]) for the slowest lines, slowest first.
+    """
+    clock = time.perf_counter
+    size = first_prefix
+    while True:
+        end = len(text) if size >= len(text) else text.find("\n", size) + 1 or len(text)
+        started = clock()
+        count = sum(1 for _ in regex.finditer(text, 0, end)) # endpos avoids copying the prefix
+        yield ("prefix", end, clock() - started, count)
+        if end >= len(text):
+            break
+        size = end * 2
+
+    slowest = [] # Min-heap of (seconds, line_number, start, end)
+    start = 0
+    for number, next_start in enumerate(chain(line_start_offsets(text), (len(text) + 1,))):
+        started = clock()
+        for _ in regex.finditer(text, start, next_start - 1):
+            pass
+        entry = (clock() - started, number, start, next_start - 1)
+        if len(slowest) < worst_lines:
+            heapq.heappush(slowest, entry)
+        elif entry > slowest[0]:
+            heapq.heapreplace(slowest, entry)
+        start = next_start
+    yield ("lines", [(seconds, number, text[s:e][:FILE_PREVIEW_CHARS]) for seconds, number, s, e in sorted(slowest, reverse=True)])
+
+def scaling_exponent(samples):
+    """Least-squares slope of log(time) over log(size) for (chars, seconds) samples: ~1 is linear, ~2 quadratic.
+
+    Returns None when fewer than two samples are long enough to measure.
+    """
+    points = [(math.log(chars), math.log(seconds)) for chars, seconds in samples if chars > 0 and seconds >= 1e-3]
+    if len(points) < 2:
+        return None
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    spread = sum((x - mean_x) ** 2 for x, _ in points)
+    if not spread:
+        return None
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / spread
+
+# --- Operation Traces ---
+TRACE_CAPACITY = 256 # Operations kept in a Tracer's ring buffer; older ones are dropped
+TRACE_PHASE_EVENTS = 1000 # Phase events kept per operation; later ones still count towards its totals
+TRACE_MAIN_TRACK = "ui"
+
+_NULL_PHASE = nullcontext()
+
+class Operation:
+    """Timings of one traced operation: named phases on one or more tracks, plus notes such as match counts."""
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = dict(args)
+        self.start = time.perf_counter()
+        self.end = None
+        self.events = [] # (phase, track, start, seconds), perf_counter based
+        self.totals = {} # Phase -> seconds, summed over every occurrence
+        self.deferred = False # Finished later, by whoever picked it up with Tracer.defer()
+
+    @contextmanager
+    def phase(self, name, track=TRACE_MAIN_TRACK):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, started, time.perf_counter() - started, track)
+
+    def add(self, name, start, seconds, track=TRACE_MAIN_TRACK):
+        """Record a phase measured elsewhere, e.g. in a worker process (perf_counter is system-wide)."""
+        self.totals[name] = self.totals.get(name, 0.0) + seconds
+        if len(self.events) < TRACE_PHASE_EVENTS:
+            self.events.append((name, track, start, seconds))
+
+    def summary(self):
+        """Short timing breakdown for a status bar, e.g. 'compile 1 ms, scan 118 ms; 131 ms total'."""
+        phases = ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in self.totals.items())
+        total = f"{((self.end or time.perf_counter()) - self.start) * 1000:.0f} ms total"
+        return f"{phases}; {total}" if phases else total
+
+class Tracer:
+    """Bounded in-memory record of traced operations, exportable in Chrome's trace event format.
+
+    While disabled, start() and phase() hand out shared no-op objects, so instrumented code costs
+    an attribute check. Operations nest: starting one inside another adds to the outer one.
+    """
+
+    def __init__(self, enabled=False, capacity=TRACE_CAPACITY, on_finish=None):
+        self.enabled = enabled
+        self.operations = deque(maxlen=capacity)
+        self.current = None # Operation that phase() and note() record into
+        self.on_finish = on_finish # Called with each finished Operation
+        self.origin = time.perf_counter()
+
+    @contextmanager
+    def start(self, name, **args):
+        """Trace the enclosed block as operation name; it is finished at the end unless defer() was called."""
+        if not self.enabled or self.current is not None:
+            yield self.current
+            return
+        operation = self.current = Operation(name, args)
+        try:
+            yield operation
+        finally:
+            self.current = None
+            if not operation.deferred:
+                self.finish(operation)
+
+    def defer(self):
+        """Keep the current operation open past its block (work continues asynchronously); returns it or None."""
+        operation = self.current
+        if operation is not None:
+            operation.deferred = True
+        return operation
+
+    def resume(self, operation):
+        """Context manager making a deferred operation current again, e.g. around a completion callback."""
+        if operation is None or self.current is not None:
+            return _NULL_PHASE
+        return self._resumed(operation)
+
+    @contextmanager
+    def _resumed(self, operation):
+        self.current = operation
+        try:
+            yield operation
+        finally:
+            self.current = None
+
+    def phase(self, name):
+        """Context manager timing a phase of the current operation (a no-op when there is none)."""
+        operation = self.current
+        return _NULL_PHASE if operation is None else operation.phase(name)
+
+    def note(self, **args):
+        """Attach values such as match counts or buffer size to the current operation."""
+        if self.current is not None:
+            self.current.args.update(args)
+
+    def finish(self, operation, **args):
+        """Close operation (if it isn't already) and add it to the ring buffer."""
+        if operation is None or operation.end is not None:
+            return
+        operation.args.update(args)
+        operation.end = time.perf_counter()
+        self.operations.append(operation)
+        if self.on_finish is not None:
+            self.on_finish(operation)
+
+    def clear(self):
+        self.operations.clear()
+
+    def chrome_trace(self):
+        """The recorded operations as a Chrome trace (chrome://tracing, Perfetto): one track per thread/process."""
+        pid = os.getpid()
+        tracks = {TRACE_MAIN_TRACK: 1}
+        events = []
+        for operation in self.operations:
+            events.append({"name": operation.name, "cat": "operation", "ph": "X", "pid": pid, "tid": 1,
+                           "ts": self._micros(operation.start), "dur": (operation.end - operation.start) * 1e6,
+                           "args": dict(operation.args, phases={name: round(seconds, 6) for name, seconds in operation.totals.items()})})
+            for name, track, start, seconds in operation.events:
+                tid = tracks.setdefault(track, len(tracks) + 1)
+                events.append({"name": name, "cat": operation.name, "ph": "X", "pid": pid, "tid": tid,
+                               "ts": self._micros(start), "dur": seconds * 1e6})
+        for track, tid in tracks.items():
+            events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": track}})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def _micros(self, moment):
+        return (moment - self.origin) * 1e6
+
+    def export(self, path):
+        """Write chrome_trace() to path as JSON."""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.chrome_trace(), f, indent=1, default=str)
@@ -1,32 +1,2133 @@
+import time
+_MODULE_STARTED = time.perf_counter() # --startup-time counts the imports below too
 import tkinter as tk
-from tkinter import ttk, filedialog, messagebox, scrolledtext
+from tkinter import ttk, filedialog, messagebox, scrolledtext, simpledialog
 import re
 import os
 import json # Added for config file handling
+import hashlib
+import functools
+import sqlite3 # On-disk AI response cache
+import sys
+import argparse
+import mmap # Large-file mode maps the file instead of reading it into a string
+import tempfile
+import threading
+import queue
+import multiprocessing # Search worker process (re holds the GIL, so only a process can be killed mid-match)
+from multiprocessing import shared_memory # Parallel scans read the buffer text from here instead of pickled copies
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor # Search in Files fans out across cores
+from array import array # Compact line/match offset storage
+from bisect import bisect_left, bisect_right
 # import requests # No longer needed for API
 # import json     # No longer needed for API
-from openai import OpenAI, APIError, APIConnectionError, AuthenticationError, RateLimitError # Added for OpenAI library
+# openai is imported on first use (see _openai): it takes longer to import than the rest of the editor takes to start
 import tkinter.font as tkFont # Import the font module
+from regex_core import (COUNT_CAPACITY, EXTRACT_FORMATS, RECIPES_FILE, STREAM_CHUNK_SIZE, GroupCounter, Histogram, LineIndex, LiteralPrefilter,
+                        RecipeRule, RowWriter, SpanIndex, apply_recipe, extract, extract_columns, group_names, resolve_group,
+                        apply_replacements, backtracking_risks, byte_match_positions, chunkable_pattern, compile_bytes_pattern, compile_pattern,
+                        iter_project_files, key_column, key_line, line_chunk_bounds, line_start_offsets, load_recipes, match_batches, merge_dirty_range, plan_rescan,
+                        merge_prefilter_counts, Tracer, pattern_newline_reach, position_key, profile_pattern, regex_flags, splice_rescan,
+                        replace_file, replacement_regions, save_recipes, BackgroundWriter, scaling_exponent, search_file, split_globs, stream_recipe,
+                        stream_scan)
 
 # Define config file path in user's home directory
 CONFIG_DIR = os.path.expanduser("~/.config/regex_editor")
 CONFIG_FILE = os.path.join(CONFIG_DIR, "config.json")
+AI_CACHE_FILE = os.path.join(CONFIG_DIR, "ai_cache.sqlite3")
+AUTOSAVE_DIR = os.path.join(CONFIG_DIR, "autosave")
+TRACE_ENV = "REGEX_EDITOR_TRACE" # Set to a file path to record timings from startup and write the trace there on exit
+
+HIGHLIGHT_MARGIN_LINES = 200 # Lines above/below the viewport that get tagged in virtualized mode
+SEARCH_TIME_BUDGET = 10.0 # Default seconds a search may run before the worker is killed
+SEARCH_POLL_MS = 50 # How often the UI drains results from the search worker
+WORKER_FLUSH_INTERVAL = 0.1 # Seconds between partial result batches sent by the worker
+WORKER_BATCH_SIZE = 50000 # Max spans per batch sent by the worker
+RESCAN_DEBOUNCE_MS = 250 # Quiet time after an edit before dirty lines are re-searched
+LIVE_SEARCH_DEBOUNCE_MS = 300 # Quiet time after typing in the Pattern field before a live search starts
+REPLACE_MERGE_GAP = 80 # Matches this close together are replaced with one widget edit
+REPLACE_MAX_EDITS = 5000 # Beyond this many edits Replace All rewrites the document in bounded chunks instead
+REPLACE_PREVIEW_CHANGES = 200 # Replacements listed in the Replace All preview
+PARALLEL_MIN_CHARS = 8 * 1024 * 1024 # Texts (or unedited large files, in bytes) this big are scanned on every core
+PARALLEL_CHUNK_MIN = 1024 * 1024 # Smallest block of lines one parallel scan task handles
+PARALLEL_CHUNK_MAX = 16 * 1024 * 1024 # Largest block, bounding what each pool worker decodes at once
+LIVE_VISIBLE_CHARS = 4 * 1024 # Most on-screen text searched synchronously (on the Tk thread) before the background scan
+LARGE_FILE_THRESHOLD = 64 * 1024 * 1024 # Files at least this big open in large-file mode
+LARGE_FILE_WINDOW_LINES = 5000 # Lines loaded into the text widget at a time in large-file mode
+LARGE_FILE_INDEX_BLOCK = 4 * 1024 * 1024 # Bytes the background line indexer handles per step
+LARGE_FILE_INDEX_POLL_MS = 250 # How often indexing progress (and pending window loads) are checked
+SAVE_CHUNK_LINES = 5000 # Lines pulled out of the text widget per chunk when saving
+SAVE_SLICE_MS = 15 # Longest the UI spends handing chunks to the save writer per event-loop turn
+SAVE_POLL_MS = 10 # How often a running save is pumped
+AUTOSAVE_INTERVAL_MS = 60 * 1000 # How often an edited buffer is snapshotted to AUTOSAVE_DIR
+AI_BASE_URL = "https://openrouter.ai/api/v1" # Override with "base_url" in the config file or REGEX_EDITOR_AI_BASE_URL
+AI_MODEL = "google/gemini-flash-1.5"
+AI_TIMEOUT = 60.0 # Default seconds an AI request may take before it is abandoned
+AI_POLL_MS = 50 # How often streamed AI tokens are moved into the response pane
+AI_CACHE_MAX_BYTES = 4 * 1024 * 1024 # Responses kept on disk before least recently used ones are evicted
+AI_CACHE_TTL = 30 * 24 * 3600.0 # Seconds a cached response stays valid
+AI_CACHE_MEMORY_ENTRIES = 128 # Size of the in-memory front tier
+AI_CANDIDATES = 4 # Patterns requested at once by the AI Candidates window
+CANDIDATE_TIME_BUDGET = 2.0 # Seconds a candidate may spend on the examples and sample before it is killed
+CANDIDATE_SAMPLE_CHARS = 1024 * 1024 # Buffer text candidates are timed against
+CANDIDATE_MIN_TIMING = 0.1 # Repeat the sample scan until at least this long has been measured
+RISK_WARN_CHARS = 1024 * 1024 # Buffers this big also get a warning for polynomial (not just exponential) backtracking risks
+PREFILTER_NOTE_CHARS = 1024 * 1024 # Texts this big mention the literal prefilter in the status bar
+POOL_MAX_PENDING = 256 # Files queued in the Search in Files pool at once (keeps walking ahead bounded)
+DEFAULT_EXCLUDE_GLOBS = ".git; .hg; .svn; __pycache__; node_modules; *.min.js"
+
+# --- Large-File Mode ---
+def _text_piece(text):
+    return ("text", text, LineIndex(text))
+
+class LargeFileSource:
+    """Picklable snapshot of a LargeFileBuffer's pieces that a worker process reads back as text chunks."""
+
+    def __init__(self, path, pieces):
+        self.path = path
+        self.pieces = pieces # ("file", start, end) byte ranges and ("text", str) pieces
+        self.size = sum(piece[2] - piece[1] if piece[0] == "file" else len(piece[1]) for piece in pieces)
+        self.consumed = 0 # Bytes/chars handed out so far, for progress reporting
+        self.output_path = None # Where a streamed Replace All writes its result
+        self.byte_search = False # Run a bytes pattern over the mapped file instead of decoding it
+
+    @property
+    def unedited(self):
+        """True if the document is still exactly the file on disk, so it can be searched as raw bytes."""
+        return all(piece[0] == "file" for piece in self.pieces) and len(self.pieces) <= 1
+
+    def iter_text(self, errors="replace"):
+        """Yield the document as str chunks, cut at newlines so no UTF-8 sequence is split."""
+        with open(self.path, "rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+            try:
+                for piece in self.pieces:
+                    if piece[0] == "text":
+                        for i in range(0, len(piece[1]), STREAM_CHUNK_SIZE):
+                            chunk = piece[1][i:i + STREAM_CHUNK_SIZE]
+                            self.consumed += len(chunk)
+                            yield chunk
+                        continue
+                    for start, stop in line_chunk_bounds(data, STREAM_CHUNK_SIZE, piece[1], piece[2]):
+                        self.consumed += stop - start
+                        yield data[start:stop].decode("utf-8", errors)
+            finally:
+                if isinstance(data, mmap.mmap):
+                    data.close()
+
+class LargeFileBuffer:
+    """A file edited through a paged window instead of being loaded whole.
+
+    The file is memory-mapped and its line starts are indexed by a background thread. The document
+    is a piece table of ("file", start, end) byte ranges of the mapping and ("text", str, LineIndex)
+    pieces holding edited lines, so saving streams the pieces back out.
+    """
+
+    def __init__(self, path, temporary=False):
+        self.path = path
+        self.temporary = temporary # Base file is scratch output (e.g. from Replace All), deleted on close
+        self._file = open(path, "rb")
+        self.size = os.fstat(self._file.fileno()).st_size
+        self.data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b""
+        self.line_offsets = array('q', [0]) # Byte offset of every line start in the file
+        self.indexed_to = 0
+        self.pieces = [("file", 0, self.size)] if self.size else []
+        self._closed = False
+        self._index_next_block() # Index the first block now so the first window can show at once
+        self._indexer = threading.Thread(target=self._index_remaining, daemon=True)
+        self._indexer.start()
+
+    @property
+    def index_done(self):
+        return self.indexed_to >= self.size
+
+    def _index_next_block(self):
+        start = self.indexed_to
+        end = min(start + LARGE_FILE_INDEX_BLOCK, self.size)
+        self.line_offsets.extend(line_start_offsets(self.data[start:end], start))
+        self.indexed_to = end
+
+    def _index_remaining(self):
+        try:
+            while not self._closed and not self.index_done:
+                self._index_next_block()
+        except ValueError:
+            pass # Mapping closed underneath us
+
+    def close(self):
+        self._closed = True
+        self._indexer.join()
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self._file.close()
+        if self.temporary:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+    def _piece_length(self, piece):
+        return piece[2] - piece[1] if piece[0] == "file" else len(piece[1])
+
+    def _piece_newlines(self, piece):
+        """Return (newlines, complete); a file piece the indexer hasn't finished only counts its indexed part."""
+        if piece[0] == "text":
+            return len(piece[2].line_starts) - 1, True
+        end = min(piece[2], self.indexed_to)
+        return bisect_right(self.line_offsets, end) - bisect_right(self.line_offsets, piece[1]), end == piece[2]
+
+    def line_count(self):
+        """Return (lines, exact); lines is a lower bound while the indexer is still running."""
+        lines = 1
+        for piece in self.pieces:
+            newlines, complete = self._piece_newlines(piece)
+            lines += newlines
+            if not complete:
+                return lines, False
+        return lines, True
+
+    def _locate_line(self, line):
+        """Return (piece index, offset in piece) where logical line starts, or None if not indexed yet."""
+        remaining = line
+        for i, piece in enumerate(self.pieces):
+            if remaining == 0:
+                return i, 0
+            newlines, complete = self._piece_newlines(piece)
+            if remaining <= newlines:
+                # The line starts just after this piece's remaining-th newline
+                if piece[0] == "text":
+                    return i, piece[2].line_starts[remaining]
+                first = bisect_right(self.line_offsets, piece[1])
+                return i, self.line_offsets[first + remaining - 1] - piece[1]
+            if not complete:
+                return None
+            remaining -= newlines
+        return len(self.pieces), 0 # Past the end of the document
+
+    def read_lines(self, first, last):
+        """Return (text, end) for logical lines [first, end), end being last cut down to what exists and is
+        indexed so far; None if first itself isn't available yet."""
+        lines, exact = self.line_count()
+        last = min(last, lines if exact else lines - 1) # The last known line start may not end yet
+        if first >= last:
+            return None
+        start, end = self._locate_line(first), self._locate_line(last)
+        parts = []
+        (i, offset), (j, end_offset) = start, end
+        while (i, offset) < (j, end_offset):
+            piece = self.pieces[i]
+            stop = end_offset if i == j else self._piece_length(piece)
+            if piece[0] == "file":
+                parts.append(self.data[piece[1] + offset:piece[1] + stop].decode("utf-8", "replace"))
+            else:
+                parts.append(piece[1][offset:stop])
+            i, offset = i + 1, 0
+        return "".join(parts), last
+
+    def _split_at_line(self, line):
+        """Put a piece boundary where logical line starts; return the index of the piece after it."""
+        i, offset = self._locate_line(line)
+        if i >= len(self.pieces) or offset == 0:
+            return i
+        piece = self.pieces[i]
+        if offset == self._piece_length(piece):
+            return i + 1
+        if piece[0] == "file":
+            self.pieces[i:i + 1] = [("file", piece[1], piece[1] + offset), ("file", piece[1] + offset, piece[2])]
+        else:
+            self.pieces[i:i + 1] = [_text_piece(piece[1][:offset]), _text_piece(piece[1][offset:])]
+        return i + 1
+
+    def replace_lines(self, first, last, text):
+        """Replace logical lines [first, last) with text (an edited window)."""
+        i = self._split_at_line(first)
+        j = self._split_at_line(last)
+        self.pieces[i:j] = [_text_piece(text)] if text else []
+
+    def source(self):
+        """Snapshot the pieces for a worker process."""
+        return LargeFileSource(self.path, [piece[:2] if piece[0] == "text" else piece for piece in self.pieces])
+
+    def chunks(self):
+        """Yield the document for saving: str pieces (edited text) and bytes blocks copied out of the mapping.
+
+        The piece list is snapshotted now, so edits made while the chunks are consumed don't leak in.
+        """
+        return self._chunks(list(self.pieces))
+
+    def _chunks(self, pieces):
+        for piece in pieces:
+            if piece[0] == "text":
+                yield piece[1]
+                continue
+            for block in range(piece[1], piece[2], STREAM_CHUNK_SIZE):
+                yield self.data[block:min(block + STREAM_CHUNK_SIZE, piece[2])]
+
+# --- Background Search Worker ---
+def _search_worker_main(conn, mode, pattern, flags, text, start=0, replacement=None):
+    """Child-process entry point: run one search or replace over a text snapshot.
+
+    Streams ("batch", starts, ends, replacements, scanned_to) messages over conn, then
+    ("prefilter", PrefilterStats) if a literal prefilter was used and ("timings", phases),
+    and finishes with ("done", result) or ("error", kind, message).
+    """
+    try:
+        compile_started = time.perf_counter()
+        regex = compile_pattern(pattern, flags)
+        prefilter = LiteralPrefilter.for_pattern(pattern, flags) # Only run the regex near its required literals
+        scan_started = time.perf_counter()
+        if isinstance(text, LargeFileSource) and text.byte_search:
+            result = _search_source_bytes(conn, compile_bytes_pattern(pattern, flags), text)
+            prefilter = None # re's own literal scan works on bytes; LiteralPrefilter only handles str
+        elif isinstance(text, LargeFileSource):
+            result = _search_source(conn, regex, text, replacement, prefilter)
+        else:
+            for batch in match_batches(regex, text, start, replacement, prefilter, WORKER_BATCH_SIZE, WORKER_FLUSH_INTERVAL):
+                conn.send(("batch",) + batch)
+            result = None
+        if prefilter is not None:
+            conn.send(("prefilter", prefilter.stats()))
+        # (phase, perf_counter start, seconds): perf_counter is system-wide, so the editor can place these on its timeline
+        conn.send(("timings", [("compile", compile_started, scan_started - compile_started), ("scan", scan_started, time.perf_counter() - scan_started)]))
+        conn.send(("done", result))
+    except re.error as e:
+        conn.send(("error", "regex", str(e)))
+    except Exception as e:
+        conn.send(("error", "other", str(e)))
+    finally:
+        conn.close()
+
+def _end_position(match, line, column):
+    """The 0-based (line, column) a str match that starts at line/column ends at."""
+    matched = match.group()
+    newlines = matched.count("\n")
+    return line + newlines, len(matched) - matched.rfind("\n") - 1 if newlines else column + len(matched)
+
+def _search_source(conn, regex, source, replacement, prefilter=None):
+    """Worker side of large-file mode: stream the document, sending (line, column) key spans or writing replacements.
+
+    Returns the number of replacements written (0 when only searching).
+    """
+    starts, ends = array('q'), array('q')
+    count = 0
+    last_flush = time.monotonic()
+    # surrogateescape round-trips undecodable bytes when rewriting the file
+    output_file = open(source.output_path, "w", encoding="utf-8", errors="surrogateescape", newline="") if replacement is not None else None
+    try:
+        for gap, match, offset, line, column in stream_scan(source.iter_text("surrogateescape" if output_file else "replace"), regex, prefilter=prefilter):
+            if output_file is not None:
+                output_file.write(gap)
+                if match is not None:
+                    output_file.write(match.expand(replacement))
+                    count += 1
+            elif match is not None:
+                starts.append(position_key(line, column))
+                ends.append(position_key(*_end_position(match, line, column)))
+            if len(starts) >= WORKER_BATCH_SIZE or time.monotonic() - last_flush > WORKER_FLUSH_INTERVAL:
+                conn.send(("batch", starts, ends, [], source.consumed))
+                starts, ends = array('q'), array('q')
+                last_flush = time.monotonic()
+        conn.send(("batch", starts, ends, [], source.consumed))
+        return count
+    finally:
+        if output_file is not None:
+            output_file.close()
+
+def _search_source_bytes(conn, regex, source):
+    """Worker side of byte search: run a bytes regex over the mapped file, sending (line, column) key spans.
+
+    Only the matched lines are decoded (leniently, as the editor shows them) to find character columns.
+    """
+    starts, ends = array('q'), array('q')
+    last_flush = time.monotonic()
+    with open(source.path, "rb") as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+        try:
+            for match, line, column, end_line, end_column in byte_match_positions(data, regex):
+                starts.append(position_key(line, column))
+                ends.append(position_key(end_line, end_column))
+                if len(starts) >= WORKER_BATCH_SIZE or time.monotonic() - last_flush > WORKER_FLUSH_INTERVAL:
+                    conn.send(("batch", starts, ends, [], match.end()))
+                    starts, ends = array('q'), array('q')
+                    last_flush = time.monotonic()
+        finally:
+            if isinstance(data, mmap.mmap):
+                data.close()
+    conn.send(("batch", starts, ends, [], source.size))
+    return 0
+
+def _chunk_matches(regex, text, replacement, prefilter, last):
+    """Match one block of lines; a non-final block drops matches at its very end, which the next block finds."""
+    starts, ends, replacements = array('q'), array('q'), []
+    for batch in match_batches(regex, text, 0, replacement, prefilter, len(text) + 1, float("inf")):
+        starts.extend(batch[0])
+        ends.extend(batch[1])
+        replacements.extend(batch[2])
+    while not last and starts and starts[-1] == len(text):
+        starts.pop()
+        ends.pop()
+        del replacements[len(starts):]
+    return starts, ends, replacements
+
+def _scan_shared_chunk(name, byte_start, byte_end, base, last, pattern, flags, replacement):
+    """Pool task: match one block of lines of the buffer text in shared memory; spans come back as document offsets,
+    with the block's PrefilterCounts (None if the pattern has no literal prefilter)."""
+    shared = shared_memory.SharedMemory(name)
+    try:
+        view = shared.buf[byte_start:byte_end]
+        text = str(view, "utf-8", "surrogatepass")
+        view.release()
+    finally:
+        shared.close()
+    prefilter = LiteralPrefilter.for_pattern(pattern, flags)
+    starts, ends, replacements = _chunk_matches(compile_pattern(pattern, flags), text, replacement, prefilter, last)
+    if base:
+        starts, ends = array('q', (start + base for start in starts)), array('q', (end + base for end in ends))
+    return starts, ends, replacements, prefilter and prefilter.counts()
+
+def _scan_file_chunk(path, byte_start, byte_end, first_line, last, pattern, flags, byte_search):
+    """Pool task: match one block of lines of a mapped file; spans come back as (line, column) keys, with the
+    block's PrefilterCounts (None for a byte search or a pattern without a literal prefilter)."""
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        block = data[byte_start:byte_end]
+    starts, ends = array('q'), array('q')
+    prefilter = None
+    if byte_search:
+        size = len(block)
+        positions = ((match.start(), *position) for match, *position in byte_match_positions(block, compile_bytes_pattern(pattern, flags)))
+    else:
+        text = block.decode("utf-8", "replace")
+        size = len(text)
+        prefilter = LiteralPrefilter.for_pattern(pattern, flags)
+        positions = ((offset, line, column) + _end_position(match, line, column)
+                     for _, match, offset, line, column in stream_scan((text,), compile_pattern(pattern, flags), prefilter=prefilter)
+                     if match is not None)
+    for offset, line, column, end_line, end_column in positions:
+        if not last and offset == size:
+            break
+        starts.append(position_key(first_line + line, column))
+        ends.append(position_key(first_line + end_line, end_column))
+    return starts, ends, [], prefilter and prefilter.counts()
+
+class SearchJob:
+    """A search/replace running in a worker process, with results accumulated as they stream in."""
+
+    def __init__(self, mode, pattern, flags, text, start=0, replacement=None):
+        self.mode = mode
+        self.text_length = text.size if isinstance(text, LargeFileSource) else len(text)
+        self.spans = SpanIndex()
+        self.replacements = []
+        self.scanned_to = 0 # Offset the worker has reported progress up to
+        self.streaming = isinstance(text, LargeFileSource) # Large-file jobs are budgeted on stalls, not total time
+        self.output_path = getattr(text, "output_path", None)
+        self.byte_search = getattr(text, "byte_search", False)
+        self.prefilter = None # PrefilterStats, if the worker used a literal prefilter
+        self.trace = None # Operation timing this job, when tracing is on
+        self.done = False
+        context = multiprocessing.get_context()
+        self.conn, child_conn = context.Pipe(duplex=False)
+        self.process = context.Process(target=_search_worker_main, args=(child_conn, mode, pattern, flags, text, start, replacement), daemon=True)
+        self.started = self.last_progress = time.monotonic()
+        self.process.start()
+        child_conn.close() # The child holds its own copy
+
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def progress(self):
+        """Fraction of the snapshot scanned so far."""
+        return self.scanned_to / self.text_length if self.text_length else 0.0
+
+    def receive(self):
+        """Yield messages that have arrived from the worker, without blocking."""
+        while self.conn.poll():
+            message = self.conn.recv()
+            if message[0] == "batch":
+                _, starts, ends, replacements, scanned_to = message
+                self.spans.extend(starts, ends)
+                self.replacements.extend(replacements)
+                if scanned_to > self.scanned_to:
+                    self.last_progress = time.monotonic()
+                self.scanned_to = scanned_to
+            elif message[0] == "prefilter":
+                self.prefilter = message[1]
+                continue
+            elif message[0] == "timings":
+                if self.trace is not None:
+                    for phase, started, seconds in message[1]:
+                        self.trace.add(phase, started, seconds, "search worker")
+                continue
+            elif message[0] == "done":
+                self.done = True
+            yield message
+            if message[0] != "batch":
+                return # "done" or "error" is always the last message
+
+    def cancel(self):
+        """Kill the worker process, e.g. on user cancel or when it overruns its time budget."""
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process.join(timeout=1)
+        self.conn.close()
+        if self.output_path and not self.done:
+            try:
+                os.remove(self.output_path) # Partial Replace All output
+            except OSError:
+                pass
+
+class ParallelSearchJob:
+    """A search/replace split into blocks of whole lines that a process pool scans on every core.
+
+    Only used for patterns whose matches can't cross a line (see chunkable_pattern). Buffer text is
+    shared with the pool through shared memory and a large file through its own mapping, so nothing
+    big is pickled. Block results are merged back in document order, and receive() yields the same
+    messages as SearchJob's, so the editor handles both alike.
+    """
+
+    def __init__(self, mode, pattern, flags, text, replacement=None, buffer=None):
+        self.mode = mode
+        self.text_length = text.size if isinstance(text, LargeFileSource) else len(text)
+        self.spans = SpanIndex()
+        self.replacements = []
+        self.scanned_to = 0
+        self.streaming = isinstance(text, LargeFileSource)
+        self.output_path = None
+        self.prefilter = None # PrefilterStats merged from every block's literal prefilter, once all are in
+        self.pattern, self.flags = pattern, flags
+        self.prefilter_counts = [] # PrefilterCounts of the blocks merged so far
+        self.trace = None
+        self.done = False
+        self.byte_search = getattr(text, "byte_search", False)
+        self.shared = None
+        workers = os.cpu_count() or 1
+        size = min(max(self.text_length // (workers * 4), PARALLEL_CHUNK_MIN), PARALLEL_CHUNK_MAX) # A few blocks per core
+        if self.streaming:
+            # Blocks are cut at line starts the background indexer found, which also number their first lines
+            bounds = list(line_chunk_bounds(buffer.data, size))
+            tasks = [(_scan_file_chunk, text.path, lo, hi, bisect_right(buffer.line_offsets, lo) - 1, hi == text.size, pattern, flags, self.byte_search)
+                     for lo, hi in bounds]
+        else:
+            bounds = list(line_chunk_bounds(text, size))
+            blocks = [text[lo:hi].encode("utf-8", "surrogatepass") for lo, hi in bounds]
+            self.shared = shared_memory.SharedMemory(create=True, size=sum(map(len, blocks)))
+            tasks, offset = [], 0
+            for (lo, hi), block in zip(bounds, blocks):
+                self.shared.buf[offset:offset + len(block)] = block
+                tasks.append((_scan_shared_chunk, self.shared.name, offset, offset + len(block), lo, hi == len(text), pattern, flags, replacement))
+                offset += len(block)
+            del blocks
+        self.reached = [hi for _, hi in bounds] # Where the text is scanned to once each block is merged
+        self.started = self.last_progress = time.monotonic()
+        self.perf_started = time.perf_counter()
+        self.executor = ProcessPoolExecutor(workers)
+        self.futures = [self.executor.submit(*task) for task in tasks]
+        self.merged = 0 # Blocks whose results are in spans
+        self.finished = 0 # Blocks done in any order, for progress
+
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def progress(self):
+        """Fraction of the text merged so far."""
+        return self.scanned_to / self.text_length if self.text_length else 0.0
+
+    def receive(self):
+        """Yield a batch for each block finished in document order, without blocking."""
+        finished = sum(1 for future in self.futures if future.done())
+        if finished > self.finished:
+            self.finished = finished
+            self.last_progress = time.monotonic()
+        while self.merged < len(self.futures) and self.futures[self.merged].done():
+            try:
+                starts, ends, replacements, prefilter_counts = self.futures[self.merged].result()
+            except re.error as e:
+                yield ("error", "regex", str(e))
+                return
+            except Exception as e: # e.g. BrokenProcessPool
+                yield ("error", "other", str(e))
+                return
+            self.spans.extend(starts, ends)
+            self.replacements.extend(replacements)
+            if prefilter_counts:
+                self.prefilter_counts.append(prefilter_counts)
+            self.scanned_to = self.reached[self.merged]
+            self.merged += 1
+            yield ("batch", starts, ends, replacements, self.scanned_to)
+        if self.merged == len(self.futures):
+            if self.prefilter_counts:
+                prefilter = LiteralPrefilter.for_pattern(self.pattern, self.flags)
+                self.prefilter = prefilter.stats(merge_prefilter_counts(self.prefilter_counts))
+            if self.trace is not None:
+                self.trace.add("scan", self.perf_started, time.perf_counter() - self.perf_started, "search pool")
+            self.done = True
+            yield ("done", None)
+
+    def cancel(self):
+        """Shut the pool down, killing workers still mid-match, and free the shared text."""
+        executor, self.executor = self.executor, None
+        if executor is not None:
+            # Pool workers can't be interrupted mid-match; terminating them stops a runaway pattern
+            processes = list((getattr(executor, "_processes", None) or {}).values()) if not self.done else []
+            executor.shutdown(wait=False, cancel_futures=True)
+            for process in processes:
+                process.terminate()
+        if self.shared is not None:
+            self.shared.close()
+            self.shared.unlink()
+            self.shared = None
+
+def _openai():
+    """The openai module, imported the first time the AI assistant needs it."""
+    import openai
+    return openai
+
+def _preload_openai():
+    """Import openai off the UI thread; a missing package is reported when the assistant is first used instead."""
+    try:
+        _openai()
+    except ImportError:
+        pass
+
+class SaveJob:
+    """A save in progress: the UI thread pulls the document out in chunks and a BackgroundWriter writes them."""
+
+    def __init__(self, path, chunks, total, generation, live, autosave=False):
+        self.path = path
+        self.chunks = chunks # Iterator of (str or bytes chunk, progress units)
+        self.total = total # Progress units in the whole document
+        self.generation = generation # Buffer generation the document is saved at
+        self.live = live # Chunks are read from the widget as they are pulled, so an edit midway spoils the save
+        self.autosave = autosave
+        self.pulled = 0 # Progress units handed to the writer so far
+        self.all_pulled = False
+        self.trace = None # Operation timing this save, when tracing is on
+        self.started = time.monotonic()
+        self.writer = BackgroundWriter(path)
+
+    def progress(self):
+        return min(self.pulled / self.total, 1.0) if self.total else 1.0
+
+class AIRequest:
+    """One chat completion streamed by a background thread; the UI drains output between Tk events."""
+
+    def __init__(self, client, model, messages, max_tokens, temperature, timeout):
+        self.client = client
+        self.model = model
+        self.messages = messages
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.timeout = timeout
+        self.output = queue.Queue() # ("text", chunk), then ("done", None) or ("error", title, message)
+        self.cancelled = threading.Event()
+        self.text = "" # Everything received so far
+        self.started = time.monotonic()
+        self.sent_at = self.first_token_at = self.finished_at = None # perf_counter times, for traces
+        self.trace = None # Operation timing this request, when tracing is on
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        """Worker thread: stream the completion into self.output, stopping early once cancelled."""
+        openai = _openai()
+        self.sent_at = time.perf_counter()
+        try:
+            stream = self.client.chat.completions.create(
+                model=self.model,
+                messages=self.messages,
+                max_tokens=self.max_tokens,
+                temperature=self.temperature,
+                timeout=self.timeout,
+                stream=True,
+            )
+            try:
+                for chunk in stream:
+                    if self.cancelled.is_set():
+                        return
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        if self.first_token_at is None:
+                            self.first_token_at = time.perf_counter()
+                        self.output.put(("text", chunk.choices[0].delta.content))
+            finally:
+                stream.close() # Hands the connection back to the client's pool
+            self.finished_at = time.perf_counter()
+            self.output.put(("done", None))
+        except openai.AuthenticationError as e:
+            self.output.put(("error", "AI Error", f"API Authentication Error: Invalid API Key or insufficient permissions. {e}"))
+        except openai.APIConnectionError as e:
+            self.output.put(("error", "AI Error", f"API Connection Error: Failed to connect to the AI API. {e}"))
+        except openai.RateLimitError as e:
+            self.output.put(("error", "AI Error", f"API Rate Limit Error: Rate limit exceeded. {e}"))
+        except openai.APIError as e:
+            self.output.put(("error", "AI Error", f"OpenRouter API Error: {e}"))
+        except Exception as e:
+            self.output.put(("error", "Error", f"An unexpected error occurred: {e}"))
+
+class AIResponseCache:
+    """AI responses keyed by request: a small in-memory LRU in front of a size-bounded SQLite file with a TTL."""
+
+    def __init__(self, path, max_bytes=AI_CACHE_MAX_BYTES, ttl=AI_CACHE_TTL, memory_entries=AI_CACHE_MEMORY_ENTRIES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.memory_entries = memory_entries
+        self.memory = OrderedDict() # key -> (response, latency, created)
+        self._db = None
+
+    @staticmethod
+    def make_key(model, prompt, temperature, max_tokens):
+        """Key on everything that shapes the answer; whitespace differences in the prompt don't count."""
+        normalized = " ".join(prompt.split())
+        return hashlib.sha256(json.dumps([model, normalized, temperature, max_tokens]).encode("utf-8")).hexdigest()
+
+    def _connect(self):
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._db = sqlite3.connect(self.path)
+            self._db.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, response TEXT NOT NULL,"
+                             " latency REAL NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)")
+        return self._db
+
+    def _remember(self, key, entry):
+        self.memory[key] = entry
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+
+    def get(self, key):
+        """Return (response, latency of the original request) or None; expired entries are misses."""
+        now = time.time()
+        entry = self.memory.get(key)
+        if entry is not None:
+            if now - entry[2] <= self.ttl:
+                self.memory.move_to_end(key)
+                return entry[0], entry[1]
+            del self.memory[key]
+        try:
+            db = self._connect()
+            row = db.execute("SELECT response, latency, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if now - row[2] > self.ttl:
+                db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                db.commit()
+                return None
+            db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            db.commit()
+        except sqlite3.Error as e:
+            print(f"Warning: AI cache unavailable at {self.path}. Error: {e}")
+            return None
+        self._remember(key, row)
+        return row[0], row[1]
+
+    def put(self, key, response, latency):
+        now = time.time()
+        self._remember(key, (response, latency, now))
+        try:
+            db = self._connect()
+            db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)", (key, response, latency, now, now))
+            self._evict(db, now)
+            db.commit()
+        except sqlite3.Error as e:
+            print(f"Warning: Could not write AI cache at {self.path}. Error: {e}")
+
+    def _evict(self, db, now):
+        """Drop expired entries, then least recently used ones until the file is back under max_bytes."""
+        db.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+        total = db.execute("SELECT COALESCE(SUM(LENGTH(response)), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in db.execute("SELECT key, LENGTH(response) FROM responses ORDER BY accessed").fetchall():
+            if total <= self.max_bytes:
+                break
+            db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self.memory.pop(key, None)
+            total -= size
+
+# --- AI Pattern Candidates ---
+def _extract_ai_pattern(response):
+    """Best-effort pattern from a chat answer: the first line of its first code block, without backticks or r'' quoting."""
+    fenced = re.search(r"```[^\n]*\n(.*?)```", response, re.DOTALL)
+    if fenced:
+        response = fenced.group(1)
+    line = next((line.strip() for line in response.splitlines() if line.strip()), "")
+    if len(line) >= 2 and line[0] == line[-1] == "`":
+        line = line.strip("`")
+    if len(line) >= 3 and line[0] == "r" and line[1] in "'\"" and line[-1] == line[1]:
+        line = line[2:-1]
+    return line
+
+def _candidate_worker_main(conn, pattern, flags, sample, positives, negatives):
+    """Child-process entry point: score one pattern on the examples, then time it over the sample.
+
+    Sends ("done", examples_passed, match_count, chars_per_second or None) or ("error", kind, message).
+    """
+    try:
+        regex = compile_pattern(pattern, flags)
+        # Positives must be matched in full; negatives must not match anywhere
+        passed = sum(1 for example in positives if regex.fullmatch(example))
+        passed += sum(1 for example in negatives if not regex.search(example))
+        count, scanned, started = 0, 0, time.perf_counter()
+        while sample:
+            count = sum(1 for _ in regex.finditer(sample))
+            scanned += len(sample)
+            if time.perf_counter() - started >= CANDIDATE_MIN_TIMING:
+                break
+        elapsed = time.perf_counter() - started
+        conn.send(("done", passed, count, scanned / elapsed if scanned else None))
+    except re.error as e:
+        conn.send(("error", "regex", str(e)))
+    except Exception as e:
+        conn.send(("error", "other", str(e)))
+    finally:
+        conn.close()
+
+class WorkerProcess:
+    """A helper process whose messages are polled from Tk and which can be killed at any time (e.g. mid-backtrack)."""
+
+    def __init__(self, target, *args):
+        context = multiprocessing.get_context()
+        self.conn, child_conn = context.Pipe(duplex=False)
+        self.process = context.Process(target=target, args=(child_conn,) + args, daemon=True)
+        self.started = time.monotonic()
+        self.process.start()
+        child_conn.close()
+
+    def receive(self):
+        """Yield messages that have arrived, without blocking; a worker that died without finishing yields an error.
+
+        Stop iterating after the worker's final message.
+        """
+        while True:
+            if self.conn.poll():
+                try:
+                    yield self.conn.recv()
+                    continue
+                except EOFError:
+                    pass
+            elif self.process.is_alive():
+                return
+            yield ("error", "other", f"worker exited with code {self.process.exitcode}")
+            return
+
+    def cancel(self):
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process.join(timeout=1)
+        self.conn.close()
+
+class CandidatesWindow:
+    """AI Candidates: ask for several patterns at once, then rank them by correctness on examples and by speed."""
+
+    STATUS_RANK = {"ok": 0, "timeout": 1, "error": 2, "testing": 3} # Sort order of the status column
+
+    def __init__(self, editor):
+        self.editor = editor
+        self.window = tk.Toplevel(editor.root)
+        self.window.title("AI Pattern Candidates")
+        self.window.geometry("800x600")
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+        self.requests = [] # AIRequests still streaming
+        self.pending = [] # Tree items waiting for a trial
+        self.trials = {} # Tree item -> WorkerProcess running _candidate_worker_main
+        self.scores = {} # Tree item -> (status rank, examples passed, chars/s) for sorting
+        self.patterns = {} # Tree item -> pattern
+        self.errors = []
+        self._poll_id = None
+
+        form = ttk.Frame(self.window, padding="10")
+        form.pack(fill=tk.X)
+        ttk.Label(form, text="Request:").grid(row=0, column=0, padx=5, pady=2, sticky=tk.W)
+        self.query_entry = ttk.Entry(form)
+        self.query_entry.insert(0, editor.ai_query_input.get("1.0", tk.END).strip())
+        self.query_entry.grid(row=0, column=1, columnspan=2, padx=5, pady=2, sticky=(tk.W, tk.E))
+        self.query_entry.bind("<Return>", lambda event: self.generate())
+        ttk.Label(form, text="Should match (one per line, in full):").grid(row=1, column=1, padx=5, pady=(5, 0), sticky=tk.W)
+        ttk.Label(form, text="Should not match (one per line):").grid(row=1, column=2, padx=5, pady=(5, 0), sticky=tk.W)
+        self.positives_input = scrolledtext.ScrolledText(form, height=5, width=30, wrap=tk.NONE)
+        self.positives_input.grid(row=2, column=1, padx=5, pady=2, sticky=(tk.W, tk.E))
+        self.negatives_input = scrolledtext.ScrolledText(form, height=5, width=30, wrap=tk.NONE)
+        self.negatives_input.grid(row=2, column=2, padx=5, pady=2, sticky=(tk.W, tk.E))
+        selection = editor.text_area.tag_ranges(tk.SEL)
+        if selection:
+            self.positives_input.insert("1.0", editor._text_get(selection[0], selection[1]))
+        form.columnconfigure(1, weight=1)
+        form.columnconfigure(2, weight=1)
+
+        buttons = ttk.Frame(self.window, padding=(10, 0))
+        buttons.pack(fill=tk.X)
+        ttk.Label(buttons, text="Candidates:").pack(side=tk.LEFT)
+        self.count_var = tk.IntVar(value=AI_CANDIDATES)
+        ttk.Spinbox(buttons, from_=1, to=10, width=3, textvariable=self.count_var).pack(side=tk.LEFT, padx=(2, 10))
+        self.generate_button = ttk.Button(buttons, text="Generate", command=self.generate)
+        self.generate_button.pack(side=tk.LEFT)
+        ttk.Button(buttons, text="Re-test", command=self.retest).pack(side=tk.LEFT, padx=(5, 0))
+        self.cancel_button = ttk.Button(buttons, text="Cancel", command=self.cancel, state=tk.DISABLED)
+        self.cancel_button.pack(side=tk.LEFT, padx=(5, 0))
+        ttk.Button(buttons, text="Use Best", command=self.use_best).pack(side=tk.RIGHT)
+        ttk.Button(buttons, text="Use Selected", command=self.use_selected).pack(side=tk.RIGHT, padx=(0, 5))
+
+        # --- Candidates, best first ---
+        results_frame = ttk.Frame(self.window, padding="10")
+        results_frame.pack(fill=tk.BOTH, expand=True)
+        self.tree = ttk.Treeview(results_frame, columns=("pattern", "examples", "matches", "speed", "status"), show="headings")
+        for column, heading, width in (("pattern", "Pattern", 340), ("examples", "Examples", 80), ("matches", "Matches", 80),
+                                       ("speed", "MB/s", 80), ("status", "Status", 160)):
+            self.tree.heading(column, text=heading)
+            self.tree.column(column, width=width, stretch=(column == "pattern"))
+        self.tree.pack(fill=tk.BOTH, expand=True)
+        self.tree.bind("<Double-1>", lambda event: self.use_selected())
+
+        self.status_var = tk.StringVar(value="Patterns are tested against the examples and timed on the open document.")
+        ttk.Label(self.window, textvariable=self.status_var, relief=tk.SUNKEN, anchor=tk.W, padding=5).pack(side=tk.BOTTOM, fill=tk.X)
+
+    def _examples(self, widget):
+        return [line for line in widget.get("1.0", tk.END).split("\n") if line]
+
+    def generate(self):
+        """Request the candidates concurrently; each one is tested as soon as its answer arrives."""
+        api_key = self.editor.api_key_entry.get()
+        query = self.query_entry.get().strip()
+        if not api_key:
+            messagebox.showerror("AI Candidates", "Please enter your OpenRouter API Key in the AI sidebar.", parent=self.window)
+            return
+        if not query:
+            return
+        try:
+            client = self.editor._get_ai_client(api_key)
+        except ImportError as e:
+            messagebox.showerror("AI Candidates", f"The AI assistant needs the openai package (pip install openai): {e}", parent=self.window)
+            return
+        try:
+            count = max(1, min(10, int(self.count_var.get())))
+            timeout = float(self.editor.ai_timeout_var.get())
+        except (tk.TclError, ValueError):
+            count, timeout = AI_CANDIDATES, AI_TIMEOUT
+        self.cancel(quiet=True)
+        self.tree.delete(*self.tree.get_children())
+        self.patterns, self.scores, self.errors = {}, {}, []
+        self.api_key = api_key
+        prompt = (
+            f"Write one Python re module regular expression for the request below. "
+            f"Reply with only the pattern on a single line: no explanation, quotes or code fences.\n\n"
+            f"Request: {query}\n\n"
+            f"Pattern:"
+        )
+        messages = [{"role": "user", "content": prompt}]
+        for i in range(count):
+            temperature = round(min(1.2, 0.2 + 0.3 * i), 1) # Spread temperatures so the candidates differ
+            request = AIRequest(client, AI_MODEL, messages, 200, temperature, timeout)
+            request.cache_key = AIResponseCache.make_key(AI_MODEL, prompt, temperature, 200)
+            cached = self.editor.ai_cache.get(request.cache_key) if self.editor.ai_use_cache_var.get() else None
+            request.cached = bool(cached)
+            if cached:
+                request.text = cached[0]
+                request.output.put(("done", None))
+            else:
+                request.start()
+            self.requests.append(request)
+        self.started = time.monotonic()
+        self.cancel_button.config(state=tk.NORMAL)
+        self.status_var.set(f"Asking for {count} candidates...")
+        self._poll_id = self.window.after(SEARCH_POLL_MS, self._poll)
+
+    def retest(self):
+        """Re-run every candidate, e.g. after editing the examples or the document."""
+        if self.requests or self.trials:
+            return
+        for item in self.tree.get_children():
+            self._queue_trial(item)
+        if self.pending:
+            self.started = time.monotonic()
+            self.cancel_button.config(state=tk.NORMAL)
+            self._poll_id = self.window.after(SEARCH_POLL_MS, self._poll)
+
+    def _add_candidate(self, pattern):
+        if not pattern or pattern in self.patterns.values():
+            return # Duplicate answers are tested once
+        item = self.tree.insert("", tk.END, values=(pattern, "", "", "", ""))
+        self.patterns[item] = pattern
+        self._queue_trial(item)
+
+    def _queue_trial(self, item):
+        self.tree.set(item, "status", "waiting")
+        self.scores[item] = (self.STATUS_RANK["testing"], 0, 0.0)
+        self.pending.append(item)
+
+    def _start_trials(self):
+        """Run up to one trial per core so the throughput numbers aren't skewed by sharing a CPU."""
+        if not self.pending:
+            return
+        positives, negatives = self._examples(self.positives_input), self._examples(self.negatives_input)
+        self.example_count = len(positives) + len(negatives)
+        # Fetch just past the sample size: a shorter result reached the end and carries Tk's trailing newline
+        sample = self.editor._text_get("1.0", f"1.0+{CANDIDATE_SAMPLE_CHARS + 1}c")
+        if len(sample) <= CANDIDATE_SAMPLE_CHARS:
+            sample = sample[:-1]
+        else:
+            cut = sample.rfind("\n", 0, CANDIDATE_SAMPLE_CHARS)
+            sample = sample[:cut + 1 if cut > 0 else CANDIDATE_SAMPLE_CHARS]
+        self.sample_length = len(sample)
+        flags = self.editor._get_regex_flags()
+        while self.pending and len(self.trials) < (os.cpu_count() or 1):
+            item = self.pending.pop(0)
+            self.trials[item] = WorkerProcess(_candidate_worker_main, self.patterns[item], flags, sample, positives, negatives)
+            self.tree.set(item, "status", "testing...")
+
+    def _record(self, item, message):
+        """Fill in a finished trial and move the row to its place in the ranking."""
+        if message[0] == "done":
+            _, passed, count, speed = message
+            self.scores[item] = (self.STATUS_RANK["ok"], passed, speed or 0.0)
+            self.tree.item(item, values=(self.patterns[item], f"{passed}/{self.example_count}", f"{count:,}",
+                                         f"{speed / 1e6:,.1f}" if speed else "", "ok" if passed == self.example_count else "fails examples"))
+        elif message[0] == "timeout":
+            self.scores[item] = (self.STATUS_RANK["timeout"], 0, 0.0)
+            self.tree.set(item, "status", f"killed after {CANDIDATE_TIME_BUDGET:g}s")
+        else:
+            self.scores[item] = (self.STATUS_RANK["error"], 0, 0.0)
+            self.tree.set(item, "status", f"invalid: {message[2]}" if message[1] == "regex" else f"error: {message[2]}")
+        ranked = sorted(self.tree.get_children(), key=lambda i: (self.scores[i][0], -self.scores[i][1], -self.scores[i][2]))
+        for position, ranked_item in enumerate(ranked):
+            self.tree.move(ranked_item, "", position)
+
+    def _poll(self):
+        """Collect AI answers, start and reap trials, and finish once everything is in."""
+        self._poll_id = None
+        for request in list(self.requests):
+            try:
+                while True:
+                    message = request.output.get_nowait()
+                    if message[0] == "text":
+                        request.text += message[1]
+                        continue
+                    self.requests.remove(request)
+                    if message[0] == "done":
+                        if not request.cached and request.text.strip():
+                            self.editor.ai_cache.put(request.cache_key, request.text.strip(), time.monotonic() - request.started)
+                        self._add_candidate(_extract_ai_pattern(request.text))
+                    else:
+                        self.errors.append(message[2])
+                    break
+            except queue.Empty:
+                if time.monotonic() - request.started > request.timeout:
+                    request.cancelled.set()
+                    self.requests.remove(request)
+                    self.errors.append(f"timed out after {request.timeout:g}s")
+
+        for item, trial in list(self.trials.items()):
+            message = next(trial.receive(), None)
+            if message is None and time.monotonic() - trial.started > CANDIDATE_TIME_BUDGET:
+                message = ("timeout",)
+            if message is not None:
+                trial.cancel()
+                del self.trials[item]
+                self._record(item, message)
+        self._start_trials()
+
+        if not (self.requests or self.trials or self.pending):
+            self._finish()
+            return
+        self.status_var.set(f"{len(self.requests)} answers pending, {len(self.patterns)} candidates, {len(self.trials) + len(self.pending)} being tested"
+                            f" ({time.monotonic() - self.started:.1f}s)")
+        self._poll_id = self.window.after(SEARCH_POLL_MS, self._poll)
+
+    def _finish(self):
+        self.cancel_button.config(state=tk.DISABLED)
+        if self.patterns:
+            self.editor._save_api_key(self.api_key)
+        best = self._best()
+        if best:
+            self.tree.selection_set(best)
+            message = f"Best: {self.patterns[best]}"
+        elif self.patterns:
+            message = "No candidate passes every example."
+        else:
+            message = "No usable candidates."
+        if self.errors:
+            message += f" ({len(self.errors)} requests failed: {self.errors[0]})"
+        self.status_var.set(f"{message} - {len(self.patterns)} candidates in {time.monotonic() - self.started:.1f}s")
+
+    def _best(self):
+        """The fastest candidate that ran cleanly and passed every example."""
+        for item in self.tree.get_children(): # Already ranked
+            status, passed, _ = self.scores[item]
+            if status == self.STATUS_RANK["ok"] and passed == self.example_count:
+                return item
+        return None
+
+    def _use(self, item):
+        editor = self.editor
+        editor.pattern_entry.delete(0, tk.END)
+        editor.pattern_entry.insert(0, self.patterns[item])
+        editor._reset_search()
+        editor._update_status(f"Loaded AI candidate: {self.patterns[item]}")
+
+    def use_best(self):
+        best = self._best()
+        if best is None:
+            messagebox.showinfo("AI Candidates", "No tested candidate passes every example.", parent=self.window)
+            return
+        self._use(best)
+
+    def use_selected(self):
+        item = self.tree.focus()
+        if item in self.patterns:
+            self._use(item)
+
+    def cancel(self, quiet=False):
+        """Abandon outstanding AI requests and kill running trials."""
+        for request in self.requests:
+            request.cancelled.set()
+        for trial in self.trials.values():
+            trial.cancel()
+        for item in list(self.trials) + self.pending:
+            self.tree.set(item, "status", "cancelled")
+            self.scores[item] = (self.STATUS_RANK["error"], 0, 0.0)
+        self.requests, self.trials, self.pending = [], {}, []
+        if self._poll_id is not None:
+            self.window.after_cancel(self._poll_id)
+            self._poll_id = None
+        self.cancel_button.config(state=tk.DISABLED)
+        if not quiet:
+            self.status_var.set("Cancelled.")
+
+    def close(self):
+        self.cancel(quiet=True)
+        self.window.destroy()
+        self.editor.candidates_window = None
+
+# --- Pattern Analyzer ---
+def _profile_worker_main(conn, pattern, flags, text):
+    """Child-process entry point: stream profile_pattern's measurements, then ("done",)."""
+    try:
+        regex = compile_pattern(pattern, flags)
+        for message in profile_pattern(regex, text):
+            conn.send(message)
+        conn.send(("done",))
+    except re.error as e:
+        conn.send(("error", "regex", str(e)))
+    except Exception as e:
+        conn.send(("error", "other", str(e)))
+    finally:
+        conn.close()
+
+class PatternAnalyzerWindow:
+    """Analyze Pattern: static backtracking risks, then timings over doubling prefixes of the document and its slowest lines."""
+
+    def __init__(self, editor):
+        self.editor = editor
+        self.window = tk.Toplevel(editor.root)
+        self.window.title("Analyze Pattern")
+        self.window.geometry("800x700")
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+        self.worker = None # WorkerProcess running _profile_worker_main
+        self._poll_id = None
+        self.samples = [] # (chars, seconds) per profiled prefix
+
+        form = ttk.Frame(self.window, padding="10")
+        form.pack(fill=tk.X)
+        ttk.Label(form, text="Pattern:").pack(side=tk.LEFT)
+        self.pattern_entry = ttk.Entry(form)
+        self.pattern_entry.insert(0, editor.pattern_entry.get())
+        self.pattern_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        self.pattern_entry.bind("<Return>", lambda event: self.analyze())
+        ttk.Button(form, text="Analyze", command=self.analyze).pack(side=tk.LEFT)
+        self.cancel_button = ttk.Button(form, text="Cancel", command=self.cancel, state=tk.DISABLED)
+        self.cancel_button.pack(side=tk.LEFT, padx=(5, 0))
+
+        ttk.Label(self.window, text="Backtracking risks:", padding=(10, 0)).pack(anchor=tk.W)
+        self.risks_text = scrolledtext.ScrolledText(self.window, height=4, wrap=tk.WORD, state=tk.DISABLED)
+        self.risks_text.pack(fill=tk.X, padx=10, pady=(0, 10))
+
+        # --- Prefix timings and the scaling curve side by side ---
+        timing_frame = ttk.Frame(self.window, padding=(10, 0))
+        timing_frame.pack(fill=tk.X)
+        self.prefix_tree = ttk.Treeview(timing_frame, columns=("size", "time", "rate", "matches"), show="headings", height=7)
+        for column, heading in (("size", "Prefix (MB)"), ("time", "Time (s)"), ("rate", "ms per MB"), ("matches", "Matches")):
+            self.prefix_tree.heading(column, text=heading)
+            self.prefix_tree.column(column, width=90, anchor=tk.E)
+        self.prefix_tree.pack(side=tk.LEFT, fill=tk.Y)
+        self.curve = tk.Canvas(timing_frame, height=160, background="white")
+        self.curve.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(10, 0))
+        self.curve.bind("<Configure>", lambda event: self._draw_curve())
+        self.scaling_var = tk.StringVar()
+        ttk.Label(self.window, textvariable=self.scaling_var, padding=(10, 5)).pack(anchor=tk.W)
+
+        ttk.Label(self.window, text="Slowest lines (double-click to jump):", padding=(10, 0)).pack(anchor=tk.W)
+        lines_frame = ttk.Frame(self.window, padding=(10, 0, 10, 10))
+        lines_frame.pack(fill=tk.BOTH, expand=True)
+        self.lines_tree = ttk.Treeview(lines_frame, columns=("line", "time", "preview"), show="headings")
+        self.lines_tree.heading("line", text="Line")
+        self.lines_tree.heading("time", text="ms")
+        self.lines_tree.heading("preview", text="Preview")
+        self.lines_tree.column("line", width=80, anchor=tk.E, stretch=False)
+        self.lines_tree.column("time", width=80, anchor=tk.E, stretch=False)
+        self.lines_tree.column("preview", width=560)
+        self.lines_tree.pack(fill=tk.BOTH, expand=True)
+        self.lines_tree.bind("<Double-1>", self._on_open_line)
+        self.line_numbers = {} # Tree item -> 0-based document line
+
+        self.status_var = tk.StringVar(value="Timings use the open document (the loaded window in large-file mode).")
+        ttk.Label(self.window, textvariable=self.status_var, relief=tk.SUNKEN, anchor=tk.W, padding=5).pack(side=tk.BOTTOM, fill=tk.X)
+
+    def analyze(self):
+        """Report static risks immediately, then profile the pattern in a worker process."""
+        pattern = self.pattern_entry.get()
+        if not pattern:
+            return
+        flags = self.editor._get_regex_flags()
+        try:
+            risks = backtracking_risks(pattern, flags)
+        except re.error as e:
+            messagebox.showerror("Regex Error", f"Invalid regular expression: {e}", parent=self.window)
+            return
+        self.risks_text.config(state=tk.NORMAL)
+        self.risks_text.delete("1.0", tk.END)
+        self.risks_text.insert("1.0", "\n".join(f"[{risk.severity}] {risk.description}" for risk in risks) or "None found.")
+        self.risks_text.config(state=tk.DISABLED)
+
+        self.cancel(quiet=True)
+        self.prefix_tree.delete(*self.prefix_tree.get_children())
+        self.lines_tree.delete(*self.lines_tree.get_children())
+        self.line_numbers = {}
+        self.samples = []
+        self._draw_curve()
+        self.scaling_var.set("")
+        self.first_line = self.editor.large_file_window[0] if self.editor.large_file is not None else 0
+        self.worker = WorkerProcess(_profile_worker_main, pattern, flags, self.editor._text_get("1.0", "end-1c"))
+        self.last_progress = time.monotonic()
+        self.cancel_button.config(state=tk.NORMAL)
+        self.status_var.set("Profiling...")
+        self._poll_id = self.window.after(SEARCH_POLL_MS, self._poll)
+
+    def _poll(self):
+        """Show measurements as they arrive; stop the worker if one step overruns the search time budget."""
+        self._poll_id = None
+        for message in self.worker.receive():
+            self.last_progress = time.monotonic()
+            if message[0] == "prefix":
+                _, chars, seconds, count = message
+                self.samples.append((chars, seconds))
+                self.prefix_tree.insert("", tk.END, values=(f"{chars / 1e6:,.2f}", f"{seconds:.3f}",
+                                                            f"{seconds * 1e3 / max(chars / 1e6, 1e-9):,.1f}", f"{count:,}"))
+                self._draw_curve()
+                self._show_scaling()
+                self.status_var.set("Profiling... timing each line")
+            elif message[0] == "lines":
+                for seconds, number, preview in message[1]:
+                    item = self.lines_tree.insert("", tk.END, values=(f"{self.first_line + number + 1:,}", f"{seconds * 1e3:.2f}", preview.replace("\t", "    ")))
+                    self.line_numbers[item] = self.first_line + number
+            else:
+                self._stop()
+                self.status_var.set("Done." if message[0] == "done" else f"Error: {message[2]}")
+                return
+        budget = self.editor.search_time_budget
+        if time.monotonic() - self.last_progress > budget:
+            self._stop()
+            self.status_var.set(f"Stopped: one step took over {budget:g}s (Search > Time Budget...). The pattern scales badly on this text.")
+            return
+        self._poll_id = self.window.after(SEARCH_POLL_MS, self._poll)
+
+    def _show_scaling(self):
+        exponent = scaling_exponent(self.samples)
+        if exponent is None:
+            self.scaling_var.set("Scaling: too fast to measure reliably.")
+        else:
+            verdict = "roughly linear" if exponent < 1.3 else "superlinear: expect it to slow down sharply on bigger inputs"
+            self.scaling_var.set(f"Scaling: time grows like size^{exponent:.2f} ({verdict}).")
+
+    def _draw_curve(self):
+        """Plot time against prefix size, with the smallest prefix's rate extrapolated as a dashed linear reference."""
+        canvas = self.curve
+        canvas.delete("all")
+        if not self.samples:
+            return
+        width, height, pad = max(canvas.winfo_width(), 100), max(canvas.winfo_height(), 60), 30
+        first_chars, first_seconds = self.samples[0]
+        max_chars = self.samples[-1][0]
+        linear_end = first_seconds / first_chars * max_chars if first_chars else 0
+        max_seconds = max([seconds for _, seconds in self.samples] + [linear_end]) or 1e-9
+        x = lambda chars: pad + (width - 2 * pad) * chars / max_chars
+        y = lambda seconds: height - pad + (2 * pad - height) * seconds / max_seconds
+        canvas.create_line(pad, height - pad, width - pad, height - pad, fill="gray")
+        canvas.create_line(pad, height - pad, pad, pad, fill="gray")
+        canvas.create_line(x(0), y(0), x(max_chars), y(linear_end), dash=(3, 3), fill="gray")
+        points = [coordinate for chars, seconds in self.samples for coordinate in (x(chars), y(seconds))]
+        if len(self.samples) > 1:
+            canvas.create_line(*points, fill="blue", width=2)
+        for i in range(0, len(points), 2):
+            canvas.create_oval(points[i] - 3, points[i + 1] - 3, points[i] + 3, points[i + 1] + 3, fill="blue", outline="")
+        canvas.create_text(pad + 4, pad - 12, text=f"{max_seconds:.3g}s", anchor=tk.W)
+        canvas.create_text(width - pad, height - pad + 12, text=f"{max_chars / 1e6:,.2f} MB", anchor=tk.E)
+
+    def _on_open_line(self, event):
+        line = self.line_numbers.get(self.lines_tree.focus())
+        if line is not None:
+            self.editor._show_line(line)
+
+    def _stop(self):
+        worker, self.worker = self.worker, None
+        if self._poll_id is not None:
+            self.window.after_cancel(self._poll_id)
+            self._poll_id = None
+        self.cancel_button.config(state=tk.DISABLED)
+        if worker is not None:
+            worker.cancel()
+
+    def cancel(self, quiet=False):
+        if self.worker is None:
+            return
+        self._stop()
+        if not quiet:
+            self.status_var.set("Cancelled.")
+
+    def close(self):
+        self.cancel(quiet=True)
+        self.window.destroy()
+        self.editor.analyzer_window = None
+
+# --- Extraction ---
+EXTRACT_TOP_K = 20 # Values listed by default in the Extract window's count table
+
+def _extract_worker_main(conn, pattern, flags, text, output_path, format, aggregates):
+    """Child-process entry point: stream the matches in a text snapshot (or large file) to output_path as rows, if given,
+    and into the aggregates (GroupCounters and Histograms).
+
+    Sends ("progress", fraction) after each chunk, then ("done", matches, aggregates) or ("error", kind, message).
+    """
+    try:
+        regex = compile_pattern(pattern, flags)
+        size = text.size if isinstance(text, LargeFileSource) else len(text)
+
+        def chunks():
+            if isinstance(text, LargeFileSource):
+                for chunk in text.iter_text():
+                    yield chunk
+                    conn.send(("progress", text.consumed / size))
+            else:
+                for start in range(0, size, STREAM_CHUNK_SIZE):
+                    yield text[start:start + STREAM_CHUNK_SIZE]
+                    conn.send(("progress", min(start + STREAM_CHUNK_SIZE, size) / size))
+
+        prefilter = LiteralPrefilter.for_pattern(pattern, flags)
+        if output_path is None:
+            count = extract(chunks(), regex, None, aggregates, prefilter=prefilter)
+        else:
+            # Closed before "done" is sent, so a finished run's file is complete
+            with open(output_path, "w", encoding="utf-8", newline="") as output:
+                count = extract(chunks(), regex, RowWriter(output, extract_columns(regex), format), aggregates, prefilter=prefilter)
+        conn.send(("done", count, aggregates))
+    except re.error as e:
+        conn.send(("error", "regex", str(e)))
+    except Exception as e:
+        conn.send(("error", "other", str(e)))
+    finally:
+        conn.close()
+
+class ExtractWindow:
+    """Extract: stream every match's groups to a CSV/JSONL file and summarize group values (counts, top-K, histogram)."""
+
+    def __init__(self, editor):
+        self.editor = editor
+        self.window = tk.Toplevel(editor.root)
+        self.window.title("Extract")
+        self.window.geometry("820x600")
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+        self.worker = None # WorkerProcess running _extract_worker_main
+        self._poll_id = None
+        self.output_path = None # File being written, removed again if the run is cancelled or fails
+        self.top = EXTRACT_TOP_K # Values listed from the count of the current run
+
+        form = ttk.Frame(self.window, padding="10")
+        form.pack(fill=tk.X)
+        ttk.Label(form, text="Pattern:").grid(row=0, column=0, sticky=tk.W)
+        self.pattern_entry = ttk.Entry(form)
+        self.pattern_entry.insert(0, editor.pattern_entry.get())
+        self.pattern_entry.grid(row=0, column=1, columnspan=5, sticky=tk.EW, padx=5)
+        self.pattern_entry.bind("<KeyRelease>", lambda event: self._refresh_groups())
+        ttk.Label(form, text="Count by:").grid(row=1, column=0, sticky=tk.W, pady=(5, 0))
+        self.count_by_var = tk.StringVar()
+        self.count_by_box = ttk.Combobox(form, textvariable=self.count_by_var, state="readonly", width=16)
+        self.count_by_box.grid(row=1, column=1, sticky=tk.W, padx=5, pady=(5, 0))
+        ttk.Label(form, text="Top:").grid(row=1, column=2, sticky=tk.W, pady=(5, 0))
+        self.top_var = tk.IntVar(value=EXTRACT_TOP_K)
+        ttk.Spinbox(form, from_=1, to=COUNT_CAPACITY, width=6, textvariable=self.top_var).grid(row=1, column=3, sticky=tk.W, padx=5, pady=(5, 0))
+        ttk.Label(form, text="Histogram of:").grid(row=1, column=4, sticky=tk.W, pady=(5, 0))
+        self.histogram_var = tk.StringVar()
+        self.histogram_box = ttk.Combobox(form, textvariable=self.histogram_var, state="readonly", width=16)
+        self.histogram_box.grid(row=1, column=5, sticky=tk.W, padx=5, pady=(5, 0))
+        form.columnconfigure(1, weight=1)
+
+        buttons = ttk.Frame(self.window, padding=(10, 0))
+        buttons.pack(fill=tk.X)
+        ttk.Label(buttons, text="Format:").pack(side=tk.LEFT)
+        self.format_var = tk.StringVar(value=EXTRACT_FORMATS[0])
+        ttk.Combobox(buttons, textvariable=self.format_var, values=EXTRACT_FORMATS, state="readonly", width=6).pack(side=tk.LEFT, padx=(2, 10))
+        ttk.Button(buttons, text="Extract to File...", command=self.extract_to_file).pack(side=tk.LEFT)
+        ttk.Button(buttons, text="Summarize", command=self.summarize).pack(side=tk.LEFT, padx=(5, 0))
+        self.cancel_button = ttk.Button(buttons, text="Cancel", command=self.cancel, state=tk.DISABLED)
+        self.cancel_button.pack(side=tk.LEFT, padx=(5, 0))
+        self.columns_var = tk.StringVar()
+        ttk.Label(self.window, textvariable=self.columns_var, padding=(10, 5)).pack(anchor=tk.W)
+
+        # --- Value counts and the histogram side by side ---
+        results = ttk.Frame(self.window, padding=(10, 0, 10, 10))
+        results.pack(fill=tk.BOTH, expand=True)
+        self.counts_tree = ttk.Treeview(results, columns=("value", "count", "error"), show="headings")
+        for column, heading, width in (("value", "Value", 260), ("count", "Count", 90), ("error", "Error", 70)):
+            self.counts_tree.heading(column, text=heading)
+            self.counts_tree.column(column, width=width, anchor=tk.W if column == "value" else tk.E, stretch=column == "value")
+        self.counts_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        histogram_frame = ttk.Frame(results)
+        histogram_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(10, 0))
+        self.histogram_tree = ttk.Treeview(histogram_frame, columns=("range", "count"), show="headings")
+        self.histogram_tree.heading("range", text="Range")
+        self.histogram_tree.heading("count", text="Count")
+        self.histogram_tree.column("count", width=90, anchor=tk.E, stretch=False)
+        self.histogram_tree.pack(fill=tk.BOTH, expand=True)
+        self.stats_var = tk.StringVar()
+        ttk.Label(histogram_frame, textvariable=self.stats_var, wraplength=360).pack(anchor=tk.W, pady=(5, 0))
+
+        self.status_var = tk.StringVar(value="Uses the editor's flags. Rows hold line, column, offset, the match and every group.")
+        ttk.Label(self.window, textvariable=self.status_var, relief=tk.SUNKEN, anchor=tk.W, padding=5).pack(side=tk.BOTTOM, fill=tk.X)
+        self._refresh_groups()
+
+    def _refresh_groups(self):
+        """Offer the pattern's groups (0 being the whole match) in the Count by / Histogram of boxes."""
+        try:
+            regex = compile_pattern(self.pattern_entry.get(), self.editor._get_regex_flags())
+        except re.error:
+            self.columns_var.set("Columns: (incomplete pattern)")
+            return
+        groups = [""] + ["0"] + group_names(regex)
+        for box, var in ((self.count_by_box, self.count_by_var), (self.histogram_box, self.histogram_var)):
+            box.config(values=groups)
+            if var.get() not in groups:
+                var.set("")
+        self.columns_var.set("Columns: " + ", ".join(extract_columns(regex)))
+
+    def extract_to_file(self):
+        path = filedialog.asksaveasfilename(parent=self.window, defaultextension="." + self.format_var.get(),
+                                            filetypes=[("CSV", "*.csv"), ("JSON Lines", "*.jsonl"), ("All Files", "*.*")])
+        if path:
+            self._start(path)
+
+    def summarize(self):
+        if not self.count_by_var.get() and not self.histogram_var.get():
+            self.status_var.set("Pick a group in Count by or Histogram of to summarize.")
+            return
+        self._start(None)
+
+    def _start(self, output_path):
+        """Stream the document through the pattern in a worker process, writing rows to output_path if given."""
+        pattern = self.pattern_entry.get()
+        if not pattern:
+            return
+        flags = self.editor._get_regex_flags()
+        try:
+            regex = compile_pattern(pattern, flags)
+            aggregates = []
+            if self.count_by_var.get():
+                self.top = max(1, int(self.top_var.get()))
+                aggregates.append(GroupCounter(resolve_group(regex, self.count_by_var.get()), max(COUNT_CAPACITY, self.top), self.count_by_var.get()))
+            if self.histogram_var.get():
+                aggregates.append(Histogram(resolve_group(regex, self.histogram_var.get()), self.histogram_var.get()))
+        except re.error as e:
+            messagebox.showerror("Regex Error", f"Invalid regular expression: {e}", parent=self.window)
+            return
+        except (ValueError, tk.TclError) as e: # A stale group name or a non-numeric Top
+            messagebox.showerror("Extract", str(e), parent=self.window)
+            return
+
+        self.cancel(quiet=True)
+        self.counts_tree.delete(*self.counts_tree.get_children())
+        self.histogram_tree.delete(*self.histogram_tree.get_children())
+        self.stats_var.set("")
+        editor = self.editor
+        if editor.large_file is not None:
+            editor._commit_large_file_window()
+            text = editor.large_file.source() # The worker streams the mapped file itself
+        else:
+            text = editor._text_get("1.0", "end-1c")
+        self.output_path = output_path
+        self.worker = WorkerProcess(_extract_worker_main, pattern, flags, text, output_path, self.format_var.get(), aggregates)
+        self.last_progress = time.monotonic()
+        self.cancel_button.config(state=tk.NORMAL)
+        self.status_var.set("Extracting...")
+        self._poll_id = self.window.after(SEARCH_POLL_MS, self._poll)
+
+    def _poll(self):
+        """Report progress, and show the summaries once the worker is done; stop it if it stalls past the time budget."""
+        self._poll_id = None
+        for message in self.worker.receive():
+            self.last_progress = time.monotonic()
+            if message[0] == "progress":
+                self.status_var.set(f"Extracting... {message[1]:.0%}")
+                continue
+            output_path = self.output_path
+            if message[0] == "done":
+                self.output_path = None # Complete: keep the file
+            self._stop()
+            if message[0] == "error":
+                if message[1] == "regex":
+                    messagebox.showerror("Regex Error", f"Invalid regular expression: {message[2]}", parent=self.window)
+                self.status_var.set(f"Error: {message[2]}")
+                return
+            _, count, aggregates = message
+            for aggregate in aggregates:
+                self._show_aggregate(aggregate)
+            written = f", written to {os.path.basename(output_path)}" if output_path else ""
+            self.status_var.set(f"{count:,} matches{written}.")
+            return
+        budget = self.editor.search_time_budget
+        if time.monotonic() - self.last_progress > budget:
+            self.cancel(quiet=True)
+            self.status_var.set(f"Stopped: no progress for {budget:g}s (Search > Time Budget...).")
+            return
+        self._poll_id = self.window.after(SEARCH_POLL_MS, self._poll)
+
+    def _show_aggregate(self, aggregate):
+        if isinstance(aggregate, GroupCounter):
+            for value, count, error in aggregate.top(self.top):
+                self.counts_tree.insert("", tk.END, values=("(no match)" if value is None else value, f"{count:,}", f"{error:,}" if error else ""))
+            if not aggregate.exact:
+                self.stats_var.set(f"Group {aggregate.name} took too many distinct values to count exactly: a count may overstate by up to its error. ")
+            return
+        for low, high, count in aggregate.rows():
+            self.histogram_tree.insert("", tk.END, values=("0" if low == high else f"[{low:g}, {high:g})", f"{count:,}"))
+        summary = f"{aggregate.count:,} values" + ("" if aggregate.mean is None else f", min {aggregate.min:g}, max {aggregate.max:g}, mean {aggregate.mean:g}")
+        self.stats_var.set(self.stats_var.get() + f"Histogram of {aggregate.name}: {summary}; {aggregate.skipped:,} not numeric.")
+
+    def _stop(self):
+        worker, self.worker = self.worker, None
+        if self._poll_id is not None:
+            self.window.after_cancel(self._poll_id)
+            self._poll_id = None
+        self.cancel_button.config(state=tk.DISABLED)
+        if worker is not None:
+            worker.cancel()
+        if self.output_path is not None:
+            try:
+                os.remove(self.output_path) # Partial rows from a cancelled run
+            except OSError:
+                pass
+            self.output_path = None
+
+    def cancel(self, quiet=False):
+        if self.worker is None:
+            return
+        self._stop()
+        if not quiet:
+            self.status_var.set("Cancelled.")
+
+    def close(self):
+        self.cancel(quiet=True)
+        self.window.destroy()
+        self.editor.extract_window = None
+
+# --- Rewrite Recipes ---
+def _recipe_worker_main(conn, rules, text):
+    """Child-process entry point: run a recipe over a text snapshot, or stream a large file through it into its output_path.
+
+    Sends ("done", new_text or None, replacements per rule, passes) or ("error", kind, message).
+    """
+    try:
+        if isinstance(text, LargeFileSource):
+            with open(text.output_path, "w", encoding="utf-8", errors="surrogateescape", newline="") as output_file:
+                counts, passes = stream_recipe(text.iter_text("surrogateescape"), rules, output_file.write)
+            conn.send(("done", None, counts, passes))
+        else:
+            conn.send(("done",) + apply_recipe(text, rules))
+    except re.error as e:
+        conn.send(("error", "regex", str(e)))
+    except Exception as e:
+        conn.send(("error", "other", str(e)))
+    finally:
+        conn.close()
+
+def _flags_label(flags):
+    return "".join(letter for letter, bit in (("i", re.IGNORECASE), ("m", re.MULTILINE), ("s", re.DOTALL)) if flags & bit)
+
+class RecipesWindow:
+    """Recipes: named, ordered lists of find/replace rules, saved in RECIPES_FILE and replayed over the document at once."""
+
+    def __init__(self, editor):
+        self.editor = editor
+        self.window = tk.Toplevel(editor.root)
+        self.window.title("Recipes")
+        self.window.geometry("900x500")
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+        self.worker = None # WorkerProcess running _recipe_worker_main
+        self._poll_id = None
+        try:
+            self.recipes = load_recipes()
+        except (OSError, ValueError, KeyError) as e:
+            messagebox.showerror("Recipes", f"Could not read {RECIPES_FILE}: {e}", parent=self.window)
+            self.recipes = {}
+
+        # --- Recipe names on the left ---
+        names_frame = ttk.Frame(self.window, padding=(10, 10, 5, 0))
+        names_frame.pack(side=tk.LEFT, fill=tk.Y)
+        self.names_list = tk.Listbox(names_frame, exportselection=False, width=24)
+        self.names_list.pack(fill=tk.Y, expand=True)
+        self.names_list.bind("<<ListboxSelect>>", lambda event: self._show_rules())
+        for text, command in (("New...", self.new_recipe), ("Rename...", self.rename_recipe), ("Delete", self.delete_recipe)):
+            ttk.Button(names_frame, text=text, command=command).pack(fill=tk.X, pady=(5, 0))
+
+        # --- Rules of the selected recipe ---
+        rules_frame = ttk.Frame(self.window, padding=(5, 10, 10, 0))
+        rules_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.rules_tree = ttk.Treeview(rules_frame, columns=("number", "pattern", "replacement", "flags"), show="headings", selectmode=tk.BROWSE)
+        for column, heading, width in (("number", "#", 40), ("pattern", "Pattern", 320), ("replacement", "Replacement", 220), ("flags", "Flags", 60)):
+            self.rules_tree.heading(column, text=heading)
+            self.rules_tree.column(column, width=width, stretch=column in ("pattern", "replacement"))
+        self.rules_tree.pack(fill=tk.BOTH, expand=True)
+        self.rules_tree.bind("<Double-1>", lambda event: self.load_rule())
+        buttons = ttk.Frame(rules_frame)
+        buttons.pack(fill=tk.X, pady=5)
+        for text, command in (("Add Current", self.add_current), ("From History...", self.add_from_history), ("Load into Fields", self.load_rule),
+                              ("Remove", self.remove_rule), ("Up", lambda: self.move_rule(-1)), ("Down", lambda: self.move_rule(1))):
+            ttk.Button(buttons, text=text, command=command).pack(side=tk.LEFT, padx=(0, 5))
+        self.cancel_button = ttk.Button(buttons, text="Cancel", command=self.cancel, state=tk.DISABLED)
+        self.cancel_button.pack(side=tk.RIGHT)
+        ttk.Button(buttons, text="Run on Document", command=self.run).pack(side=tk.RIGHT, padx=(0, 5))
+
+        self.status_var = tk.StringVar(value="Add rules from the Pattern/Replace fields or from the History log.")
+        ttk.Label(rules_frame, textvariable=self.status_var, relief=tk.SUNKEN, anchor=tk.W, padding=5).pack(fill=tk.X)
+        self._refresh_names()
+
+    # --- Editing ---
+    def _selected_name(self):
+        selection = self.names_list.curselection()
+        return self.names_list.get(selection[0]) if selection else None
+
+    def _refresh_names(self, select=None):
+        self.names_list.delete(0, tk.END)
+        names = sorted(self.recipes)
+        for name in names:
+            self.names_list.insert(tk.END, name)
+        if select in self.recipes:
+            self.names_list.selection_set(names.index(select))
+        elif names:
+            self.names_list.selection_set(0)
+        self._show_rules()
+
+    def _show_rules(self, select=None):
+        self.rules_tree.delete(*self.rules_tree.get_children())
+        name = self._selected_name()
+        rules = self.recipes.get(name, [])
+        for i, rule in enumerate(rules):
+            self.rules_tree.insert("", tk.END, iid=str(i), values=(i + 1, rule.pattern, rule.replacement, _flags_label(rule.flags)))
+        if select is not None and 0 <= select < len(rules):
+            self.rules_tree.selection_set(str(select))
+            self.rules_tree.see(str(select))
+        if name is not None and self.worker is None:
+            self.status_var.set(f"{len(rules)} rules. Independent rules share a pass when that is faster." if rules else "No rules yet.")
+
+    def _selected_rule(self):
+        selection = self.rules_tree.selection()
+        return int(selection[0]) if selection else None
+
+    def _save(self):
+        try:
+            save_recipes(self.recipes)
+        except OSError as e:
+            messagebox.showerror("Recipes", f"Could not save {RECIPES_FILE}: {e}", parent=self.window)
+
+    def _edit_rules(self, edit, select=None):
+        """Apply edit(rules) to the selected recipe (creating one if there is none), then save and redisplay."""
+        name = self._selected_name()
+        if name is None:
+            name = self.new_recipe()
+            if name is None:
+                return
+        edit(self.recipes[name])
+        self._save()
+        self._show_rules(select)
+
+    def new_recipe(self):
+        name = simpledialog.askstring("New Recipe", "Recipe name:", parent=self.window)
+        if not name:
+            return None
+        self.recipes.setdefault(name, [])
+        self._save()
+        self._refresh_names(select=name)
+        return name
+
+    def rename_recipe(self):
+        name = self._selected_name()
+        if name is None:
+            return
+        new_name = simpledialog.askstring("Rename Recipe", "New name:", initialvalue=name, parent=self.window)
+        if not new_name or new_name == name:
+            return
+        if new_name in self.recipes:
+            messagebox.showerror("Recipes", f"There is already a recipe named '{new_name}'.", parent=self.window)
+            return
+        self.recipes[new_name] = self.recipes.pop(name)
+        self._save()
+        self._refresh_names(select=new_name)
+
+    def delete_recipe(self):
+        name = self._selected_name()
+        if name is None or not messagebox.askyesno("Delete Recipe", f"Delete the recipe '{name}'?", parent=self.window):
+            return
+        del self.recipes[name]
+        self._save()
+        self._refresh_names()
+
+    def add_current(self):
+        """Append the editor's Pattern/Replace fields and flags as a rule."""
+        pattern = self.editor.pattern_entry.get()
+        if not pattern:
+            return
+        flags = self.editor._get_regex_flags()
+        try:
+            compile_pattern(pattern, flags)
+        except re.error as e:
+            messagebox.showerror("Regex Error", f"Invalid regular expression: {e}", parent=self.window)
+            return
+        rule = RecipeRule(pattern, self.editor.replace_entry.get(), flags)
+        self._edit_rules(lambda rules: rules.append(rule), select=len(self.recipes.get(self._selected_name(), [])))
+
+    def add_from_history(self):
+        """Promote replacements from the History log: pick entries in a list, appended in the order they were made."""
+        entries = self.editor.history_rules
+        if not entries:
+            messagebox.showinfo("From History", "No replacements have been made yet.", parent=self.window)
+            return
+        dialog = tk.Toplevel(self.window)
+        dialog.title("Add from History")
+        dialog.transient(self.window)
+        ttk.Label(dialog, text="Replacements to add (select one or more):", padding=(10, 10, 10, 0)).pack(anchor=tk.W)
+        listbox = tk.Listbox(dialog, selectmode=tk.EXTENDED, width=100, height=15)
+        listbox.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        for entry_text, _ in entries:
+            listbox.insert(tk.END, entry_text)
+
+        def add():
+            chosen = [entries[i][1] for i in listbox.curselection()]
+            dialog.destroy()
+            if chosen:
+                self._edit_rules(lambda rules: rules.extend(chosen))
+        ttk.Button(dialog, text="Add", command=add).pack(side=tk.RIGHT, padx=10, pady=(0, 10))
+        listbox.bind("<Double-1>", lambda event: add())
+
+    def load_rule(self):
+        """Put the selected rule back into the Pattern/Replace fields and flag checkboxes."""
+        i = self._selected_rule()
+        if i is None:
+            return
+        rule = self.recipes[self._selected_name()][i]
+        editor = self.editor
+        editor.ignore_case_var.set(bool(rule.flags & re.IGNORECASE))
+        editor.multiline_var.set(bool(rule.flags & re.MULTILINE))
+        editor.dotall_var.set(bool(rule.flags & re.DOTALL))
+        editor.replace_entry.delete(0, tk.END)
+        editor.replace_entry.insert(0, rule.replacement)
+        editor.pattern_entry.delete(0, tk.END)
+        editor.pattern_entry.insert(0, rule.pattern)
+
+    def remove_rule(self):
+        i = self._selected_rule()
+        if i is not None:
+            self._edit_rules(lambda rules: rules.pop(i), select=i)
+
+    def move_rule(self, step):
+        i = self._selected_rule()
+        if i is None:
+            return
+        rules = self.recipes[self._selected_name()]
+        j = i + step
+        if 0 <= j < len(rules):
+            def swap(rules):
+                rules[i], rules[j] = rules[j], rules[i]
+            self._edit_rules(swap, select=j)
+
+    # --- Running ---
+    def run(self):
+        """Apply the selected recipe to the document in a worker process (streamed through a scratch file in large-file mode)."""
+        name = self._selected_name()
+        rules = self.recipes.get(name)
+        if not rules or self.worker is not None:
+            return
+        for i, rule in enumerate(rules):
+            try:
+                compile_pattern(rule.pattern, rule.flags)
+            except re.error as e:
+                messagebox.showerror("Regex Error", f"Rule {i + 1} is not a valid regular expression: {e}", parent=self.window)
+                return
+        editor = self.editor
+        editor._cancel_search_job()
+        if editor.large_file is not None:
+            editor._commit_large_file_window()
+            text = editor.large_file.source()
+            directory = os.path.dirname(os.path.abspath(editor.current_file_path or editor.large_file.path))
+            fd, text.output_path = tempfile.mkstemp(dir=directory, prefix=".regex_editor-", suffix=".tmp")
+            os.close(fd)
+        else:
+            text = editor._text_get("1.0", "end-1c")
+        self.running = (name, rules, editor._buffer_generation, getattr(text, "output_path", None))
+        self.worker = WorkerProcess(_recipe_worker_main, rules, text)
+        self.cancel_button.config(state=tk.NORMAL)
+        self.status_var.set(f"Running '{name}'...")
+        self._poll_id = self.window.after(SEARCH_POLL_MS, self._poll)
+
+    def _poll(self):
+        self._poll_id = None
+        for message in self.worker.receive():
+            self._stop()
+            name, rules, generation, output_path = self.running
+            if message[0] == "error":
+                self._discard(output_path)
+                self.status_var.set(f"Error: {message[2]}")
+                return
+            _, new_text, counts, passes = message
+            total = sum(counts)
+            if self.editor._buffer_generation != generation:
+                self._discard(output_path)
+                self.status_var.set("Not applied: the text was edited while the recipe ran.")
+            elif not total:
+                self._discard(output_path)
+                self.status_var.set(f"'{name}' made no replacements.")
+            else:
+                self.editor._apply_recipe_result(name, rules, counts, passes, new_text, output_path)
+                self.status_var.set(self.editor.status_var.get())
+            return
+        self._poll_id = self.window.after(SEARCH_POLL_MS, self._poll)
+
+    def _discard(self, output_path):
+        if output_path is not None and os.path.exists(output_path):
+            os.remove(output_path)
+
+    def _stop(self):
+        worker, self.worker = self.worker, None
+        if self._poll_id is not None:
+            self.window.after_cancel(self._poll_id)
+            self._poll_id = None
+        self.cancel_button.config(state=tk.DISABLED)
+        if worker is not None:
+            worker.cancel()
+
+    def cancel(self, quiet=False):
+        if self.worker is None:
+            return
+        self._stop()
+        self._discard(self.running[3])
+        if not quiet:
+            self.status_var.set("Cancelled.")
+
+    def close(self):
+        self.cancel(quiet=True)
+        self.window.destroy()
+        self.editor.recipes_window = None
+
+class SearchInFilesWindow:
+    """Search in Files: walks a directory and fans matching out to a process pool, streaming results in as files finish."""
+
+    def __init__(self, editor):
+        self.editor = editor
+        self.window = tk.Toplevel(editor.root)
+        self.window.title("Search in Files")
+        self.window.geometry("900x600")
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+        self.executor = None
+        self.results = queue.Queue() # (run, Future or submitted-count) handed over from pool/walker threads
+        self.run_id = 0 # Bumped per run so stragglers from a cancelled run are ignored
+        self._poll_id = None
+        self.locations = {} # Tree item -> (path, line, column)
+
+        form = ttk.Frame(self.window, padding="10")
+        form.pack(fill=tk.X)
+        ttk.Label(form, text="Pattern:").grid(row=0, column=0, padx=5, pady=2, sticky=tk.W)
+        self.pattern_entry = ttk.Entry(form)
+        self.pattern_entry.insert(0, editor.pattern_entry.get())
+        self.pattern_entry.grid(row=0, column=1, columnspan=2, padx=5, pady=2, sticky=(tk.W, tk.E))
+        self.pattern_entry.bind("<Return>", lambda event: self.start())
+        ttk.Label(form, text="Replace:").grid(row=1, column=0, padx=5, pady=2, sticky=tk.W)
+        self.replace_entry = ttk.Entry(form)
+        self.replace_entry.insert(0, editor.replace_entry.get())
+        self.replace_entry.grid(row=1, column=1, columnspan=2, padx=5, pady=2, sticky=(tk.W, tk.E))
+        ttk.Label(form, text="Directory:").grid(row=2, column=0, padx=5, pady=2, sticky=tk.W)
+        self.directory_entry = ttk.Entry(form)
+        start_dir = os.path.dirname(editor.current_file_path) if editor.current_file_path else os.getcwd()
+        self.directory_entry.insert(0, start_dir)
+        self.directory_entry.grid(row=2, column=1, padx=5, pady=2, sticky=(tk.W, tk.E))
+        ttk.Button(form, text="Browse...", command=self._browse).grid(row=2, column=2, padx=5, pady=2)
+        ttk.Label(form, text="Include:").grid(row=3, column=0, padx=5, pady=2, sticky=tk.W)
+        self.include_entry = ttk.Entry(form)
+        self.include_entry.insert(0, "*")
+        self.include_entry.grid(row=3, column=1, columnspan=2, padx=5, pady=2, sticky=(tk.W, tk.E))
+        ttk.Label(form, text="Exclude:").grid(row=4, column=0, padx=5, pady=2, sticky=tk.W)
+        self.exclude_entry = ttk.Entry(form)
+        self.exclude_entry.insert(0, DEFAULT_EXCLUDE_GLOBS)
+        self.exclude_entry.grid(row=4, column=1, columnspan=2, padx=5, pady=2, sticky=(tk.W, tk.E))
+        form.columnconfigure(1, weight=1)
+
+        buttons = ttk.Frame(self.window, padding=(10, 0))
+        buttons.pack(fill=tk.X)
+        self.search_button = ttk.Button(buttons, text="Search", command=self.start)
+        self.search_button.pack(side=tk.LEFT)
+        self.replace_button = ttk.Button(buttons, text="Replace in Files", command=lambda: self.start(replace=True))
+        self.replace_button.pack(side=tk.LEFT, padx=(5, 0))
+        self.cancel_button = ttk.Button(buttons, text="Cancel", command=self.cancel, state=tk.DISABLED)
+        self.cancel_button.pack(side=tk.LEFT, padx=(5, 0))
+        ttk.Label(buttons, text="(uses the editor's Ignore Case / Multiline / Dotall flags)").pack(side=tk.LEFT, padx=(10, 0))
+
+        # --- Results: one node per file, one child per match ---
+        results_frame = ttk.Frame(self.window, padding="10")
+        results_frame.pack(fill=tk.BOTH, expand=True)
+        self.tree = ttk.Treeview(results_frame, columns=("line", "preview"))
+        self.tree.heading("#0", text="File")
+        self.tree.heading("line", text="Line")
+        self.tree.heading("preview", text="Preview")
+        self.tree.column("#0", width=280)
+        self.tree.column("line", width=70, anchor=tk.E, stretch=False)
+        self.tree.column("preview", width=500)
+        scrollbar = ttk.Scrollbar(results_frame, orient=tk.VERTICAL, command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.pack(fill=tk.BOTH, expand=True)
+        self.tree.bind("<Double-1>", self._on_open_result)
+
+        self.status_var = tk.StringVar(value="Ready")
+        ttk.Label(self.window, textvariable=self.status_var, relief=tk.SUNKEN, anchor=tk.W, padding=5).pack(side=tk.BOTTOM, fill=tk.X)
+
+    def _browse(self):
+        directory = filedialog.askdirectory(initialdir=self.directory_entry.get() or None, parent=self.window)
+        if directory:
+            self.directory_entry.delete(0, tk.END)
+            self.directory_entry.insert(0, directory)
+
+    def start(self, replace=False):
+        """Search (or rewrite) every matching file under the directory in parallel."""
+        pattern = self.pattern_entry.get()
+        directory = self.directory_entry.get()
+        if not pattern:
+            return
+        if not os.path.isdir(directory):
+            messagebox.showerror("Search in Files", f"Not a directory: {directory}", parent=self.window)
+            return
+        flags = self.editor._get_regex_flags()
+        try:
+            compile_pattern(pattern, flags) # Fail fast before starting the pool
+        except re.error as e:
+            messagebox.showerror("Regex Error", f"Invalid regular expression: {e}", parent=self.window)
+            return
+        if replace:
+            replacement = self.replace_entry.get()
+            if not messagebox.askyesno("Replace in Files", f"Replace every match of '{pattern}' with '{replacement}' in the files under {directory}?\n\nFiles are rewritten on disk; this can't be undone.", parent=self.window):
+                return
+            task, task_args = replace_file, (pattern, flags, replacement)
+        else:
+            task, task_args = search_file, (pattern, flags)
+
+        self.cancel(quiet=True)
+        self.tree.delete(*self.tree.get_children())
+        self.locations = {}
+        self.run_id += 1
+        self.directory, self.replacing = directory, replace
+        self.pattern, self.replacement, self.flags = pattern, self.replace_entry.get(), flags
+        self.submitted = None # Known once the walk finishes
+        self.files_done = self.bytes_done = self.match_count = self.matched_files = self.errors = 0
+        self.changed_paths = set()
+        self.started = time.monotonic()
+        self.executor = ProcessPoolExecutor()
+        slots = threading.BoundedSemaphore(POOL_MAX_PENDING)
+        walker = threading.Thread(target=self._submit_files, daemon=True,
+                                  args=(self.run_id, self.executor, slots, directory, split_globs(self.include_entry.get()),
+                                        split_globs(self.exclude_entry.get()), task, task_args))
+        walker.start()
+        self.cancel_button.config(state=tk.NORMAL)
+        self.status_var.set("Replacing..." if replace else "Searching...")
+        self._poll_id = self.window.after(SEARCH_POLL_MS, self._poll)
+
+    def _submit_files(self, run, executor, slots, directory, include, exclude, task, task_args):
+        """Walker thread: feed files to the pool with at most POOL_MAX_PENDING in flight."""
+        def on_done(future):
+            slots.release()
+            self.results.put((run, future))
+
+        submitted = 0
+        try:
+            for path in iter_project_files(directory, include, exclude):
+                slots.acquire()
+                if run != self.run_id:
+                    break # Cancelled
+                executor.submit(task, path, *task_args).add_done_callback(on_done)
+                submitted += 1
+        except RuntimeError:
+            pass # Pool shut down by a cancel mid-walk
+        self.results.put((run, submitted))
+
+    def _poll(self):
+        """Move finished files from the pool into the results tree."""
+        self._poll_id = None
+        deadline = time.monotonic() + 0.05 # Keep the UI responsive when results pour in
+        while time.monotonic() < deadline:
+            try:
+                run, item = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if run != self.run_id:
+                continue
+            if isinstance(item, int):
+                self.submitted = item
+                continue
+            self.files_done += 1
+            if item.cancelled():
+                continue
+            try:
+                self._add_result(item.result())
+            except Exception: # e.g. BrokenProcessPool
+                self.errors += 1
+
+        if self.submitted is not None and self.files_done >= self.submitted:
+            self._finish()
+            return
+        noun = "replacements" if self.replacing else "matches"
+        self.status_var.set(f"{'Replacing' if self.replacing else 'Searching'}... {self.files_done:,} files, {self.match_count:,} {noun} ({time.monotonic() - self.started:.1f}s)")
+        self._poll_id = self.window.after(SEARCH_POLL_MS, self._poll)
+
+    def _add_result(self, result):
+        self.bytes_done += result.size
+        relative = os.path.relpath(result.path, self.directory)
+        if result.error:
+            self.errors += 1
+            self.tree.insert("", tk.END, text=relative, values=("", f"Error: {result.error}"))
+            return
+        if not result.count:
+            return
+        self.match_count += result.count
+        self.matched_files += 1
+        if self.replacing:
+            self.changed_paths.add(os.path.abspath(result.path))
+        node = self.tree.insert("", tk.END, text=f"{relative} ({result.count:,})", values=("", ""), open=True)
+        self.locations[node] = (result.path, 0, 0)
+        for line, column, preview in result.matches:
+            item = self.tree.insert(node, tk.END, values=(line + 1, preview.replace("\t", "    ")))
+            self.locations[item] = (result.path, line, column)
+        if result.count > len(result.matches):
+            self.tree.insert(node, tk.END, values=("", f"... {result.count - len(result.matches):,} more"))
+
+    def _finish(self):
+        """Report totals and throughput once every submitted file is done."""
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        self._shutdown_pool()
+        noun = "replacements" if self.replacing else "matches"
+        message = (f"{self.match_count:,} {noun} in {self.matched_files:,} of {self.files_done:,} files in {elapsed:.2f}s"
+                   f" - {self.files_done / elapsed:,.0f} files/s, {self.bytes_done / elapsed / 1e6:,.1f} MB/s")
+        if self.errors:
+            message += f" ({self.errors:,} errors)"
+        if self.replacing:
+            self.editor._add_history_entry(f"Replaced '{self.pattern}' with '{self.replacement}' in files under {self.directory}: {message}.",
+                                           RecipeRule(self.pattern, self.replacement, self.flags))
+            if self.editor.current_file_path and os.path.abspath(self.editor.current_file_path) in self.changed_paths:
+                message += ". The open file changed on disk; reopen it to see the replacements."
+        self.status_var.set(message)
+
+    def _shutdown_pool(self, terminate=False):
+        executor, self.executor = self.executor, None
+        if self._poll_id is not None:
+            self.window.after_cancel(self._poll_id)
+            self._poll_id = None
+        self.cancel_button.config(state=tk.DISABLED)
+        if executor is None:
+            return
+        # Pool workers can't be interrupted mid-match; terminating them stops a runaway pattern
+        processes = list((getattr(executor, "_processes", None) or {}).values()) if terminate else []
+        executor.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            process.terminate()
+
+    def cancel(self, quiet=False):
+        """Stop the current run. Searches kill their workers; replacements let files in progress finish so none is left half-written."""
+        if self.executor is None:
+            return
+        self.run_id += 1
+        self._shutdown_pool(terminate=not self.replacing)
+        if not quiet:
+            self.status_var.set(f"Cancelled after {self.files_done:,} files.")
+
+    def _on_open_result(self, event):
+        location = self.locations.get(self.tree.focus())
+        if location:
+            self.editor.show_location(*location)
+
+    def close(self):
+        self.cancel(quiet=True)
+        self.window.destroy()
+        self.editor.search_in_files_window = None
+
+def _traced(name):
+    """Decorator for RegexEditor methods: record each call as operation name while tracing is on."""
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if not self.tracer.enabled:
+                return method(self, *args, **kwargs)
+            with self.tracer.start(name):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorate
 
 class RegexEditor:
     def __init__(self, root):
         self.root = root
         self.root.title("Regex Editor")
-        self.root.state('zoomed') # Start maximized/zoomed
+        try:
+            self.root.state('zoomed') # Start maximized/zoomed
+        except tk.TclError:
+            self.root.attributes('-zoomed', True) # X11 has no 'zoomed' state
 
         self.current_file_path = None
-        self.last_search_end = "1.0" # Tkinter text index (line.char)
+        self.current_match_start = None # Offset of the match selected by Find Next/Previous
         self.ai_sidebar_visible = False # Start with sidebar hidden
         self.history_log = [] # List to store history entries
+        self.history_rules = [] # (entry text, RecipeRule) for logged replacements, offered when building recipes
+        self.search_job = None # SearchJob running in a worker process, if any
+        self._search_poll_id = None
+        self.search_time_budget = SEARCH_TIME_BUDGET
+        self.large_file = None # LargeFileBuffer when a file is open in large-file mode
+        self.large_file_window = (0, 0) # Logical lines [first, last) currently loaded in the text widget
+        self._window_is_tail = False # The window runs to the end of the document
+        self._loading_window = False # Widget edits are a window load, not user edits
+        self._window_shift_pending = False
+        self._window_retry_id = None
+        self._keep_matches_on_edit = False # Set while Replace re-keys large-file matches itself
+        self.search_in_files_window = None
+        self.candidates_window = None
+        self.analyzer_window = None
+        self.extract_window = None
+        self.recipes_window = None
+        self.save_job = None # SaveJob writing the buffer out, if any
+        self._save_poll_id = None
+        self._saved_generation = 0 # Buffer generation last saved to (or loaded from) the file; -1 if never
+        self._autosaved_generation = 0 # Buffer generation of the last autosave snapshot
+        self._autosave_file = None # Snapshot written for the current buffer, removed once it is saved
+        # Untitled buffers have no path to key on; naming the snapshot per session keeps two sessions apart
+        self._untitled_autosave = f"untitled.{time.strftime('%Y%m%d-%H%M%S')}.{os.getpid()}.autosave"
+        self._accepted_risks = set() # (pattern, flags) the user chose to run despite a backtracking warning
+        self._live_search_id = None
+        self.ai_request = None # AIRequest streaming into the response pane, if any
+        self._ai_poll_id = None
+        self._ai_clients = {} # (base_url, api_key) -> OpenAI client, kept so connections are reused
+        self.ai_timeout_var = tk.DoubleVar(value=AI_TIMEOUT)
+        self.ai_cache = AIResponseCache(AI_CACHE_FILE)
+        self.ai_use_cache_var = tk.BooleanVar(value=True)
+        # Phase timings of editor operations, kept in a ring buffer and shown in the status bar
+        self.tracer = Tracer(enabled=bool(os.environ.get(TRACE_ENV)), on_finish=self._on_operation_traced)
+        self.trace_var = tk.BooleanVar(value=self.tracer.enabled)
+        self._timed_status = (None, None) # (status message, same with timings appended) last shown
 
         # Regex flag variables
         self.ignore_case_var = tk.BooleanVar()
         self.multiline_var = tk.BooleanVar(value=True) # Default MULTILINE to True as it was hardcoded
         self.dotall_var = tk.BooleanVar()
+        self.live_search_var = tk.BooleanVar(value=True) # Search as you type in the Pattern field
+        self.byte_search_var = tk.BooleanVar() # Large-file searches match raw bytes instead of decoded text
 
         # --- Menu Bar ---
         self.menu_bar = tk.Menu(self.root)
@@ -35,6 +2136,7 @@ class RegexEditor:
         self.file_menu = tk.Menu(self.menu_bar, tearoff=0)
         self.menu_bar.add_cascade(label="File", menu=self.file_menu)
         self.file_menu.add_command(label="Open", command=self.open_file, accelerator="Cmd+O")
+        self.file_menu.add_command(label="Open Large File...", command=self.open_large_file)
         self.file_menu.add_command(label="Save", command=self.save_file, accelerator="Cmd+S")
         self.file_menu.add_command(label="Save As...", command=self.save_as_file, accelerator="Cmd+Shift+S")
         self.file_menu.add_separator()
@@ -44,12 +2146,38 @@ class RegexEditor:
         self.view_menu = tk.Menu(self.menu_bar, tearoff=0)
         self.menu_bar.add_cascade(label="View", menu=self.view_menu)
         self.view_menu.add_checkbutton(label="Show AI Sidebar", command=self.toggle_ai_sidebar, variable=tk.BooleanVar(value=self.ai_sidebar_visible)) # Reflect initial state
+        # Only tag Find All matches near the viewport; keeps Tk's tag tree small on huge result sets
+        self.virtual_highlight_var = tk.BooleanVar(value=True)
+        self.view_menu.add_checkbutton(label="Virtualized Highlighting", variable=self.virtual_highlight_var, command=self._on_highlight_mode_changed)
+        self.view_menu.add_separator()
+        self.view_menu.add_checkbutton(label="Record Timings", variable=self.trace_var, command=self._on_trace_toggled)
+        self.view_menu.add_command(label="Export Trace...", command=self.export_trace)
+
+        # Add Search menu
+        self.search_menu = tk.Menu(self.menu_bar, tearoff=0)
+        self.menu_bar.add_cascade(label="Search", menu=self.search_menu)
+        self.search_menu.add_command(label="Find Next", command=self.find_next)
+        self.search_menu.add_command(label="Find Previous", command=self.find_previous)
+        self.search_menu.add_command(label="Go to Match...", command=self.go_to_match)
+        self.search_menu.add_command(label="Go to Line...", command=self.go_to_line)
+        self.search_menu.add_command(label="Preview Replace All...", command=self.preview_replace_all)
+        self.search_menu.add_checkbutton(label="Byte Search (Large Files)", variable=self.byte_search_var, command=self._on_pattern_changed)
+        self.search_menu.add_separator()
+        self.search_menu.add_command(label="Search in Files...", command=self.search_in_files, accelerator="Cmd+Shift+F")
+        self.search_menu.add_command(label="Analyze Pattern...", command=self.analyze_pattern)
+        self.search_menu.add_command(label="Extract...", command=self.extract_matches)
+        self.search_menu.add_command(label="Recipes...", command=self.manage_recipes)
+        self.search_menu.add_separator()
+        self.search_menu.add_command(label="Cancel Search", command=lambda: self._cancel_search_job("Search cancelled."))
+        self.search_menu.add_command(label="Time Budget...", command=self.set_search_time_budget)
 
         # Bind shortcuts
         self.root.bind_all("<Command-o>", lambda event: self.open_file())
         self.root.bind_all("<Command-s>", lambda event: self.save_file())
         self.root.bind_all("<Command-Shift-s>", lambda event: self.save_as_file())
         self.root.bind_all("<Command-Shift-S>", lambda event: self.save_as_file()) # Handle case variation
+        self.root.bind_all("<Command-Shift-f>", lambda event: self.search_in_files())
+        self.root.bind_all("<Command-Shift-F>", lambda event: self.search_in_files())
 
         # --- Main Layout (Paned Window) ---
         self.paned_window = tk.PanedWindow(self.root, orient=tk.HORIZONTAL, sashrelief=tk.RAISED)
@@ -64,16 +2192,20 @@ class RegexEditor:
         self.control_frame.pack(fill=tk.X)
 
         ttk.Label(self.control_frame, text="Pattern:").grid(row=0, column=0, padx=5, pady=5, sticky=tk.W)
-        self.pattern_entry = ttk.Entry(self.control_frame, width=40)
+        self.pattern_var = tk.StringVar()
+        self.pattern_var.trace_add("write", self._on_pattern_changed)
+        self.pattern_entry = ttk.Entry(self.control_frame, width=40, textvariable=self.pattern_var)
         self.pattern_entry.grid(row=0, column=1, padx=5, pady=5, sticky=(tk.W, tk.E))
         self.pattern_entry.bind("<Return>", lambda event: self.find_next()) # Find on Enter in pattern field
+        self.pattern_entry.bind("<Shift-Return>", lambda event: self.find_previous())
 
         # --- Regex Flags ---
         flags_frame = ttk.Frame(self.control_frame)
         flags_frame.grid(row=0, column=2, padx=5, pady=5, sticky=tk.W)
-        ttk.Checkbutton(flags_frame, text="Ignore Case", variable=self.ignore_case_var, command=self._reset_search).pack(side=tk.LEFT)
-        ttk.Checkbutton(flags_frame, text="Multiline", variable=self.multiline_var, command=self._reset_search).pack(side=tk.LEFT, padx=(5, 0))
-        ttk.Checkbutton(flags_frame, text="Dotall", variable=self.dotall_var, command=self._reset_search).pack(side=tk.LEFT, padx=(5, 0))
+        ttk.Checkbutton(flags_frame, text="Ignore Case", variable=self.ignore_case_var, command=self._on_pattern_changed).pack(side=tk.LEFT)
+        ttk.Checkbutton(flags_frame, text="Multiline", variable=self.multiline_var, command=self._on_pattern_changed).pack(side=tk.LEFT, padx=(5, 0))
+        ttk.Checkbutton(flags_frame, text="Dotall", variable=self.dotall_var, command=self._on_pattern_changed).pack(side=tk.LEFT, padx=(5, 0))
+        ttk.Checkbutton(flags_frame, text="Live", variable=self.live_search_var, command=self._on_pattern_changed).pack(side=tk.LEFT, padx=(5, 0))
 
         ttk.Label(self.control_frame, text="Replace:").grid(row=1, column=0, padx=5, pady=5, sticky=tk.W)
         self.replace_entry = ttk.Entry(self.control_frame, width=40)
@@ -86,6 +2218,9 @@ class RegexEditor:
         self.find_button = ttk.Button(buttons_frame, text="Find Next", command=self.find_next)
         self.find_button.pack(side=tk.TOP, fill=tk.X, pady=(0, 2)) # Adjust padding
 
+        self.find_previous_button = ttk.Button(buttons_frame, text="Find Previous", command=self.find_previous)
+        self.find_previous_button.pack(side=tk.TOP, fill=tk.X, pady=(0, 2))
+
         self.find_all_button = ttk.Button(buttons_frame, text="Find All", command=self.find_all)
         self.find_all_button.pack(side=tk.TOP, fill=tk.X, pady=(0, 2))
 
@@ -95,6 +2230,9 @@ class RegexEditor:
         self.replace_all_button = ttk.Button(buttons_frame, text="Replace All", command=self.replace_all)
         self.replace_all_button.pack(side=tk.TOP, fill=tk.X, pady=(0, 2))
 
+        self.cancel_button = ttk.Button(buttons_frame, text="Cancel", command=lambda: self._cancel_search_job("Search cancelled."), state=tk.DISABLED)
+        self.cancel_button.pack(side=tk.TOP, fill=tk.X, pady=(0, 2))
+
         self.toggle_ai_button = ttk.Button(buttons_frame, text="AI Pane", command=self.toggle_ai_sidebar)
         self.toggle_ai_button.pack(side=tk.TOP, fill=tk.X)
 
@@ -104,7 +2242,21 @@ class RegexEditor:
         self.text_area = scrolledtext.ScrolledText(self.editor_frame, wrap=tk.WORD, undo=True)
         self.text_area.pack(expand=True, fill=tk.BOTH, padx=10, pady=(0, 10))
         self.text_area.tag_configure("highlight", background="yellow")
-        self.text_area.bind("<KeyRelease>", self._reset_search) # Reset search if text is modified
+        self.text_area.tag_configure("current_match", background="orange")
+        self.text_area.tag_configure("live_highlight", background="yellow") # On-screen live search results until the full scan lands
+        self.text_area.tag_raise("current_match", "highlight")
+        self._line_index = None # LineIndex for the current buffer, built lazily and patched on edits
+        self._buffer_generation = 0 # Bumped on every edit
+        self._install_edit_hooks()
+        self.match_spans = None # SpanIndex of the last Find All, tagged lazily around the viewport
+        self.match_pattern = None # (pattern, flags) the match set is kept live for across edits
+        self.match_newline_reach = None # Lines a match can span (None = unbounded, forces full rescans)
+        self._dirty_range = None # (lo, hi) offsets edited since the match set was last brought up to date
+        self._rescan_full = False
+        self._rescan_after_id = None
+        self._highlighted_window = None # (lo, hi) offsets currently carrying "highlight" tags
+        self._highlight_refresh_pending = False
+        self.text_area.configure(yscrollcommand=self._on_text_yscroll) # Re-tag on scroll/resize
 
         # --- History Log Area ---
         history_label = ttk.Label(self.editor_frame, text="History:", padding=(10, 5, 10, 0))
@@ -113,16 +2265,11 @@ class RegexEditor:
         self.history_text_area.pack(expand=False, fill=tk.X, padx=10, pady=(0, 10)) # Fill horizontally, fixed height
 
         # --- Right Pane (AI Assistant Sidebar) ---
-        self.ai_sidebar_frame = ttk.Frame(self.paned_window, padding="10", width=250) # Initial width
-        self.paned_window.add(self.ai_sidebar_frame)
-        # self.paned_window.sash_place(0, 450, 0) # No need to place sash initially
-
-        self._create_ai_sidebar_widgets()
-        self._load_api_key() # Load saved API key on startup
-
-        # --- Hide AI Sidebar Initially ---
-        if not self.ai_sidebar_visible:
-             self.paned_window.forget(self.ai_sidebar_frame)
+        # Built (and the saved API key loaded) by _ensure_ai_sidebar the first time the pane is shown
+        self.ai_sidebar_frame = None
+        if self.ai_sidebar_visible:
+            self._ensure_ai_sidebar()
+            self.paned_window.add(self.ai_sidebar_frame)
 
         # --- Status Bar ---
         self.status_var = tk.StringVar()
@@ -130,6 +2277,18 @@ class RegexEditor:
         self.status_bar.pack(side=tk.BOTTOM, fill=tk.X)
         self._update_status("Ready") # Initial status
 
+        self.root.protocol("WM_DELETE_WINDOW", self._on_close) # A running save finishes before the window goes
+        self.root.after(AUTOSAVE_INTERVAL_MS, self._autosave)
+
+    def _ensure_ai_sidebar(self):
+        """Build the AI sidebar and load the saved API key, once; the SDK is imported in the background meanwhile."""
+        if self.ai_sidebar_frame is not None:
+            return
+        self.ai_sidebar_frame = ttk.Frame(self.paned_window, padding="10", width=250) # Initial width
+        self._create_ai_sidebar_widgets()
+        self._load_api_key()
+        threading.Thread(target=_preload_openai, daemon=True).start() # Ready by the time a question is typed
+
     def _create_ai_sidebar_widgets(self):
         """Create widgets for the AI Assistant sidebar."""
         # --- AI Controls ---
@@ -151,19 +2310,305 @@ class RegexEditor:
         self.ai_query_input = scrolledtext.ScrolledText(self.ai_sidebar_frame, height=5, wrap=tk.WORD)
         self.ai_query_input.pack(fill=tk.X, pady=2)
 
-        # Ask Button
-        self.ask_ai_button = ttk.Button(self.ai_sidebar_frame, text="Ask AI", command=self.ask_ai_assistant)
-        self.ask_ai_button.pack(pady=5)
+        # Ask / Cancel Buttons and timeout
+        ask_frame = ttk.Frame(self.ai_sidebar_frame)
+        ask_frame.pack(pady=5)
+        self.ask_ai_button = ttk.Button(ask_frame, text="Ask AI", command=self.ask_ai_assistant)
+        self.ask_ai_button.pack(side=tk.LEFT)
+        self.cancel_ai_button = ttk.Button(ask_frame, text="Cancel", command=lambda: self._cancel_ai_request("AI request cancelled."), state=tk.DISABLED)
+        self.cancel_ai_button.pack(side=tk.LEFT, padx=(5, 0))
+        ttk.Label(ask_frame, text="Timeout (s):").pack(side=tk.LEFT, padx=(10, 2))
+        ttk.Spinbox(ask_frame, from_=5, to=600, increment=5, width=5, textvariable=self.ai_timeout_var).pack(side=tk.LEFT)
+        ttk.Checkbutton(self.ai_sidebar_frame, text="Use cached answers", variable=self.ai_use_cache_var).pack(anchor=tk.W)
+        ttk.Button(self.ai_sidebar_frame, text="Compare Candidates...", command=self.show_ai_candidates).pack(anchor=tk.W, pady=(5, 0))
 
         # AI Response Output Area
         ttk.Label(self.ai_sidebar_frame, text="AI Response:").pack(anchor=tk.W, pady=(10, 2))
         self.ai_response_output = scrolledtext.ScrolledText(self.ai_sidebar_frame, height=10, wrap=tk.WORD, state=tk.DISABLED) # Start disabled
         self.ai_response_output.pack(fill=tk.BOTH, expand=True, pady=2)
 
+    # --- Buffer Edit Tracking ---
+    def _install_edit_hooks(self):
+        """Route the text widget's Tcl command through a proxy so every edit is seen."""
+        widget_cmd = str(self.text_area)
+        self._text_tk_cmd = widget_cmd + "_orig"
+        self.root.tk.call("rename", widget_cmd, self._text_tk_cmd)
+        self.root.tk.createcommand(widget_cmd, self._on_text_command)
+
+    def _on_text_command(self, *args):
+        """Forward a widget command to Tk, keeping the line index in sync with edits."""
+        call = self.root.tk.call
+        orig = self._text_tk_cmd
+        operation = args[0] if args else None
+        if operation not in ("insert", "delete", "replace", "edit"):
+            return call(orig, *args)
+
+        if operation == "edit":
+            result = call(orig, *args)
+            if args[1:2] in (("undo",), ("redo",)):
+                self._buffer_generation += 1
+                self._line_index = None # Rebuild on next use rather than replay the undo stack
+                self._on_buffer_edited(None, 0, 0)
+            return result
+
+        if not self._loading_window:
+            self._buffer_generation += 1 # Lets background jobs detect that their snapshot is stale
+        if self._line_index is None:
+            result = call(orig, *args)
+            self._on_buffer_edited(None, 0, 0)
+            return result
+
+        if operation == "insert":
+            start = end = self._text_offset(args[1])
+            inserted = "".join(args[2::2]) # insert index chars ?tagList chars tagList ...?
+        elif len(args) > 3 and operation == "delete":
+            # Multiple ranges in one delete; not worth tracking piecewise
+            self._line_index = None
+            result = call(orig, *args)
+            self._on_buffer_edited(None, 0, 0)
+            return result
+        else:
+            start = self._text_offset(args[1])
+            end = self._text_offset(args[2]) if len(args) > 2 else start + 1
+            inserted = "".join(args[3::2]) if operation == "replace" else ""
+
+        result = call(orig, *args)
+        if end > start or inserted:
+            removed_len = max(end - start, 0)
+            self._line_index.patch(start, removed_len, inserted)
+            self._on_buffer_edited(start, removed_len, len(inserted))
+        return result
+
+    def _text_offset(self, index):
+        """Offset of a Tk index in the buffer, clamped to before the trailing newline like Tk does."""
+        normalized = self.root.tk.call(self._text_tk_cmd, "index", index)
+        return min(self._line_index.to_offset(str(normalized)), self._line_index.length - 1)
+
+    def _text_get(self, start="1.0", end=tk.END):
+        """Read buffer text straight from Tk, bypassing the edit-tracking proxy."""
+        return str(self.root.tk.call(self._text_tk_cmd, "get", start, end))
+
+    def _get_line_index(self, text):
+        """Return the LineIndex for text, rebuilding it if edits left it missing or stale."""
+        if self._line_index is None or self._line_index.length != len(text):
+            self._line_index = LineIndex(text)
+        return self._line_index
+
+    # --- Match Highlighting ---
+    def _on_text_yscroll(self, first, last):
+        """Scrollbar callback for the text area; also schedules re-tagging of visible matches."""
+        self.text_area.vbar.set(first, last)
+        if self.large_file is not None and not self._loading_window and not self._window_shift_pending:
+            # Page the window when the view nears either of its edges
+            window_first = self.large_file_window[0]
+            if (float(first) < 0.1 and window_first > 0) or (float(last) > 0.9 and not self._window_is_tail):
+                self._window_shift_pending = True
+                self.root.after_idle(self._shift_large_file_window)
+        if self.match_spans and not self._highlight_refresh_pending:
+            self._highlight_refresh_pending = True
+            self.root.after_idle(self._refresh_visible_highlights)
+
+    def _on_highlight_mode_changed(self):
+        """Re-apply Find All highlights after toggling virtualized highlighting."""
+        self._highlighted_window = None
+        self._refresh_visible_highlights()
+
+    def _refresh_visible_highlights(self):
+        """Tag the stored match spans that fall inside the viewport plus a margin."""
+        self._highlight_refresh_pending = False
+        spans = self.match_spans
+        if spans is None or self._line_index is None:
+            return
+        line_index = self._line_index
+        if self.virtual_highlight_var.get():
+            first_line = int(self.text_area.index("@0,0").split(".")[0])
+            last_line = int(self.text_area.index(f"@0,{self.text_area.winfo_height()}").split(".")[0])
+            lo = self._line_position(max(first_line - HIGHLIGHT_MARGIN_LINES, 1))
+            hi = self._line_position(last_line + HIGHLIGHT_MARGIN_LINES)
+            window = self._highlighted_window
+            if window and window[0] <= self._line_position(first_line) and self._line_position(last_line + 1) <= window[1]:
+                return # Viewport still inside the tagged window
+        elif self.large_file is not None:
+            lo, hi = position_key(self.large_file_window[0], 0), position_key(self.large_file_window[1] + 1, 0)
+        else:
+            lo, hi = 0, line_index.length
+        self._highlighted_window = (lo, hi)
+
+        self.text_area.tag_remove("highlight", "1.0", tk.END)
+        indices = []
+        for i in spans.overlapping(lo, hi):
+            indices.append(self._span_to_index(spans.starts[i]))
+            indices.append(self._span_to_index(spans.ends[i]))
+            if len(indices) >= 2000: # Batch many ranges into a single tag add call
+                self.text_area.tag_add("highlight", *indices)
+                indices = []
+        if indices:
+            self.text_area.tag_add("highlight", *indices)
+
+    def _line_position(self, line, column=0):
+        """Match-set position of a widget line/column: an offset, or a (line, column) key in large-file mode."""
+        if self.large_file is not None:
+            return position_key(self.large_file_window[0] + line - 1, column)
+        return self._line_index.to_offset(f"{line}.{column}")
+
+    def _span_to_index(self, position):
+        """Tk index of a match-set position, clamped to the loaded window in large-file mode."""
+        if self.large_file is None:
+            return self._line_index.to_index(position)
+        first, last = self.large_file_window
+        line = key_line(position)
+        if line < first:
+            return "1.0"
+        if line >= last:
+            return "end-1c"
+        return f"{line - first + 1}.{key_column(position)}"
+
+    def _clear_match_spans(self):
+        """Forget the Find All result set."""
+        self.match_spans = None
+        self.match_pattern = None
+        self._highlighted_window = None
+        self._dirty_range = None
+        self._rescan_full = False
+        if self._rescan_after_id is not None:
+            self.root.after_cancel(self._rescan_after_id)
+            self._rescan_after_id = None
+
+    # --- Incremental Re-search ---
+    def _on_buffer_edited(self, offset, removed_len, inserted_len):
+        """Keep the live match set current after an edit; offset is None when the edit couldn't be located."""
+        if self._loading_window:
+            return
+        if self.large_file is not None:
+            self._on_large_file_edited()
+            return
+        job = self.search_job
+        if job is not None and job.spans is self.match_spans:
+            # A streaming Find All (a full rescan included) just went stale; redo it once typing pauses
+            self._finish_search_job()
+            offset = None # Sets _rescan_full below, so the next rescan searches the whole buffer again
+        if self.current_match_start is not None:
+            self.current_match_start = None # Offsets moved; the next step starts from the cursor
+            self.text_area.tag_remove("current_match", "1.0", tk.END)
+        if self.match_pattern is None:
+            return
+
+        if offset is None or self.match_spans is None:
+            self._rescan_full = True
+        else:
+            # A rescan still running was started before this edit and will be cancelled, so its range stays dirty too
+            dropped = self.match_spans.apply_edit(offset, removed_len, inserted_len)
+            self._dirty_range = merge_dirty_range(self._dirty_range, offset, removed_len, inserted_len, dropped)
+
+        if self._rescan_after_id is not None:
+            self.root.after_cancel(self._rescan_after_id)
+        self._rescan_after_id = self.root.after(RESCAN_DEBOUNCE_MS, self._rescan_dirty_matches)
+
+    def _rescan_dirty_matches(self):
+        """Re-search only the lines touched since the last update and splice the results in."""
+        self._rescan_after_id = None
+        if self.match_pattern is None:
+            return
+        pattern_str, flags = self.match_pattern
+        line_index, spans, reach = self._line_index, self.match_spans, self.match_newline_reach
+        if self._rescan_full or reach is None or line_index is None or spans is None:
+            # Edit couldn't be tracked, or the pattern can span any number of lines
+            self.text_area.tag_remove("highlight", "1.0", tk.END)
+            self._start_find_all(pattern_str, flags)
+            return
+        if self._dirty_range is None:
+            return
+        # The range stays dirty until _on_rescan_done has spliced the results in
+        base, scan_from, window_hi, safe_end, text_end = plan_rescan(line_index, spans, reach, *self._dirty_range)
+        region_text = self._text_get(line_index.to_index(base), line_index.to_index(text_end))
+
+        job = self._start_search_job("find_all", pattern_str, flags, region_text, self._on_rescan_done, start=scan_from - base)
+        job.region = (base, scan_from, window_hi, safe_end)
+        job.quiet = True
+
+    def _on_rescan_done(self, job, result):
+        """Splice a dirty-region rescan into the live match set, resyncing with the untouched matches after it."""
+        spans = self.match_spans
+        if spans is None:
+            return
+        if not splice_rescan(spans, job.region, job.spans.starts, job.spans.ends):
+            self._rescan_full = True # Couldn't resync inside the region
+            self._rescan_dirty_matches()
+            return
+        self._dirty_range = None
+        self._highlighted_window = None
+        self._refresh_visible_highlights()
+        self._update_status(f"Found {len(spans)} matches.")
+
     def _reset_search(self, event=None):
         """Reset search position when text changes"""
-        self.last_search_end = "1.0"
+        self.current_match_start = None
+        self.text_area.tag_remove("current_match", "1.0", tk.END)
+        self._clear_match_spans()
         self.text_area.tag_remove("highlight", "1.0", tk.END)
+        self.text_area.tag_remove("live_highlight", "1.0", tk.END)
+
+    # --- Live Search ---
+    def _on_pattern_changed(self, *args):
+        """Pattern edit (from the variable trace) or flag toggle: in live mode, drop stale results and search once typing pauses."""
+        if self._live_search_id is not None:
+            self.root.after_cancel(self._live_search_id)
+            self._live_search_id = None
+        if not self.live_search_var.get():
+            if not args:
+                self._reset_search() # Flag toggles invalidate results, as before
+            return
+        job = self.search_job
+        if job is not None and job.mode != "replace_all":
+            self._cancel_search_job() # Results for the old pattern are no longer wanted
+        self._reset_search()
+        self._live_search_id = self.root.after(LIVE_SEARCH_DEBOUNCE_MS, self._run_live_search)
+
+    def _run_live_search(self):
+        """Search the visible lines right away, then the whole document in the worker (superseding any scan in flight)."""
+        self._live_search_id = None
+        pattern_str = self.pattern_entry.get()
+        flags = self._get_regex_flags()
+        job = self.search_job
+        if job is not None and job.mode == "replace_all":
+            return # Never interrupt a Replace All
+        if not pattern_str:
+            self._cancel_search_job()
+            self._update_status("Ready")
+            return
+        try:
+            compile_pattern(pattern_str, flags)
+            risks = backtracking_risks(pattern_str, flags)
+        except re.error:
+            self._update_status("Live search: incomplete pattern.") # Typing in progress; no dialog
+            return
+        if (pattern_str, flags) not in self._accepted_risks and any(risk.severity == "exponential" for risk in risks):
+            self._update_status("Live search paused: the pattern may backtrack catastrophically. Press Enter to run it anyway.")
+            return
+
+        # Any flagged shape, even a polynomial one, can take seconds on one long line; only the killable worker runs those
+        visible = None if risks else self._live_search_visible(compile_pattern(pattern_str, flags))
+        job = self._start_find_all(pattern_str, flags)
+        job.first_match_shown = bool(visible) # Keep the view still unless nothing on screen matched
+        if visible is not None:
+            self._update_status(f"{visible:,} matches on screen; searching the rest...")
+
+    def _live_search_visible(self, regex):
+        """Tag matches in the displayed characters (at most LIVE_VISIBLE_CHARS of them); returns how many there were."""
+        start = self.text_area.index("@0,0")
+        end = self.text_area.index(f"@{self.text_area.winfo_width()},{self.text_area.winfo_height()} + 1c")
+        if self.text_area.compare(end, ">", f"{start} + {LIVE_VISIBLE_CHARS}c"):
+            end = self.text_area.index(f"{start} + {LIVE_VISIBLE_CHARS}c") # A long unwrapped line shows only a slice
+        # One character of context before the view keeps ^, \b and lookbehinds honest where it starts mid-line
+        context = 0 if start == "1.0" else 1
+        text = self._text_get(f"{start} - {context}c", end)
+        indices = []
+        for match in regex.finditer(text, context):
+            if match.end() > match.start():
+                indices.extend((f"{start}+{match.start() - context}c", f"{start}+{match.end() - context}c"))
+        if indices:
+            self.text_area.tag_add("live_highlight", *indices)
+        return len(indices) // 2
 
     def open_file(self):
         filepath = filedialog.askopenfilename(
@@ -171,31 +2616,83 @@ class RegexEditor:
         )
         if not filepath:
             return
+        self._load_file(filepath)
+
+    @_traced("open_file")
+    def _load_file(self, filepath):
+        """Load filepath into the editor (large-file mode for big files); returns False if it couldn't be opened."""
+        self._complete_save() # A save still reading the current buffer finishes first
         try:
+            if os.path.getsize(filepath) >= LARGE_FILE_THRESHOLD:
+                self._open_large_file(filepath)
+                return True
+            source = self._recover_autosave(filepath) or filepath
+            self._close_large_file()
             self.text_area.delete("1.0", tk.END)
-            with open(filepath, "r", encoding='utf-8') as input_file:
-                text = input_file.read()
+            try:
+                with open(source, "r", encoding='utf-8') as input_file:
+                    with self.tracer.phase("read"):
+                        text = input_file.read()
+            except UnicodeDecodeError:
+                # Mixed-encoding or binary-ish files: large-file mode decodes leniently for display and
+                # writes untouched bytes back as they were
+                self._open_large_file(filepath)
+                self._update_status(f"{os.path.basename(filepath)} isn't valid UTF-8; opened in large-file mode.")
+                return True
+            with self.tracer.phase("widget insert"):
                 self.text_area.insert(tk.END, text)
+            self.tracer.note(chars=len(text))
+            # Recovered changes aren't in the file yet, so they count as unsaved
+            self._saved_generation = self._buffer_generation if source == filepath else -1
+            self._autosaved_generation = self._buffer_generation
+            self._autosave_file = source if source != filepath else None
             self.current_file_path = filepath
             self.root.title(f"Regex Editor - {os.path.basename(filepath)}")
             self._reset_search() # Reset search on new file
+            return True
+        except Exception as e:
+            messagebox.showerror("Error Opening File", f"Could not open file: {e}")
+            self.current_file_path = None
+            self.root.title("Regex Editor")
+            return False
+
+    def show_location(self, filepath, line, column=0):
+        """Open filepath unless it is the current file, then put the cursor at a 0-based line/column."""
+        if os.path.abspath(filepath) != os.path.abspath(self.current_file_path or "") and not self._load_file(filepath):
+            return
+        self._show_line(line, column)
+        self.text_area.focus_set()
+
+    def _show_line(self, line, column=0):
+        """Put the cursor at a 0-based document line/column, paging the large-file window there if needed."""
+        if self.large_file is not None:
+            if not self._show_large_file_line(line):
+                return
+            line -= self.large_file_window[0]
+        index = f"{line + 1}.{column}"
+        self.text_area.mark_set(tk.INSERT, index)
+        self.text_area.see(index)
+
+    def open_large_file(self):
+        """Open a file in large-file mode regardless of its size."""
+        filepath = filedialog.askopenfilename(
+            filetypes=[("Text Files", "*.txt"), ("All Files", "*.*")]
+        )
+        if not filepath:
+            return
+        try:
+            self._open_large_file(filepath)
         except Exception as e:
             messagebox.showerror("Error Opening File", f"Could not open file: {e}")
             self.current_file_path = None
             self.root.title("Regex Editor")
 
+    @_traced("save_file")
     def save_file(self):
+        """Write the buffer to its file in the background; the file is replaced atomically once complete."""
         if self.current_file_path:
-            try:
-                text = self.text_area.get("1.0", tk.END)
-                # Tkinter adds a newline at the end, decide if you want to keep it
-                # if text.endswith('\n'):
-                #     text = text[:-1]
-                with open(self.current_file_path, "w", encoding='utf-8') as output_file:
-                    output_file.write(text)
-                # Optional: Add status update or confirmation
-            except Exception as e:
-                messagebox.showerror("Error Saving File", f"Could not save file: {e}")
+            self._cancel_save() # A newer save (or a pending autosave snapshot) is superseded
+            self._start_save(self.current_file_path)
         else:
             self.save_as_file()
 
@@ -208,49 +2705,212 @@ class RegexEditor:
         if not filepath:
             return
         self.current_file_path = filepath
-        self.root.title(f"Regex Editor - {os.path.basename(filepath)}")
+        self.root.title(f"Regex Editor - {os.path.basename(filepath)}" + (" (large file)" if self.large_file is not None else ""))
         self.save_file() # Call save_file now that path is set
 
+    # --- Background Saving ---
+    def _start_save(self, path, autosave=False):
+        """Begin writing the buffer to path; chunks are handed to the writer thread a time slice at a time."""
+        if self.large_file is not None:
+            self._commit_large_file_window()
+            chunks = ((chunk, len(chunk)) for chunk in self.large_file.chunks())
+            job = SaveJob(path, chunks, self.large_file.source().size, self._buffer_generation, live=False, autosave=autosave)
+        else:
+            line_count = int(self.text_area.index("end-1c").split(".")[0])
+            job = SaveJob(path, self._text_chunks(line_count), line_count, self._buffer_generation, live=True, autosave=autosave)
+        job.trace = self.tracer.defer()
+        self.save_job = job
+        self._save_poll_id = self.root.after(0, self._pump_save)
+        return job
+
+    def _text_chunks(self, line_count):
+        """Yield (text, lines) for SAVE_CHUNK_LINES lines of the widget at a time, each read when it is asked for."""
+        for line in range(1, line_count + 1, SAVE_CHUNK_LINES):
+            # The last range runs to "end", so Tk's trailing newline is saved as before
+            yield self._text_get(f"{line}.0", f"{line + SAVE_CHUNK_LINES}.0"), SAVE_CHUNK_LINES
+
+    def _pump_save(self):
+        """Feed the writer for up to SAVE_SLICE_MS, report progress, and wrap up once the file is in place."""
+        self._save_poll_id = None
+        job = self.save_job
+        if job is None:
+            return
+        if job.live and not job.all_pulled and job.generation != self._buffer_generation:
+            # What was pulled so far predates the edit: start over from the current text
+            trace, job.trace = job.trace, None # Carried over to the new attempt
+            self._cancel_save()
+            if not job.autosave:
+                self._start_save(job.path).trace = trace
+                self._update_status(f"The text changed while saving; saving {os.path.basename(job.path)} again...")
+            return
+        deadline = time.perf_counter() + SAVE_SLICE_MS / 1000
+        while not job.all_pulled and job.writer.writable() and time.perf_counter() < deadline:
+            started = time.perf_counter()
+            item = next(job.chunks, None)
+            if job.trace is not None:
+                job.trace.add("snapshot", started, time.perf_counter() - started)
+            if item is None:
+                job.writer.close()
+                job.all_pulled = True
+            else:
+                job.writer.write(item[0])
+                job.pulled += item[1]
+        if job.writer.done.is_set():
+            self._finish_save(job)
+            return
+        if not job.autosave:
+            step = f"{job.progress():.0%}" if not job.all_pulled else "writing to disk"
+            self._update_status(f"Saving {os.path.basename(job.path)}... {step}")
+        self._save_poll_id = self.root.after(SAVE_POLL_MS, self._pump_save)
+
+    def _finish_save(self, job):
+        """Report a completed save; afterwards the buffer counts as saved at the generation it was read at."""
+        self.save_job = None
+        writer = job.writer
+        if job.trace is not None:
+            job.trace.add("write", writer.started_at, writer.finished_at - writer.started_at, "save writer")
+        self.tracer.finish(job.trace, bytes=writer.written, **({"error": str(writer.error)} if writer.error else {}))
+        if writer.error is not None:
+            if job.autosave:
+                print(f"Warning: Could not write autosave snapshot {job.path}. Error: {writer.error}")
+            else:
+                messagebox.showerror("Error Saving File", f"Could not save file: {writer.error}")
+            return
+        if job.autosave:
+            self._autosaved_generation = job.generation
+            self._autosave_file = job.path
+            return
+        self._saved_generation = job.generation
+        self._remove_autosave()
+        if self.large_file is not None and job.generation == self._buffer_generation and job.path == self.current_file_path:
+            self._reopen_saved_large_file(job.path)
+        self._update_status(f"Saved {os.path.basename(job.path)} ({writer.written / (1024 * 1024):.1f} MB in {time.monotonic() - job.started:.1f}s).")
+
+    def _cancel_save(self):
+        """Abandon a running save; the file on disk is left as it was."""
+        job, self.save_job = self.save_job, None
+        if job is None:
+            return
+        if self._save_poll_id is not None:
+            self.root.after_cancel(self._save_poll_id)
+            self._save_poll_id = None
+        job.writer.abort()
+        self.tracer.finish(job.trace, cancelled=True)
+
+    def _complete_save(self):
+        """Finish a running save right away, before the buffer it reads goes away (opening another file, quitting)."""
+        job = self.save_job
+        if job is None:
+            return
+        if job.autosave:
+            self._cancel_save() # The snapshot will be taken again if still needed
+            return
+        if self._save_poll_id is not None:
+            self.root.after_cancel(self._save_poll_id)
+            self._save_poll_id = None
+        if job.live and not job.all_pulled and job.generation != self._buffer_generation:
+            trace, job.trace = job.trace, None
+            self._cancel_save()
+            job = self._start_save(job.path)
+            job.trace = trace
+            self.root.after_cancel(self._save_poll_id)
+            self._save_poll_id = None
+        if not job.all_pulled:
+            for chunk, _ in job.chunks:
+                job.writer.write(chunk) # Blocks while the writer catches up
+            job.writer.close()
+            job.all_pulled = True
+        job.writer.done.wait()
+        self._finish_save(job)
+
+    def _is_dirty(self):
+        """True if the buffer has changes that haven't been saved to its file."""
+        return self._buffer_generation != self._saved_generation
+
+    # --- Autosave ---
+    def _autosave_path(self, filepath):
+        """Snapshot location for filepath, unique per absolute path; an untitled buffer gets one per editor session."""
+        if not filepath:
+            return os.path.join(AUTOSAVE_DIR, self._untitled_autosave)
+        digest = hashlib.sha1(os.path.abspath(filepath).encode("utf-8", "surrogateescape")).hexdigest()[:12]
+        return os.path.join(AUTOSAVE_DIR, f"{os.path.basename(filepath)}.{digest}.autosave")
+
+    def _autosave(self):
+        """Snapshot the buffer every AUTOSAVE_INTERVAL_MS, but only if it changed since it was last saved or snapshotted."""
+        self.root.after(AUTOSAVE_INTERVAL_MS, self._autosave)
+        if (self.save_job is not None or self.large_file is not None # Large files would be copied whole each time
+                or not self._is_dirty() or self._autosaved_generation == self._buffer_generation):
+            return
+        try:
+            os.makedirs(AUTOSAVE_DIR, exist_ok=True)
+        except OSError as e:
+            print(f"Warning: Could not create {AUTOSAVE_DIR}. Error: {e}")
+            return
+        self._start_save(self._autosave_path(self.current_file_path), autosave=True)
+
+    def _remove_autosave(self):
+        """Drop the current buffer's snapshot once its changes are safely saved."""
+        if self._autosave_file is not None:
+            try:
+                os.remove(self._autosave_file)
+            except OSError:
+                pass
+            self._autosave_file = None
+        self._autosaved_generation = self._saved_generation
+
+    def _recover_autosave(self, filepath):
+        """Offer a snapshot of unsaved changes to filepath if one is newer than the file; returns its path if accepted."""
+        snapshot = self._autosave_path(filepath)
+        try:
+            newer = os.path.getmtime(snapshot) > os.path.getmtime(filepath)
+        except OSError:
+            return None
+        if newer:
+            when = time.strftime("%Y-%m-%d %H:%M", time.localtime(os.path.getmtime(snapshot)))
+            if messagebox.askyesno("Recover Unsaved Changes", f"There are unsaved changes to {os.path.basename(filepath)} from {when}, "
+                                   f"autosaved after the file was last written.\n\nOpen them instead of the file?"):
+                return snapshot
+        try:
+            os.remove(snapshot) # Declined or stale
+        except OSError:
+            pass
+        return None
+
+    def _on_close(self):
+        """Window closed: let a running save finish before the widgets go away."""
+        self._complete_save()
+        self.root.destroy()
+
+    @_traced("find_next")
     def find_next(self):
+        self._navigate_matches(1)
+
+    @_traced("find_previous")
+    def find_previous(self):
+        self._navigate_matches(-1)
+
+    def _navigate_matches(self, direction):
+        """Step to the next (direction 1) or previous (-1) match from the cursor, building the index if needed."""
         pattern_str = self.pattern_entry.get()
         if not pattern_str:
             return
 
-        # Remove previous highlight
-        self.text_area.tag_remove("highlight", "1.0", tk.END)
-
         try:
-            # Compile regex with selected flags
+            # Compile regex with selected flags (fails fast on syntax errors before spawning a worker)
             flags = self._get_regex_flags()
-            regex = re.compile(pattern_str, flags)
-            text_content = self.text_area.get(self.last_search_end, tk.END) # Search from last match end
-
-            match = regex.search(text_content)
-
-            if match:
-                # Calculate start and end positions relative to the beginning of the text_area
-                start_char_offset = match.start()
-                end_char_offset = match.end()
-
-                # Convert character offsets from self.last_search_end to absolute indices
-                base_index = self.text_area.index(self.last_search_end)
-                start_index = self.text_area.index(f"{base_index}+{start_char_offset}c")
-                end_index = self.text_area.index(f"{base_index}+{end_char_offset}c")
-
-                # Highlight the match
-                self.text_area.tag_add("highlight", start_index, end_index)
-                self.text_area.see(start_index) # Scroll to the match
-                self.text_area.mark_set(tk.INSERT, start_index) # Move cursor to start of match
-                self.last_search_end = end_index # Update for next search
-            else:
-                # No more matches from the current position, wrap around?
-                if self.last_search_end != "1.0":
-                    # Ask user or automatically wrap
-                    # For now, just reset and inform
-                    self._update_status("No more matches found. Search reset.")
-                    self._reset_search()
-                else:
-                    self._update_status("Pattern not found.")
+            with self.tracer.phase("compile"):
+                compile_pattern(pattern_str, flags)
+            if self._match_index_ready(pattern_str, flags):
+                self._step_match(direction)
+                return
+            if not self._confirm_backtracking_risk(pattern_str, flags):
+                return
+
+            # Populate the span index once; every later step is a bisect
+            self._reset_search()
+            self.text_area.tag_remove("highlight", "1.0", tk.END)
+            job = self._start_find_all(pattern_str, flags)
+            job.step_direction = direction
 
         except re.error as e:
             messagebox.showerror("Regex Error", f"Invalid regular expression: {e}")
@@ -259,43 +2919,78 @@ class RegexEditor:
             messagebox.showerror("Error", f"An unexpected error occurred during find: {e}")
             self._reset_search()
 
+    def _match_index_ready(self, pattern_str, flags):
+        """True if the live match set belongs to this pattern and its offsets are trustworthy."""
+        job = self.search_job
+        return (self.match_pattern == (pattern_str, flags) and self.match_spans is not None
+                and not self._rescan_full and not (job is not None and job.spans is self.match_spans))
+
+    def _step_match(self, direction):
+        """Select the match after/before the cursor, wrapping around the ends of the buffer."""
+        spans = self.match_spans
+        count = len(spans)
+        self.tracer.note(matches=count)
+        if not count:
+            self._update_status("Pattern not found.")
+            return
+        line, column = map(int, self.text_area.index(tk.INSERT).split("."))
+        cursor = self._line_position(line, column)
+        if direction > 0:
+            # Stay put on a match under the cursor unless it is the one already selected
+            i = bisect_right(spans.starts, cursor) if cursor == self.current_match_start else bisect_left(spans.starts, cursor)
+        else:
+            i = bisect_left(spans.starts, cursor) - 1
+        wrapped = not 0 <= i < count
+        self._select_match(i % count, wrapped)
+
+    def _select_match(self, i, wrapped=False):
+        """Mark match number i (0-based) as current, move the cursor to it and report its position."""
+        spans = self.match_spans
+        if self.large_file is not None and not self._show_large_file_line(key_line(spans.starts[i])):
+            self._update_status(f"Match {i + 1:,} is past the part of the file indexed so far; try again shortly.")
+            return
+        with self.tracer.phase("index mapping"):
+            start_index = self._span_to_index(spans.starts[i])
+            end_index = self._span_to_index(spans.ends[i])
+        with self.tracer.phase("tagging"):
+            self.text_area.tag_remove("current_match", "1.0", tk.END)
+            self.text_area.tag_add("current_match", start_index, end_index)
+            self.text_area.see(start_index) # Scroll to the match
+            self.text_area.mark_set(tk.INSERT, start_index) # Move cursor to start of match
+        self.current_match_start = spans.starts[i]
+        self._update_status(f"Match {i + 1:,} of {len(spans):,}" + (" (wrapped)" if wrapped else ""))
+
+    def go_to_match(self):
+        """Jump straight to match number N of the current result set."""
+        pattern_str = self.pattern_entry.get()
+        if not pattern_str or not self._match_index_ready(pattern_str, self._get_regex_flags()):
+            self._update_status("No results to navigate. Use 'Find All' or 'Find Next' first.")
+            return
+        count = len(self.match_spans)
+        if not count:
+            self._update_status("Pattern not found.")
+            return
+        number = simpledialog.askinteger("Go to Match", f"Match number (1-{count:,}):", minvalue=1, maxvalue=count, parent=self.root)
+        if number:
+            self._select_match(number - 1)
+
+    @_traced("find_all")
     def find_all(self):
         pattern_str = self.pattern_entry.get()
         if not pattern_str:
             return
 
         # Remove previous highlights
+        self._clear_match_spans()
         self.text_area.tag_remove("highlight", "1.0", tk.END)
 
         try:
             # Compile regex with selected flags
             flags = self._get_regex_flags()
-            regex = re.compile(pattern_str, flags)
-            text_content = self.text_area.get("1.0", tk.END)
-            
-            count = 0
-            for match in regex.finditer(text_content):
-                start_char_offset = match.start()
-                end_char_offset = match.end()
-
-                # Convert character offsets to absolute indices
-                # finditer gives absolute offsets, so no need for base_index calculation like find_next
-                start_index = self.text_area.index(f"1.0 + {start_char_offset}c")
-                end_index = self.text_area.index(f"1.0 + {end_char_offset}c")
-
-                # Highlight the match
-                self.text_area.tag_add("highlight", start_index, end_index)
-                count += 1
-
-            if count > 0:
-                self._update_status(f"Found {count} matches.")
-                # Optionally scroll to the first match?
-                first_match_start = self.text_area.tag_ranges("highlight")[0]
-                self.text_area.see(first_match_start)
-            else:
-                self._update_status("Pattern not found.")
-            
-            self.last_search_end = "1.0" # Reset search for find_next after find_all
+            with self.tracer.phase("compile"):
+                compile_pattern(pattern_str, flags)
+            if self._confirm_backtracking_risk(pattern_str, flags):
+                self._start_find_all(pattern_str, flags)
 
         except re.error as e:
             messagebox.showerror("Regex Error", f"Invalid regular expression: {e}")
@@ -304,92 +2999,620 @@ class RegexEditor:
              messagebox.showerror("Error", f"An unexpected error occurred during find all: {e}")
              self._reset_search()
 
+    def _start_find_all(self, pattern_str, flags):
+        """Scan the whole buffer in the worker, streaming into a fresh match set kept live across edits."""
+        if self.large_file is not None:
+            # The worker streams the mapped file itself; spans come back as (line, column) keys
+            self._commit_large_file_window()
+            text_content = self.large_file.source()
+            text_content.byte_search = self.byte_search_var.get() and text_content.unedited
+        else:
+            with self.tracer.phase("snapshot"):
+                text_content = self._text_get("1.0", tk.END)
+            with self.tracer.phase("line index"):
+                self._get_line_index(text_content)
+        # Spans stream into job.spans; tagging happens in _refresh_visible_highlights
+        job = self._start_search_job("find_all", pattern_str, flags, text_content, self._on_find_all_done, on_batch=self._on_find_all_batch)
+        self.match_spans = job.spans
+        self.match_pattern = (pattern_str, flags)
+        self.match_newline_reach = pattern_newline_reach(pattern_str, flags)
+        self._dirty_range = None
+        self._rescan_full = False
+        job.step_direction = None # Set by Find Next/Previous to select a match once the scan is done
+        return job
+
+    def _on_find_all_batch(self, job):
+        """Show partial Find All results as they stream in."""
+        if not job.first_match_shown and len(job.spans):
+            job.first_match_shown = True
+            if self.large_file is not None:
+                self._show_large_file_line(key_line(job.spans.starts[0]))
+            self.text_area.see(self._span_to_index(job.spans.starts[0])) # Scroll to the first match
+        self._highlighted_window = None # New spans may fall inside the current window
+        with self.tracer.phase("tagging"):
+            self._refresh_visible_highlights()
+
+    def _on_find_all_done(self, job, result):
+        self.text_area.tag_remove("live_highlight", "1.0", tk.END) # The full result set is tagged now
+        count = len(job.spans)
+        self.tracer.note(matches=count, chars=job.text_length)
+        if count > 0:
+            self._update_status(f"Found {count} matches.{self._prefilter_note(job)}{self._byte_search_note(job)}")
+        else:
+            self._update_status("Pattern not found." + self._byte_search_note(job))
+        if job.step_direction:
+            self._step_match(job.step_direction)
+
+    def _byte_search_note(self, job):
+        """Status-bar suffix for when Byte Search was asked for but the decoded text had to be searched."""
+        if self.large_file is None or not self.byte_search_var.get() or job.byte_search:
+            return ""
+        return " (Searched decoded text: Byte Search reads the file on disk, and it has unsaved edits.)"
+
+    def _prefilter_note(self, job):
+        """Status-bar suffix describing the literal prefilter a finished job used, on texts big enough to care."""
+        stats = job.prefilter
+        if stats is None or job.text_length < PREFILTER_NOTE_CHARS:
+            return ""
+        literals = ", ".join(repr(literal) for literal in stats.literals[:3]) + (", ..." if len(stats.literals) > 3 else "")
+        if stats.speedup is None:
+            return f" (Literal prefilter {literals} skipped: it occurs almost everywhere.)"
+        return f" (Literal prefilter {literals}: regex ran on {stats.coverage:.1%} of the text, ~{stats.speedup:.0f}x faster.)"
+
+    @_traced("replace_current")
     def replace_current(self):
         pattern_str = self.pattern_entry.get()
         replace_str = self.replace_entry.get()
         if not pattern_str:
             return
 
-        # Check if there's a highlighted selection (from find_next)
-        selected_ranges = self.text_area.tag_ranges("highlight") # Use highlight tag
+        # Check if there's a selected match (from find_next/find_previous)
+        spans = self.match_spans
+        ready = self.current_match_start is not None and self._match_index_ready(pattern_str, self._get_regex_flags())
+        i = bisect_left(spans.starts, self.current_match_start) if ready else -1
 
-        if selected_ranges:
-            start_index, end_index = selected_ranges
+        if ready and i < len(spans) and spans.starts[i] == self.current_match_start:
             try:
-                # Get the highlighted text
+                start_index = self._span_to_index(spans.starts[i])
+                end_index = self._span_to_index(spans.ends[i])
+                # Get the selected text
                 selected_text = self.text_area.get(start_index, end_index)
-                # Verify it actually matches the current pattern before replacing
-                # regex = re.compile(pattern_str)
-                # >>> REMOVED check: Since find_next found it, we trust the highlight <<< 
-                # if regex.fullmatch(selected_text): # Use fullmatch to ensure the selection *is* the pattern
                 
-                # Perform replacement
-                self.text_area.delete(start_index, end_index)
-                self.text_area.insert(start_index, replace_str)
-                self._reset_search() # Reset search after replacement
+                # Perform replacement; the edit hook drops this span, shifts the later ones in place
+                # and re-searches just this line, so the rest of the index survives
+                self._keep_matches_on_edit = self.large_file is not None
+                try:
+                    with self.tracer.phase("widget insert"):
+                        self.text_area.delete(start_index, end_index)
+                        self.text_area.insert(start_index, replace_str)
+                finally:
+                    self._keep_matches_on_edit = False
+                if self.large_file is not None:
+                    self._rekey_large_file_matches(i, selected_text, replace_str)
+                self.text_area.mark_set(tk.INSERT, f"{start_index}+{len(replace_str)}c") # Next step continues after it
+                self._update_status(f"Replaced match {i + 1:,}.")
                 # Log the change
                 log_entry = f"Replaced '{selected_text}' with '{replace_str}' at {start_index}."
-                self._add_history_entry(log_entry)
-                    # Maybe automatically find the next one?
-                    # self.find_next()
-                # else:
-                #      messagebox.showwarning("Replace", "Highlighted text does not match the current pattern.")
-            except re.error as e:
-                 messagebox.showerror("Regex Error", f"Invalid regular expression: {e}")
+                self._add_history_entry(log_entry, RecipeRule(pattern_str, replace_str, self._get_regex_flags()))
             except Exception as e:
                  messagebox.showerror("Error", f"An unexpected error occurred during replace: {e}")
 
         else:
-            # If nothing highlighted, maybe find the next one first?
+            # If nothing selected, maybe find the next one first?
             self._update_status("No match selected. Use 'Find Next' first.")
-            # Or implement replace without prior find (finds and replaces the first match from cursor)
 
-    def replace_all(self):
+    def preview_replace_all(self):
+        self.replace_all(preview=True)
+
+    @_traced("replace_all")
+    def replace_all(self, preview=False):
         pattern_str = self.pattern_entry.get()
         replace_str = self.replace_entry.get()
         if not pattern_str:
             return
 
         try:
-            text_content = self.text_area.get("1.0", tk.END)
             # Compile regex with selected flags
             flags = self._get_regex_flags()
-            regex = re.compile(pattern_str, flags)
-
-            # Use re.sub for replacement
-            new_text_content, num_replacements = regex.subn(replace_str, text_content)
-
-            if num_replacements > 0:
-                # Record current scroll position and cursor position
-                scroll_pos = self.text_area.yview()
-                cursor_pos = self.text_area.index(tk.INSERT)
-
-                # Update text area content
-                self.text_area.delete("1.0", tk.END)
-                self.text_area.insert("1.0", new_text_content)
-
-                # Try to restore scroll and cursor position (might be approximate)
-                self.text_area.yview_moveto(scroll_pos[0])
-                try:
-                    # If the cursor position is still valid
-                    self.text_area.mark_set(tk.INSERT, cursor_pos)
-                except tk.TclError:
-                    # If old cursor position is invalid (e.g., text became shorter)
-                    self.text_area.mark_set(tk.INSERT, "1.0") # Go to beginning
-
-                self._update_status(f"Made {num_replacements} replacements.")
-                self._reset_search() # Reset search state
-                # Log the change
-                log_entry = f"Replaced all occurrences of pattern '{pattern_str}' with '{replace_str}' ({num_replacements} replacements)."
-                self._add_history_entry(log_entry)
-            else:
-                 self._update_status("No matches found to replace.")
+            with self.tracer.phase("compile"):
+                compile_pattern(pattern_str, flags)
+            if not self._confirm_backtracking_risk(pattern_str, flags):
+                return
+            if self.large_file is not None:
+                if preview:
+                    messagebox.showinfo("Replace All Preview", "Preview isn't available in large-file mode.")
+                    return
+                self._start_large_file_replace_all(pattern_str, flags, replace_str)
+                return
+            with self.tracer.phase("snapshot"):
+                text_content = self._text_get("1.0", tk.END)
+            with self.tracer.phase("line index"):
+                self._get_line_index(text_content) # Spans are turned into widget indices with it
+
+            # The worker expands each match's replacement; the edits are applied on completion
+            job = self._start_search_job("replace_all", pattern_str, flags, text_content, self._on_replace_all_done, replacement=replace_str)
+            job.text = text_content
+            job.pattern_str, job.replace_str, job.flags = pattern_str, replace_str, flags
+            job.preview = preview
 
         except re.error as e:
             messagebox.showerror("Regex Error", f"Invalid regular expression: {e}")
         except Exception as e:
              messagebox.showerror("Error", f"An unexpected error occurred during replace all: {e}")
 
+    def _start_large_file_replace_all(self, pattern_str, flags, replace_str):
+        """Stream the replaced document into a scratch file next to the original, then switch to it."""
+        self._commit_large_file_window()
+        source = self.large_file.source()
+        directory = os.path.dirname(os.path.abspath(self.current_file_path or self.large_file.path))
+        fd, source.output_path = tempfile.mkstemp(dir=directory, prefix=".regex_editor-", suffix=".tmp")
+        os.close(fd)
+        job = self._start_search_job("replace_all", pattern_str, flags, source, self._on_large_file_replace_all_done, replacement=replace_str)
+        job.pattern_str, job.replace_str, job.flags = pattern_str, replace_str, flags
+
+    def _on_large_file_replace_all_done(self, job, result):
+        """Rebase the large-file buffer on the rewritten scratch file; Save writes it to the real path."""
+        if not result:
+            os.remove(job.output_path)
+            self._update_status("No matches found to replace.")
+            return
+        self._open_large_file(job.output_path, temporary=True, first_line=self.large_file_window[0])
+        self.tracer.note(replacements=result, chars=job.text_length)
+        self._update_status(f"Made {result} replacements.{self._prefilter_note(job)}")
+        log_entry = f"Replaced all occurrences of pattern '{job.pattern_str}' with '{job.replace_str}' ({result} replacements)."
+        self._add_history_entry(log_entry, RecipeRule(job.pattern_str, job.replace_str, job.flags))
+
+    def _on_replace_all_done(self, job, result):
+        """Apply the replacements computed by a replace_all worker, or show them first when previewing."""
+        if not len(job.spans):
+            self._update_status("No matches found to replace.")
+            return
+        if job.preview:
+            self._show_replace_preview(job)
+            return
+        self._apply_replace_job(job)
+
+    @_traced("replace_all.apply") # Its own operation when applied from the preview; a phase of replace_all otherwise
+    def _apply_replace_job(self, job):
+        """Splice the replacements in as targeted edits, bottom-up, as a single undo step.
+
+        Tags, marks and the scroll position outside the edited spans survive, unlike a full rewrite.
+        """
+        started = time.monotonic()
+        count = len(job.spans)
+        with self.tracer.phase("index mapping"):
+            regions = list(replacement_regions(job.text, job.spans.starts, job.spans.ends, job.replacements, REPLACE_MERGE_GAP))
+            if len(regions) > REPLACE_MAX_EDITS:
+                # Too many edits to send one by one: rewrite the document in bounded chunks instead
+                regions = list(replacement_regions(job.text, job.spans.starts, job.spans.ends, job.replacements))
+        self.tracer.note(replacements=count, edits=len(regions), chars=job.text_length)
+        job.text = None # Release the snapshot
+        line_index = job.line_index
+        call, orig = self.root.tk.call, self._text_tk_cmd
+        autoseparators = self.text_area.cget("autoseparators")
+        self.text_area.edit_separator()
+        self.text_area.configure(autoseparators=False) # Keep every edit in one undo group
+        try:
+            # Bottom-up, so the offsets of earlier spans stay valid in the original line index
+            with self.tracer.phase("widget insert"):
+                for start, end, new_text in reversed(regions):
+                    call(orig, "replace", line_index.to_index(start), line_index.to_index(end), new_text)
+        finally:
+            self.text_area.configure(autoseparators=autoseparators)
+            self.text_area.edit_separator()
+            # The edits bypassed the proxy: invalidate once instead of patching the line index per edit
+            self._buffer_generation += 1
+            self._line_index = None
+            self._reset_search()
+
+        self._update_status(f"Made {count:,} replacements ({len(regions):,} edits, {time.monotonic() - started:.2f}s).{self._prefilter_note(job)}")
+        # Log the change
+        log_entry = f"Replaced all occurrences of pattern '{job.pattern_str}' with '{job.replace_str}' ({count} replacements)."
+        self._add_history_entry(log_entry, RecipeRule(job.pattern_str, job.replace_str, job.flags))
+
+    def _replace_preview_lines(self, job, limit):
+        """Yield (line, old text, new text) for the lines touched by the first limit replacements."""
+        spans, line_index, text = job.spans, job.line_index, job.text
+        count, i = len(spans), 0
+        while i < min(count, limit):
+            first_line = line_index.line_of(spans.starts[i])
+            last_line = line_index.line_of(spans.ends[i])
+            j = i + 1
+            while j < count and line_index.line_of(spans.starts[j]) <= last_line:
+                last_line = max(last_line, line_index.line_of(spans.ends[j]))
+                j += 1
+            lo = line_index.line_start(first_line)
+            hi = max(line_index.line_start(last_line + 1) - 1, lo) # Without the final newline
+            old = text[lo:hi]
+            new = apply_replacements(old, [start - lo for start in spans.starts[i:j]], [end - lo for end in spans.ends[i:j]], job.replacements[i:j])
+            yield first_line, old, new
+            i = j
+
+    def _show_replace_preview(self, job):
+        """List the first replacements as before/after lines; nothing is changed until Apply."""
+        window = tk.Toplevel(self.root)
+        window.title("Replace All Preview")
+        count = len(job.spans)
+        shown = f"; showing the first {REPLACE_PREVIEW_CHANGES:,}" if count > REPLACE_PREVIEW_CHANGES else ""
+        ttk.Label(window, text=f"{count:,} replacements of '{job.pattern_str}' with '{job.replace_str}'{shown}.", padding=10).pack(anchor=tk.W)
+        view = scrolledtext.ScrolledText(window, wrap=tk.NONE, width=100, height=25)
+        view.tag_configure("line", foreground="gray")
+        view.tag_configure("removed", background="#ffdddd")
+        view.tag_configure("added", background="#ddffdd")
+        for line, old, new in self._replace_preview_lines(job, REPLACE_PREVIEW_CHANGES):
+            view.insert(tk.END, f"Line {line + 1:,}:\n", "line")
+            view.insert(tk.END, "- " + old.replace("\n", "\n  ") + "\n", "removed")
+            view.insert(tk.END, "+ " + new.replace("\n", "\n  ") + "\n", "added")
+        view.config(state=tk.DISABLED)
+        view.pack(fill=tk.BOTH, expand=True, padx=10)
+
+        def apply():
+            window.destroy()
+            if job.generation != self._buffer_generation:
+                messagebox.showerror("Replace All Preview", "The text changed since the preview was made; run the preview again.")
+                return
+            self._apply_replace_job(job)
+
+        buttons = ttk.Frame(window, padding=10)
+        buttons.pack(fill=tk.X)
+        ttk.Button(buttons, text="Apply", command=apply).pack(side=tk.RIGHT)
+        ttk.Button(buttons, text="Cancel", command=window.destroy).pack(side=tk.RIGHT, padx=(0, 5))
+        self._update_status(f"Previewing {count:,} replacements.")
+
+    # --- Search Worker Management ---
+    def _start_search_job(self, mode, pattern_str, flags, text_content, on_done, on_batch=None, start=0, replacement=None):
+        """Run a search in a worker process and poll it from the Tk event loop."""
+        self._cancel_search_job()
+        if self._can_scan_in_parallel(pattern_str, flags, text_content, start, replacement):
+            job = ParallelSearchJob(mode, pattern_str, flags, text_content, replacement, self.large_file)
+            self.tracer.note(parallel_blocks=len(job.futures))
+        else:
+            job = SearchJob(mode, pattern_str, flags, text_content, start=start, replacement=replacement)
+        job.on_done, job.on_batch = on_done, on_batch
+        job.line_index = self._line_index
+        job.generation = self._buffer_generation
+        job.first_match_shown = False
+        job.quiet = False # Background rescans don't announce cancellation
+        job.trace = self.tracer.defer() # The traced operation that started the job finishes with it
+        self.search_job = job
+        self.cancel_button.config(state=tk.NORMAL)
+        self._update_status("Searching...")
+        self._search_poll_id = self.root.after(SEARCH_POLL_MS, self._poll_search_job)
+        return job
+
+    def _can_scan_in_parallel(self, pattern_str, flags, text_content, start, replacement):
+        """True if a scan can be split into blocks of lines across cores: a big text, more than one core, and a
+        pattern whose matches stay within a line. Anything else runs in a single worker."""
+        if start or (os.cpu_count() or 1) < 2:
+            return False
+        if isinstance(text_content, LargeFileSource):
+            # Blocks need the finished line index to number their lines; a large-file Replace All streams into one scratch file
+            if replacement is not None or not text_content.unedited or not self.large_file.index_done:
+                return False
+            size = text_content.size
+        else:
+            size = len(text_content)
+        return size >= PARALLEL_MIN_CHARS and chunkable_pattern(pattern_str, flags)
+
+    def _poll_search_job(self):
+        """Drain worker messages, enforce the time budget and report progress."""
+        self._search_poll_id = None
+        job = self.search_job
+        if job is None:
+            return
+        if job.generation != self._buffer_generation:
+            self._cancel_search_job(None if job.quiet else "Search cancelled: the text was edited.")
+            return
+
+        got_batch = False
+        try:
+            for message in job.receive():
+                if message[0] == "batch":
+                    got_batch = True
+                elif message[0] == "done":
+                    self._finish_search_job()
+                    with self.tracer.resume(job.trace):
+                        if got_batch and job.on_batch:
+                            job.on_batch(job)
+                        job.on_done(job, message[1])
+                    self.tracer.finish(job.trace)
+                    return
+                elif message[0] == "error":
+                    self._finish_search_job()
+                    self.tracer.finish(job.trace, error=message[2])
+                    self._clear_match_spans()
+                    self.text_area.tag_remove("highlight", "1.0", tk.END)
+                    _, kind, error_text = message
+                    if kind == "regex":
+                        messagebox.showerror("Regex Error", f"Invalid regular expression: {error_text}")
+                    else:
+                        messagebox.showerror("Error", f"An unexpected error occurred during search: {error_text}")
+                    return
+        except (EOFError, OSError):
+            self._finish_search_job()
+            self._update_status("Search failed: the worker process exited unexpectedly.")
+            self.tracer.finish(job.trace, error="worker exited")
+            return
+
+        if got_batch and job.on_batch:
+            with self.tracer.resume(job.trace):
+                job.on_batch(job)
+
+        elapsed = job.elapsed()
+        if job.streaming and time.monotonic() - job.last_progress > self.search_time_budget:
+            # A whole large file can legitimately take longer than the budget; a stuck chunk can't
+            self._cancel_search_job(f"Search cancelled: pattern made no progress for {self.search_time_budget:g}s.")
+            return
+        if not job.streaming and elapsed > self.search_time_budget:
+            self._cancel_search_job(f"Search cancelled: pattern exceeded the {self.search_time_budget:g}s time budget.")
+            return
+        self._update_status(f"Searching... {job.progress():.0%} - {len(job.spans):,} matches ({elapsed:.1f}s)")
+        self._search_poll_id = self.root.after(SEARCH_POLL_MS, self._poll_search_job)
+
+    def _finish_search_job(self):
+        """Tear down the current job's worker and polling."""
+        job, self.search_job = self.search_job, None
+        if job is not None:
+            job.cancel()
+        if self._search_poll_id is not None:
+            self.root.after_cancel(self._search_poll_id)
+            self._search_poll_id = None
+        self.cancel_button.config(state=tk.DISABLED)
+
+    def _cancel_search_job(self, message=None):
+        """Kill a running search (Cancel button, time budget, or superseded by a new search)."""
+        job = self.search_job
+        if job is None:
+            return
+        was_streaming = job.spans is self.match_spans
+        self._finish_search_job()
+        if was_streaming:
+            self._clear_match_spans()
+            self.text_area.tag_remove("highlight", "1.0", tk.END)
+            self.text_area.tag_remove("live_highlight", "1.0", tk.END)
+        if message:
+            self._update_status(message)
+        self.tracer.finish(job.trace, cancelled=message or "superseded")
+
+    def set_search_time_budget(self):
+        """Ask for the number of seconds a search may run before it is killed."""
+        budget = simpledialog.askfloat("Search Time Budget", "Seconds a search may run before it is cancelled:",
+                                       initialvalue=self.search_time_budget, minvalue=0.1, parent=self.root)
+        if budget:
+            self.search_time_budget = budget
+
+    def search_in_files(self):
+        """Open (or raise) the Search in Files window."""
+        if self.search_in_files_window is None:
+            self.search_in_files_window = SearchInFilesWindow(self)
+        else:
+            self.search_in_files_window.window.lift()
+
+    def manage_recipes(self):
+        """Open (or raise) the Recipes window."""
+        if self.recipes_window is None:
+            self.recipes_window = RecipesWindow(self)
+        else:
+            self.recipes_window.window.lift()
+
+    def _apply_recipe_result(self, name, rules, counts, passes, new_text, output_path):
+        """Install a recipe's output: one undoable edit in memory, or the rewritten scratch file in large-file mode."""
+        if output_path is not None:
+            self._open_large_file(output_path, temporary=True, first_line=self.large_file_window[0])
+        else:
+            view, insert = self.text_area.yview()[0], self.text_area.index(tk.INSERT)
+            autoseparators = self.text_area.cget("autoseparators")
+            self.text_area.edit_separator()
+            self.text_area.configure(autoseparators=False) # One undo step
+            try:
+                self.root.tk.call(self._text_tk_cmd, "replace", "1.0", "end-1c", new_text)
+            finally:
+                self.text_area.configure(autoseparators=autoseparators)
+                self.text_area.edit_separator()
+                # The edit bypassed the proxy, like Replace All's
+                self._buffer_generation += 1
+                self._line_index = None
+                self._reset_search()
+            self.text_area.yview_moveto(view)
+            self.text_area.mark_set(tk.INSERT, insert)
+        total = sum(counts)
+        used = sum(1 for count in counts if count)
+        self._update_status(f"Recipe '{name}': {total:,} replacements by {used} of {len(rules)} rules in {passes} passes.")
+        self._add_history_entry(f"Ran recipe '{name}' ({len(rules)} rules, {total} replacements).")
+
+    def extract_matches(self):
+        """Open (or raise) the Extract window for the current pattern."""
+        if self.extract_window is None:
+            self.extract_window = ExtractWindow(self)
+        else:
+            self.extract_window.window.lift()
+            self.extract_window.pattern_entry.delete(0, tk.END)
+            self.extract_window.pattern_entry.insert(0, self.pattern_entry.get())
+            self.extract_window._refresh_groups()
+
+    def analyze_pattern(self):
+        """Open (or raise) the pattern analyzer, profiling the current pattern."""
+        if self.analyzer_window is None:
+            self.analyzer_window = PatternAnalyzerWindow(self)
+        else:
+            self.analyzer_window.window.lift()
+            self.analyzer_window.pattern_entry.delete(0, tk.END)
+            self.analyzer_window.pattern_entry.insert(0, self.pattern_entry.get())
+        self.analyzer_window.analyze()
+
+    def _confirm_backtracking_risk(self, pattern_str, flags):
+        """Warn before running a pattern that can backtrack catastrophically; False if the user backs out."""
+        if (pattern_str, flags) in self._accepted_risks:
+            return True
+        chars = self.text_area.count("1.0", tk.END, "chars") or 0
+        chars = chars[0] if isinstance(chars, tuple) else chars # A tuple before Python 3.13
+        large = self.large_file is not None or chars >= RISK_WARN_CHARS
+        risks = [risk for risk in backtracking_risks(pattern_str, flags) if risk.severity == "exponential" or large]
+        if not risks:
+            return True
+        details = "\n".join(f"- {risk.description} ({risk.severity})" for risk in risks)
+        if not messagebox.askyesno("Backtracking Risk", f"This pattern may run very slowly on some inputs:\n\n{details}\n\n"
+                                   f"Search > Analyze Pattern... can profile it. Run it anyway?"):
+            self._update_status("Search not started: the pattern may backtrack catastrophically.")
+            return False
+        self._accepted_risks.add((pattern_str, flags))
+        return True
+
+    # --- Large-File Mode ---
+    @_traced("open_file")
+    def _open_large_file(self, path, temporary=False, first_line=0):
+        """Map path and show it a window at a time; temporary marks scratch output that replaces the current file."""
+        self._complete_save()
+        self._cancel_search_job()
+        self._close_large_file()
+        self._reset_search()
+        with self.tracer.phase("map"):
+            self.large_file = LargeFileBuffer(path, temporary)
+        self.tracer.note(bytes=self.large_file.size, large_file=True)
+        self._saved_generation = -1 if temporary else self._buffer_generation # Scratch output is an unsaved change
+        self._autosave_file = None
+        self.large_file_window = (0, 0)
+        self._window_is_tail = False
+        with self.tracer.phase("widget insert"):
+            self._load_large_file_window(first_line, first_line)
+        if not temporary:
+            self.current_file_path = path
+            self.root.title(f"Regex Editor - {os.path.basename(path)} (large file)")
+        self.root.after(LARGE_FILE_INDEX_POLL_MS, self._poll_large_file_index, self.large_file)
+
+    def _close_large_file(self):
+        if self.large_file is not None:
+            if self._window_retry_id is not None:
+                self.root.after_cancel(self._window_retry_id)
+                self._window_retry_id = None
+            self.large_file.close()
+            self.large_file = None
+
+    def _poll_large_file_index(self, buffer):
+        """Report background indexing progress until the whole file is indexed."""
+        if buffer is not self.large_file:
+            return
+        if not buffer.index_done:
+            if self.search_job is None:
+                self._update_status(f"Indexing lines... {buffer.indexed_to / buffer.size:.0%}")
+            self.root.after(LARGE_FILE_INDEX_POLL_MS, self._poll_large_file_index, buffer)
+            return
+        if self.search_job is None:
+            self._update_status(f"Indexed {buffer.line_count()[0]:,} lines.")
+
+    def _load_large_file_window(self, first_line, top_line=None):
+        """Load logical lines from first_line into the text widget; returns False (and retries) if they aren't indexed yet."""
+        if self._window_retry_id is not None:
+            self.root.after_cancel(self._window_retry_id)
+            self._window_retry_id = None
+        self._commit_large_file_window()
+        buffer = self.large_file
+        result = buffer.read_lines(first_line, first_line + LARGE_FILE_WINDOW_LINES)
+        if result is None:
+            self._update_status(f"Waiting for the line index to reach line {first_line + 1:,}...")
+            self._window_retry_id = self.root.after(LARGE_FILE_INDEX_POLL_MS, self._load_large_file_window, first_line, top_line)
+            return False
+        text, last_line = result
+        total, exact = buffer.line_count()
+
+        self._loading_window = True
+        try:
+            self.text_area.delete("1.0", tk.END)
+            self.text_area.insert("1.0", text)
+        finally:
+            self._loading_window = False
+        self.text_area.edit_reset() # Undo doesn't reach across windows
+        self.text_area.edit_modified(False)
+        self.large_file_window = (first_line, last_line)
+        self._window_is_tail = exact and last_line >= total
+        self._get_line_index(self._text_get("1.0", tk.END))
+        if top_line is not None:
+            self.text_area.yview(f"{top_line - first_line + 1}.0")
+        self._highlighted_window = None
+        self._refresh_visible_highlights()
+        if self.search_job is None:
+            self._update_status(f"Lines {first_line + 1:,}-{last_line:,} of {total:,}{'' if exact else '+'}")
+        return True
+
+    def _commit_large_file_window(self):
+        """Fold edits made in the text widget back into the large file's piece table."""
+        if self.large_file is None or not self.text_area.edit_modified():
+            return
+        first_line, last_line = self.large_file_window
+        text = self._text_get("1.0", "end-1c")
+        self.large_file.replace_lines(first_line, last_line, text)
+        self.text_area.edit_modified(False)
+        if text.endswith("\n") or self._window_is_tail:
+            self.large_file_window = (first_line, first_line + text.count("\n") + (1 if self._window_is_tail else 0))
+        else:
+            # The window's last newline was deleted, joining it to the next line; reload to show that line whole
+            self._load_large_file_window(first_line, first_line + int(self.text_area.index("@0,0").split(".")[0]) - 1)
+
+    def _shift_large_file_window(self):
+        """Re-center the window on the viewport after scrolling near one of its edges."""
+        self._window_shift_pending = False
+        if self.large_file is None:
+            return
+        window_first, window_last = self.large_file_window
+        top_line = window_first + int(self.text_area.index("@0,0").split(".")[0]) - 1
+        first_line = max(0, top_line - LARGE_FILE_WINDOW_LINES // 2)
+        # A window cut short by indexing grows once more lines are indexed
+        lines, exact = self.large_file.line_count()
+        grows = not self._window_is_tail and window_last - window_first < LARGE_FILE_WINDOW_LINES and (exact or lines - 1 > window_last)
+        if first_line != window_first or grows:
+            self._load_large_file_window(first_line, top_line)
+
+    def _show_large_file_line(self, line):
+        """Make sure logical line is inside the loaded window, paging if needed."""
+        first_line, last_line = self.large_file_window
+        if first_line <= line < last_line:
+            return True
+        return self._load_large_file_window(max(0, line - LARGE_FILE_WINDOW_LINES // 4), line)
+
+    def _on_large_file_edited(self):
+        """Large-file mode doesn't re-search after edits: the result set is dropped unless Replace re-keyed it."""
+        if self.current_match_start is not None:
+            self.current_match_start = None
+            self.text_area.tag_remove("current_match", "1.0", tk.END)
+        if self._keep_matches_on_edit or (self.match_spans is None and self.search_job is None):
+            return
+        self._cancel_search_job()
+        self._reset_search()
+        self._update_status("Text edited: matches cleared. Run Find again to refresh them.")
+
+    def _rekey_large_file_matches(self, i, replaced_text, replace_str):
+        """Shift the (line, column) keys after match i once Replace has swapped its text."""
+        spans = self.match_spans
+        if "\n" in replaced_text or "\n" in replace_str:
+            self._reset_search() # Every later line number moved; searching again is simpler than re-keying
+            return
+        start = spans.starts[i]
+        spans.apply_edit(start, len(replaced_text), len(replace_str), shift_until=position_key(key_line(start) + 1, 0))
+        self._highlighted_window = None
+        self._refresh_visible_highlights()
+
+    def _reopen_saved_large_file(self, path):
+        """After a save, reopen path so the buffer maps the saved file instead of the old one."""
+        top_line = self.large_file_window[0] + int(self.text_area.index("@0,0").split(".")[0]) - 1
+        # The saved file has the same lines, so a finished result set stays valid
+        matches = (self.match_spans, self.match_pattern) if self.search_job is None else (None, None)
+        self._open_large_file(path, first_line=self.large_file_window[0])
+        self.match_spans, self.match_pattern = matches
+        self.text_area.yview(f"{top_line - self.large_file_window[0] + 1}.0")
+        self._highlighted_window = None
+        self._refresh_visible_highlights()
+
+    def go_to_line(self):
+        """Jump to a line number; in large-file mode this pages the window there."""
+        if self.large_file is not None:
+            total, exact = self.large_file.line_count()
+        else:
+            total, exact = int(self.text_area.index("end-1c").split(".")[0]), True
+        number = simpledialog.askinteger("Go to Line", f"Line number (1-{total:,}{'' if exact else '+'}):", minvalue=1, parent=self.root)
+        if number:
+            self._show_line(number - 1)
+
+    @_traced("ask_ai_assistant")
     def ask_ai_assistant(self):
         """Handle the 'Ask AI' button click."""
         api_key = self.api_key_entry.get()
@@ -408,7 +3631,7 @@ class RegexEditor:
         # model_name = "google/gemini-flash-1.5" # Or let user choose?
         # No longer need this variable here
         # api_endpoint = "https://openrouter.ai/api/v1/chat/completions"
-        model_name = "google/gemini-flash-1.5" # Example: Choose a suitable model!
+        model_name = AI_MODEL # Example: Choose a suitable model!
 
         # Construct a more general prompt
         prompt = (
@@ -418,79 +3641,157 @@ class RegexEditor:
             f"Response:"
         )
 
-        data = {
-            "model": model_name,
-            "messages": [
-                {"role": "user", "content": prompt}
-            ],
-            "max_tokens": 500, # Increased max_tokens for potentially longer answers/code
-            "temperature": 0.5, # Slightly higher temp for more varied answers
-        }
+        messages = [
+            {"role": "user", "content": prompt}
+        ]
+        max_tokens = 500 # Increased max_tokens for potentially longer answers/code
+        temperature = 0.5 # Slightly higher temp for more varied answers
+
+        # Answer repeated questions from the cache without touching the network
+        cache_key = AIResponseCache.make_key(model_name, prompt, temperature, max_tokens)
+        cached = self.ai_cache.get(cache_key) if self.ai_use_cache_var.get() else None
+        self.tracer.note(cached=bool(cached))
+        if cached:
+            ai_response, latency = cached
+            self._cancel_ai_request()
+            self.ai_response_output.config(state=tk.NORMAL)
+            self.ai_response_output.delete("1.0", tk.END)
+            self.ai_response_output.insert("1.0", ai_response)
+            self._update_status(f"AI response from cache (hit, saved ~{latency:.1f}s).")
+            return
+
+        try:
+            timeout = float(self.ai_timeout_var.get())
+        except (tk.TclError, ValueError):
+            timeout = AI_TIMEOUT
+        try:
+            client = self._get_ai_client(api_key)
+        except ImportError as e:
+            self._display_ai_error(f"The AI assistant needs the openai package (pip install openai): {e}")
+            return
 
-        # Update UI before API call
+        # Update UI; the request streams in from a background thread so the editor stays usable
+        self._cancel_ai_request()
         self.ask_ai_button.config(state=tk.DISABLED)
+        self.cancel_ai_button.config(state=tk.NORMAL)
         self.ai_response_output.config(state=tk.NORMAL)
         self.ai_response_output.delete("1.0", tk.END)
         self.ai_response_output.insert("1.0", "Asking AI...")
         self.ai_response_output.config(state=tk.DISABLED)
-        self.root.update_idletasks()
 
-        try:
-            client = OpenAI(
-                base_url="https://openrouter.ai/api/v1", # CORRECT BASE URL
-                api_key=api_key, # Use the entered key
-            )
-
-            completion = client.chat.completions.create(
-                extra_headers={ # Optional headers
-                    # "HTTP-Referer": "YOUR_SITE_URL",
-                    # "X-Title": "YOUR_SITE_NAME",
-                },
-                model=model_name,
-                messages=data["messages"],
-                max_tokens=data["max_tokens"],
-                temperature=data["temperature"]
-            )
-
-            ai_response = completion.choices[0].message.content.strip()
+        request = AIRequest(client, model_name, messages, max_tokens, temperature, timeout)
+        request.api_key, request.cache_key = api_key, cache_key
+        request.trace = self.tracer.defer()
+        self.ai_request = request
+        request.start()
+        self._ai_poll_id = self.root.after(AI_POLL_MS, self._poll_ai_request)
+
+    def show_ai_candidates(self):
+        """Open (or raise) the window that generates and ranks several AI patterns."""
+        if self.candidates_window is None:
+            self.candidates_window = CandidatesWindow(self)
+        else:
+            self.candidates_window.window.lift()
+
+    def _get_ai_client(self, api_key):
+        """Return the long-lived client for this key and base URL (its HTTP connection pool is reused across requests)."""
+        key = (self.ai_base_url, api_key)
+        client = self._ai_clients.get(key)
+        if client is None:
+            client = _openai().OpenAI(base_url=self.ai_base_url, api_key=api_key)
+            self._ai_clients[key] = client
+        return client
+
+    def _poll_ai_request(self):
+        """Move streamed tokens into the response pane and handle completion, errors and the timeout."""
+        self._ai_poll_id = None
+        request = self.ai_request
+        if request is None:
+            return
+        chunks, final = [], None
+        while final is None:
+            try:
+                message = request.output.get_nowait()
+            except queue.Empty:
+                break
+            if message[0] == "text":
+                chunks.append(message[1])
+            else:
+                final = message
 
-            # Display response in the ScrolledText widget
+        if chunks:
+            text = "".join(chunks)
             self.ai_response_output.config(state=tk.NORMAL)
-            self.ai_response_output.delete("1.0", tk.END)
-            if ai_response:
-                self.ai_response_output.insert("1.0", ai_response)
+            if not request.text:
+                self.ai_response_output.delete("1.0", tk.END) # Drop the "Asking AI..." placeholder
+            if not request.text.strip():
+                text = text.lstrip() # No leading blank lines, as with the old .strip()
+            request.text += "".join(chunks)
+            with self.tracer.resume(request.trace), self.tracer.phase("widget insert"):
+                self.ai_response_output.insert(tk.END, text)
+                self.ai_response_output.see(tk.END)
+
+        if final is not None:
+            self._finish_ai_request()
+            self._finish_ai_trace(request, None if final[0] == "done" else final[2])
+            if final[0] == "done":
+                ai_response = request.text.strip()
+                # Display the tidied response; leave it enabled for copying
+                self.ai_response_output.config(state=tk.NORMAL)
+                self.ai_response_output.delete("1.0", tk.END)
+                self.ai_response_output.insert("1.0", ai_response if ai_response else "AI returned an empty response.")
+                latency = time.monotonic() - request.started
+                if ai_response:
+                    self.ai_cache.put(request.cache_key, ai_response, latency)
+                self._update_status(f"AI response received in {latency:.1f}s (cache miss).")
+                # --- Save API key on successful call ---
+                self._save_api_key(request.api_key)
             else:
-                self.ai_response_output.insert("1.0", "AI returned an empty response.")
-            # Leave it enabled for copying, or disable again?
-            # self.ai_response_output.config(state=tk.DISABLED)
-
-        except AuthenticationError as e:
-            error_message = f"API Authentication Error: Invalid API Key or insufficient permissions. {e}"
-            messagebox.showerror("AI Error", error_message)
-            self._display_ai_error(error_message)
-        except APIConnectionError as e:
-            error_message = f"API Connection Error: Failed to connect to OpenRouter API. {e}"
-            messagebox.showerror("AI Error", error_message)
-            self._display_ai_error(error_message)
-        except RateLimitError as e:
-            error_message = f"API Rate Limit Error: Rate limit exceeded. {e}"
-            messagebox.showerror("AI Error", error_message)
-            self._display_ai_error(error_message)
-        except APIError as e:
-            error_message = f"OpenRouter API Error: {e}"
-            messagebox.showerror("AI Error", error_message)
-            self._display_ai_error(error_message)
-        except Exception as e:
-            error_message = f"An unexpected error occurred: {e}"
-            messagebox.showerror("Error", error_message)
-            self._display_ai_error(error_message)
-        finally:
-            self.ask_ai_button.config(state=tk.NORMAL)
+                _, title, error_message = final
+                messagebox.showerror(title, error_message)
+                self._display_ai_error(error_message)
+            return
 
-        # --- Save API key on successful call ---
-        # If the call was successful (no exception before this point), save the key
-        if 'completion' in locals() and completion: # Check if completion was successful
-             self._save_api_key(api_key)
+        elapsed = time.monotonic() - request.started
+        if elapsed > request.timeout:
+            self._cancel_ai_request(f"AI request timed out after {request.timeout:g}s.")
+            return
+        self._update_status(f"Waiting for AI... ({elapsed:.0f}s)")
+        self._ai_poll_id = self.root.after(AI_POLL_MS, self._poll_ai_request)
+
+    def _finish_ai_request(self):
+        """Detach the current AI request and restore the buttons."""
+        self.ai_request = None
+        if self._ai_poll_id is not None:
+            self.root.after_cancel(self._ai_poll_id)
+            self._ai_poll_id = None
+        self.ask_ai_button.config(state=tk.NORMAL)
+        self.cancel_ai_button.config(state=tk.DISABLED)
+
+    def _finish_ai_trace(self, request, error=None):
+        """Add the network phases measured by the request's thread to its trace and close it."""
+        trace = request.trace
+        if trace is None:
+            return
+        if request.sent_at is not None:
+            answered_at = request.first_token_at or request.finished_at or time.perf_counter()
+            trace.add("network", request.sent_at, answered_at - request.sent_at, "network")
+            if request.first_token_at is not None:
+                trace.add("streaming", request.first_token_at, (request.finished_at or time.perf_counter()) - request.first_token_at, "network")
+        self.tracer.finish(trace, model=request.model, response_chars=len(request.text), **({"error": error} if error else {}))
+
+    def _cancel_ai_request(self, message=None):
+        """Abandon the running AI request; its thread stops at the next streamed chunk."""
+        request = self.ai_request
+        if request is None:
+            return
+        request.cancelled.set()
+        self._finish_ai_request()
+        self._finish_ai_trace(request, message or "cancelled")
+        if message:
+            self._update_status(message)
+            if not request.text:
+                self._display_ai_error(message)
 
     def _display_ai_error(self, error_message):
         """Helper to display errors in the AI output area."""
@@ -510,6 +3811,7 @@ class RegexEditor:
             self.ai_sidebar_visible = False
         else:
             # Show sidebar and set sash position
+            self._ensure_ai_sidebar()
             self.paned_window.add(self.ai_sidebar_frame)
             # Wait for window layout to update
             self.root.update_idletasks()
@@ -527,31 +3829,69 @@ class RegexEditor:
             self.ai_sidebar_visible = True
 
     # --- API Key Persistence ---
-    def _load_api_key(self):
-        """Load API key from the config file."""
+    def _load_config(self):
+        """Return the config file's contents, or {} if it is missing or unreadable."""
         try:
             if os.path.exists(CONFIG_FILE):
                 with open(CONFIG_FILE, 'r') as f:
-                    config_data = json.load(f)
-                    api_key = config_data.get('api_key')
-                    if api_key:
-                        self.api_key_entry.delete(0, tk.END)
-                        self.api_key_entry.insert(0, api_key)
+                    return json.load(f)
         except (IOError, json.JSONDecodeError) as e:
-            print(f"Warning: Could not load API key from {CONFIG_FILE}. Error: {e}") # Log warning instead of showing popup
+            print(f"Warning: Could not load config from {CONFIG_FILE}. Error: {e}") # Log warning instead of showing popup
+        return {}
+
+    def _load_api_key(self):
+        """Load API key (and the AI base URL) from the config file."""
+        config_data = self._load_config()
+        api_key = config_data.get('api_key')
+        if api_key:
+            self.api_key_entry.delete(0, tk.END)
+            self.api_key_entry.insert(0, api_key)
+        # Point at any OpenAI-compatible server, e.g. a local stand-in for testing
+        self.ai_base_url = os.environ.get("REGEX_EDITOR_AI_BASE_URL") or config_data.get('base_url') or AI_BASE_URL
 
     def _save_api_key(self, api_key):
         """Save API key to the config file."""
         try:
             # Ensure the config directory exists
             os.makedirs(CONFIG_DIR, exist_ok=True)
-            config_data = {'api_key': api_key}
+            config_data = self._load_config() # Keep other settings
+            config_data['api_key'] = api_key
             with open(CONFIG_FILE, 'w') as f:
                 json.dump(config_data, f, indent=4)
         except IOError as e:
             # Don't bother the user with a popup for save errors unless critical
             print(f"Warning: Could not save API key to {CONFIG_FILE}. Error: {e}")
 
+    # --- Timing Traces ---
+    def _on_trace_toggled(self):
+        self.tracer.enabled = self.trace_var.get()
+        self._update_status("Recording operation timings." if self.tracer.enabled else "Stopped recording timings.")
+
+    def _on_operation_traced(self, operation):
+        """Show a finished operation's phase timings after the status message it left."""
+        message = self.status_var.get()
+        if message == self._timed_status[1]:
+            message = self._timed_status[0] # Unchanged since the last timings were added: replace them
+        timed = f"{message} [{operation.name}: {operation.summary()}]"
+        self._timed_status = (message, timed)
+        self._update_status(timed)
+
+    def export_trace(self):
+        """Save the recorded timings as a Chrome trace (open it in chrome://tracing or Perfetto)."""
+        if not self.tracer.operations:
+            self._update_status("No timings recorded yet. Turn on View > Record Timings first." if not self.tracer.enabled else "No operations recorded yet.")
+            return
+        filepath = filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("Trace Files", "*.json"), ("All Files", "*.*")],
+                                                initialfile="regex_editor_trace.json")
+        if not filepath:
+            return
+        try:
+            self.tracer.export(filepath)
+        except OSError as e:
+            messagebox.showerror("Export Trace", f"Could not write the trace: {e}")
+            return
+        self._update_status(f"Exported {len(self.tracer.operations)} operations to {os.path.basename(filepath)}.")
+
     # --- Status Update Method ---
     def _update_status(self, message):
         """Update the status bar text."""
@@ -561,19 +3901,14 @@ class RegexEditor:
 
     def _get_regex_flags(self):
         """Build the regex flags based on checkbox states."""
-        flags = 0
-        if self.ignore_case_var.get():
-            flags |= re.IGNORECASE
-        if self.multiline_var.get():
-            flags |= re.MULTILINE
-        if self.dotall_var.get():
-            flags |= re.DOTALL
-        return flags
+        return regex_flags(self.ignore_case_var.get(), self.multiline_var.get(), self.dotall_var.get())
 
     # --- History Log Method ---
-    def _add_history_entry(self, entry_text):
-        """Add an entry to the history list and the history text area."""
+    def _add_history_entry(self, entry_text, rule=None):
+        """Add an entry to the history list and the history text area; rule is the replacement it records, if any."""
         self.history_log.append(entry_text)
+        if rule is not None:
+            self.history_rules.append((entry_text, rule))
         try:
             self.history_text_area.config(state=tk.NORMAL)
             # Add entry with a newline
@@ -584,10 +3919,37 @@ class RegexEditor:
         except Exception as e:
             print(f"Error updating history widget: {e}") # Log error
 
+def _report_startup_time(root, marks):
+    """--startup-time: once the event loop is idle and the window drawn, print how long each startup step took and quit."""
+    root.update()
+    marks.append(("first paint", time.perf_counter()))
+    previous = _MODULE_STARTED
+    for step, moment in marks:
+        print(f"{step:12} {(moment - previous) * 1000:8.1f} ms")
+        previous = moment
+    print(f"{'total':12} {(previous - _MODULE_STARTED) * 1000:8.1f} ms (openai {'imported' if 'openai' in sys.modules else 'not imported'})")
+    root.destroy()
+
 if __name__ == "__main__":
+    multiprocessing.freeze_support() # Search workers in PyInstaller builds
+    parser = argparse.ArgumentParser(prog="regex_editor.py", description="Text editor with regex find/replace and an AI assistant.")
+    parser.add_argument("file", nargs="?", help="file to open")
+    parser.add_argument("--startup-time", action="store_true", help="print how long each startup step takes, then exit")
+    args, _ = parser.parse_known_args() # Some launchers add arguments of their own (e.g. -psn_* on macOS)
+    startup_marks = [("imports", time.perf_counter())]
     root = tk.Tk()
     # Set the default font size
     default_font = tkFont.nametofont("TkDefaultFont")
     default_font.configure(size=15)
     app = RegexEditor(root)
-    root.mainloop() 
\ No newline at end of file
+    startup_marks.append(("window", time.perf_counter()))
+    if args.file:
+        app._load_file(args.file)
+        startup_marks.append(("open file", time.perf_counter()))
+    if args.startup_time:
+        root.after_idle(_report_startup_time, root, startup_marks)
+    root.mainloop()
+    app._complete_save() # File > Exit leaves the widgets alive, so a running save can still finish
+    if os.environ.get(TRACE_ENV):
+        app.tracer.export(os.environ[TRACE_ENV])
+    app._close_large_file() # Drops the mapping and any scratch file left by a large-file Replace All 
\ No newline at end of file
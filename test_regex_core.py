@@ -0,0 +1,409 @@
+"""Tests of regex_core's primitives, checked against plain re.finditer / re.sub wherever they can be."""
+import io
+import json
+import os
+import random
+import re
+from array import array
+
+import pytest
+
+from regex_core import (BackgroundWriter, GroupCounter, Histogram, LineIndex, LiteralPrefilter, RecipeRule, RowWriter, SpanIndex, Tracer,
+                        apply_recipe, apply_replacements, backtracking_risks, byte_match_positions, chunkable_pattern,
+                        compile_bytes_pattern, extract, extract_columns, iter_project_files, line_chunk_bounds, load_recipes,
+                        match_batches, merge_dirty_range, merge_prefilter_counts, pattern_newline_reach, plan_recipe, plan_rescan,
+                        position_key, profile_pattern, read_chunks, replace_in_file, replacement_regions, save_recipes, search_file,
+                        splice_rescan, split_globs, stream_recipe, stream_replace, stream_scan)
+
+WORDS = ["ERROR", "error", "warn", "id=42", "x", "", " ", "wörld", "a-b", "\t", "123", "ERROR42"]
+
+def random_text(rng, lines=300):
+    return "\n".join(" ".join(rng.choice(WORDS) for _ in range(rng.randint(0, 6))) for _ in range(lines)) + "\n"
+
+def spans(regex, text):
+    return [match.span() for match in regex.finditer(text)]
+
+PATTERNS = [
+    (r"ERROR", 0), (r"\bERROR\b", 0), (r"\w+ERROR", 0), (r"(\w+)=(\d+)", 0), (r"^\w+$", re.M), (r"x\s+x", 0),
+    (r"\d*", 0), (r"error", re.I), (r"(?<=-)b", 0), (r"warn\n", 0), (r"$", re.M), (r"ERROR.*", re.S),
+]
+
+@pytest.mark.parametrize("pattern,flags", PATTERNS)
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 4096])
+def test_stream_scan_matches_finditer(pattern, flags, chunk_size):
+    text = random_text(random.Random(chunk_size))
+    regex = re.compile(pattern, flags)
+    chunks = read_chunks(io.StringIO(text), chunk_size)
+    found, pieces = [], []
+    for gap, match, offset, line, column in stream_scan(chunks, regex, margin=256):
+        pieces.append(gap)
+        if match is not None:
+            found.append((offset, offset + len(match.group())))
+            assert (line, column) == (text.count("\n", 0, offset), offset - text.rfind("\n", 0, offset) - 1)
+            pieces.append(match.group())
+    assert found == spans(regex, text)
+    assert "".join(pieces) == text
+
+@pytest.mark.parametrize("pattern,flags", PATTERNS)
+def test_stream_replace_matches_sub(pattern, flags):
+    text = random_text(random.Random(1))
+    regex = re.compile(pattern, flags)
+    replacement = r"<\g<0>>"
+    out = []
+    count = stream_replace(read_chunks(io.StringIO(text), 50), regex, replacement, out.append, margin=256)
+    assert ("".join(out), count) == regex.subn(replacement, text)
+
+def test_apply_replacements_matches_sub():
+    text = random_text(random.Random(3))
+    regex = re.compile(r"(\w+)=(\d+)")
+    matches = list(regex.finditer(text))
+    replaced = apply_replacements(text, [match.start() for match in matches], [match.end() for match in matches],
+                                  [match.expand(r"\2=\1") for match in matches])
+    assert replaced == regex.sub(r"\2=\1", text)
+
+def test_line_index_patch_matches_rebuild():
+    rng = random.Random(4)
+    text = random_text(rng, lines=50)
+    index = LineIndex(text)
+    for _ in range(300):
+        offset = rng.randint(0, len(text))
+        removed = rng.randint(0, min(20, len(text) - offset))
+        inserted = rng.choice(["", "x", "\n", "a\nb\n", "\n\n", "wörld"])
+        text = text[:offset] + inserted + text[offset + removed:]
+        index.patch(offset, removed, inserted)
+        fresh = LineIndex(text)
+        assert index.line_starts == fresh.line_starts and index.length == fresh.length
+    assert all(index.to_offset(index.to_index(offset)) == offset for offset in range(len(text)))
+
+def test_span_index_apply_edit_keeps_untouched_spans():
+    rng = random.Random(5)
+    text = random_text(rng, lines=80)
+    regex = re.compile(r"\w+")
+    for _ in range(200):
+        index = SpanIndex()
+        index.extend(*map(list, zip(*spans(regex, text))))
+        offset = rng.randint(0, len(text))
+        removed = rng.randint(0, min(10, len(text) - offset))
+        inserted = rng.choice(["", "zz", " ", "\n"])
+        dropped = index.apply_edit(offset, removed, len(inserted))
+        text = text[:offset] + inserted + text[offset + removed:]
+        expected = set(spans(regex, text))
+        kept = list(zip(index.starts, index.ends))
+        assert kept == sorted(kept)
+        # Every span still listed is a real match; every real match missing touches the range the editor re-searches
+        assert set(kept) <= expected
+        lo, hi = offset, offset + len(inserted)
+        if dropped:
+            lo, hi = min(lo, dropped[0]), max(hi, dropped[1])
+        for start, end in expected - set(kept):
+            assert start <= hi and end >= lo
+
+def scan_region(regex, text, start):
+    """What the search worker sends back for a Find All from start: (starts, ends)."""
+    starts, ends = [], []
+    for batch in match_batches(regex, text, start):
+        starts += batch[0]
+        ends += batch[1]
+    return starts, ends
+
+@pytest.mark.parametrize("pattern,flags", [(pattern, flags) for pattern, flags in PATTERNS if pattern_newline_reach(pattern, flags) is not None])
+def test_incremental_rescan_survives_edits_during_a_rescan(pattern, flags):
+    # Replays the editor's edit / rescan / finish sequence: an edit cancels the rescan in flight
+    rng = random.Random(10)
+    regex, reach = re.compile(pattern, flags), pattern_newline_reach(pattern, flags)
+    for _ in range(40):
+        text = random_text(rng, lines=30)
+        line_index, index = LineIndex(text), SpanIndex()
+        index.extend(*scan_region(regex, text, 0))
+        dirty, full, job = None, False, None
+        for _ in range(12):
+            action = rng.random()
+            if action < 0.5:
+                offset = rng.randint(0, len(text))
+                removed = rng.randint(0, min(8, len(text) - offset))
+                inserted = rng.choice(["", "x", "\n", "ERROR", "id=4", " ", "a-b\n"])
+                text = text[:offset] + inserted + text[offset + removed:]
+                line_index.patch(offset, removed, inserted)
+                if job is not None and job[0] == "full":
+                    full = True
+                else:
+                    dirty = merge_dirty_range(dirty, offset, removed, len(inserted), index.apply_edit(offset, removed, len(inserted)))
+                job = None
+            elif action < 0.8:
+                if full:
+                    index, dirty, full = SpanIndex(), None, False
+                    job = ("full", scan_region(regex, text, 0))
+                elif dirty is not None:
+                    base, scan_from, window_hi, safe_end, text_end = plan_rescan(line_index, index, reach, *dirty)
+                    job = ("region", (base, scan_from, window_hi, safe_end), scan_region(regex, text[base:text_end], scan_from - base))
+            elif job is not None:
+                if job[0] == "full":
+                    index.extend(*job[1])
+                elif splice_rescan(index, job[1], *job[2]):
+                    dirty = None
+                else:
+                    full = True
+                job = None
+        if job is not None and job[0] == "full":
+            index.extend(*job[1])
+        elif full:
+            index = SpanIndex()
+            index.extend(*scan_region(regex, text, 0))
+        elif dirty is not None:
+            base, scan_from, window_hi, safe_end, text_end = plan_rescan(line_index, index, reach, *dirty)
+            if not splice_rescan(index, (base, scan_from, window_hi, safe_end), *scan_region(regex, text[base:text_end], scan_from - base)):
+                index = SpanIndex()
+                index.extend(*scan_region(regex, text, 0))
+        assert list(zip(index.starts, index.ends)) == spans(regex, text)
+
+@pytest.mark.parametrize("pattern,severity", [
+    (r"(a+)+$", "exponential"), (r"(\w+\s?)*$", "exponential"), (r"(\d+|\w+)*$", "exponential"),
+    (r"(a|aa)+$", "exponential"), (r"(aa?)+$", "exponential"), (r"(a{1,2})+$", "exponential"), (r"\w+\s*\w+", "polynomial"),
+])
+def test_backtracking_risks_flag_slow_shapes(pattern, severity):
+    assert severity in [risk.severity for risk in backtracking_risks(pattern, 0)]
+
+@pytest.mark.parametrize("pattern", [r"ERROR", r"(ab?)+", r"(a?)+", r"(\d{1,3}\.){3}\d{1,3}", r"^[\w.-]+@[\w-]+(\.[\w-]+)+$", r"(?:ERROR|WARN):\s+(.*)"])
+def test_backtracking_risks_pass_safe_patterns(pattern):
+    assert backtracking_risks(pattern, 0) == ()
+
+def test_profile_pattern_times_prefixes_and_lines():
+    text = "a=1\n" * 100 + "b" * 50 + "\n"
+    reports = list(profile_pattern(re.compile(r"\w=\d"), text, first_prefix=64))
+    prefixes, (kind, slowest) = reports[:-1], reports[-1]
+    assert [report[0] for report in prefixes] == ["prefix"] * len(prefixes) and prefixes[-1][1] == len(text)
+    assert prefixes[-1][3] == 100 and kind == "lines" and len(slowest) == 10
+
+def test_project_files_search_and_replace(tmp_path):
+    (tmp_path / "skip").mkdir()
+    (tmp_path / "a.log").write_text("id=1 ok\r\nid=22\n", newline="")
+    (tmp_path / "b.txt").write_text("nothing here\n")
+    (tmp_path / "skip" / "c.log").write_text("id=3\n")
+    (tmp_path / "d.bin").write_bytes(b"id=4\0")
+    files = list(iter_project_files(str(tmp_path), split_globs("*.log; *.bin"), split_globs("skip")))
+    assert [os.path.basename(path) for path in files] == ["a.log", "d.bin"]
+    result = search_file(files[0], r"id=(\d+)", 0)
+    assert (result.count, [(line, column) for line, column, _ in result.matches], result.error) == (2, [(0, 0), (1, 0)], None)
+    assert search_file(files[1], "id", 0).count == 0 # Binary files are skipped
+    assert replace_in_file(files[0], r"id=(\d+)", 0, r"\1") == 2
+    assert (tmp_path / "a.log").read_bytes() == b"1 ok\r\n22\n" # Line endings survive
+    before = os.stat(tmp_path / "b.txt").st_mtime_ns
+    assert replace_in_file(str(tmp_path / "b.txt"), "id", 0, "x") == 0 and os.stat(tmp_path / "b.txt").st_mtime_ns == before
+    assert sorted(os.listdir(tmp_path)) == ["a.log", "b.txt", "d.bin", "skip"] # No temp files left behind
+
+@pytest.mark.parametrize("max_gap,max_span", [(None, 64 * 1024), (0, 64 * 1024), (5, 40), (None, 1)])
+def test_replacement_regions_rebuild_the_replaced_text(max_gap, max_span):
+    text = random_text(random.Random(11))
+    regex = re.compile(r"\d+")
+    matches = list(regex.finditer(text))
+    starts, ends = [match.start() for match in matches], [match.end() for match in matches]
+    regions = list(replacement_regions(text, starts, ends, ["#"] * len(matches), max_gap, max_span))
+    pieces, previous = [], 0
+    for lo, hi, new_text in regions:
+        assert lo >= previous and (hi - lo <= max_span or new_text == "#")
+        pieces += [text[previous:lo], new_text]
+        previous = hi
+    assert "".join(pieces) + text[previous:] == regex.sub("#", text)
+    assert len(regions) <= len(matches)
+    if max_gap is None and max_span >= len(text):
+        assert len(regions) == 1
+
+@pytest.mark.parametrize("pattern,flags", PATTERNS)
+def test_prefilter_matches_finditer(pattern, flags):
+    text = random_text(random.Random(2), lines=2000)
+    prefilter = LiteralPrefilter.for_pattern(pattern, flags)
+    if prefilter is None:
+        pytest.skip("no required literal")
+    assert [match.span() for match in prefilter.finditer(text)] == spans(re.compile(pattern, flags), text)
+
+def test_prefilter_stats_and_fallback():
+    text = "plain words here\n" * 5000 + "id=42\n" + "more words\n" * 5000
+    prefilter = LiteralPrefilter.for_pattern(r"\w+=\d+", 0)
+    assert prefilter is not None and not prefilter.anchored
+    assert [match.group() for match in prefilter.finditer(text)] == ["id=42"]
+    stats = prefilter.stats()
+    assert stats.literals == ["="] and stats.coverage < 0.01 and stats.speedup is not None
+    dense = LiteralPrefilter.for_pattern(r"\w+=\d+", 0)
+    text = "a=1\n" * 1000
+    assert [match.span() for match in dense.finditer(text)] == spans(re.compile(r"\w+=\d+"), text)
+    assert dense.fell_back and dense.stats().speedup is None
+
+def test_fused_recipe_matches_rule_by_rule():
+    rng = random.Random(8)
+    rules = [RecipeRule(r"\bERROR\b", "E", 0), RecipeRule(r"\d+", "#", 0), RecipeRule("warn", "W", re.I),
+             RecipeRule(r"x", "xx", 0), RecipeRule(r"E#", "?", 0)]
+    text = random_text(rng, lines=500)
+    expected, counts = text, []
+    for rule in rules:
+        expected, count = re.subn(rule.pattern, rule.replacement, expected, flags=rule.flags)
+        counts.append(count)
+    assert len(plan_recipe(rules)) < len(rules) # Something was fused
+    assert apply_recipe(text, rules)[:2] == (expected, counts)
+    out = []
+    assert stream_recipe(read_chunks(io.StringIO(text), 100), rules, out.append)[0] == counts
+    assert "".join(out) == expected
+
+def test_recipes_round_trip_through_an_atomic_save(tmp_path):
+    path = str(tmp_path / "config" / "recipes.json")
+    recipes = {"tidy": [RecipeRule(r"\s+$", "", re.M), RecipeRule("colour", "color", re.I)], "empty": []}
+    save_recipes(recipes, path)
+    save_recipes(recipes, path) # Replaces the file in place
+    assert load_recipes(path) == recipes
+    assert os.listdir(tmp_path / "config") == ["recipes.json"] # No temp file left behind
+    assert load_recipes(str(tmp_path / "missing.json")) == {}
+
+def test_match_batches_cover_every_match():
+    text = random_text(random.Random(3))
+    regex = re.compile(r"(\w)\w*")
+    starts, ends, replacements = [], [], []
+    for batch in match_batches(regex, text, replacement=r"\1", batch_size=7):
+        starts += batch[0]
+        ends += batch[1]
+        replacements += batch[2]
+    assert list(zip(starts, ends)) == spans(regex, text)
+    assert replacements == [match.group(1) for match in regex.finditer(text)]
+
+def test_match_batches_resume_from_start_and_report_progress():
+    text = "a1 b2 c3\n" * 10
+    batches = list(match_batches(re.compile(r"\d"), text, start=3, batch_size=4))
+    assert [len(batch[0]) for batch in batches] == [4, 4, 4, 4, 4, 4, 4, 1] and batches[-1][3] == len(text)
+    assert batches[0][:2] == (array("q", [4, 7, 10, 13]), array("q", [5, 8, 11, 14])) and batches[0][3] == 14
+
+def test_tracer_records_nested_and_deferred_operations(tmp_path):
+    finished = []
+    tracer = Tracer(enabled=True, on_finish=finished.append)
+    with tracer.start("find_all", chars=10):
+        with tracer.phase("compile"):
+            pass
+        with tracer.start("inner") as inner: # Nested operations add to the outer one
+            tracer.note(matches=3)
+        deferred = tracer.defer()
+    assert inner is deferred and finished == []
+    with tracer.resume(deferred):
+        with tracer.phase("tagging"):
+            pass
+    tracer.finish(deferred, error=None)
+    tracer.finish(deferred) # Finishing twice records it once
+    assert [operation.name for operation in finished] == ["find_all"] and list(tracer.operations) == finished
+    assert list(deferred.totals) == ["compile", "tagging"] and deferred.args == {"chars": 10, "matches": 3, "error": None}
+    path = tmp_path / "trace.json"
+    tracer.export(str(path))
+    events = json.loads(path.read_text())["traceEvents"]
+    assert [event["name"] for event in events if event["ph"] == "X"] == ["find_all", "compile", "tagging"]
+    off = Tracer()
+    with off.start("find_all") as operation, off.phase("compile"):
+        pass
+    assert operation is None and not off.operations
+
+def test_background_writer_replaces_the_file_whole(tmp_path):
+    path = tmp_path / "out.txt"
+    path.write_text("old")
+    writer = BackgroundWriter(str(path), newline="\r\n", max_pending=2)
+    for chunk in ["a\n", "wörld\n", b"raw\n"]:
+        writer.write(chunk)
+    assert path.read_text() == "old" # Nothing is visible until close()
+    writer.close()
+    assert writer.done.wait(5) and writer.error is None
+    assert path.read_bytes() == "a\r\nwörld\r\nraw\n".encode() and writer.written == len(path.read_bytes())
+    assert os.listdir(tmp_path) == ["out.txt"]
+
+def test_background_writer_abort_and_errors_leave_the_file_alone(tmp_path):
+    path = tmp_path / "out.txt"
+    path.write_text("old")
+    writer = BackgroundWriter(str(path))
+    writer.write("new")
+    writer.abort()
+    assert writer.done.wait(5) and path.read_text() == "old" and os.listdir(tmp_path) == ["out.txt"]
+    failed = BackgroundWriter(str(tmp_path / "missing" / "out.txt"))
+    failed.close()
+    assert failed.done.wait(5) and isinstance(failed.error, OSError)
+    failed.write("dropped") # Returns instead of blocking once the write has failed
+
+@pytest.mark.parametrize("pattern,flags", PATTERNS)
+def test_byte_match_positions_match_decoded_search(pattern, flags):
+    if "\\w" in pattern or "\\s" in pattern or "\\b" in pattern:
+        pytest.skip("classes only know ASCII in a bytes pattern")
+    data = random_text(random.Random(6)).encode() + b"\xff\xfe ERROR ok\n"
+    text = data.decode("utf-8", "replace")
+    found = [(line, column) for _, line, column, _, _ in byte_match_positions(data, compile_bytes_pattern(pattern, flags))]
+    expected = [(text.count("\n", 0, start), start - text.rfind("\n", 0, start) - 1) for start, _ in spans(re.compile(pattern, flags), text)]
+    assert found == expected
+
+
+@pytest.mark.parametrize("pattern,text", [(".", "é"), ("[é]", "é"), ("x*", "aé"), ("..", "€€"), (".", "aéb"), ("©", "é©")])
+def test_byte_matches_never_split_a_character(pattern, text):
+    data = text.encode()
+    positions = [(position_key(line, column), position_key(end_line, end_column))
+                 for _, line, column, end_line, end_column in byte_match_positions(data, compile_bytes_pattern(pattern, 0))]
+    starts = [start for start, _ in positions]
+    assert starts == sorted(set(starts)) # Strictly increasing, so Find Next can bisect them
+    assert all(end > start for start, end in positions if pattern != "x*")
+    assert [start for start, end in positions if start == end] == ([0, 1, 2] if pattern == "x*" else [])
+    assert all(end <= next_start for (_, end), next_start in zip(positions, starts[1:]))
+
+def test_chunkable_patterns_scan_the_same_in_blocks():
+    text = random_text(random.Random(7), lines=1000)
+    for pattern, flags in PATTERNS:
+        if not chunkable_pattern(pattern, flags):
+            continue
+        regex = re.compile(pattern, flags)
+        found = []
+        bounds = list(line_chunk_bounds(text, 97))
+        for lo, hi in bounds:
+            found += [(lo + start, lo + end) for start, end in spans(regex, text[lo:hi]) if hi == len(text) or start < hi - lo]
+        assert found == spans(regex, text), pattern
+    assert not chunkable_pattern(r"a\sb", 0) and not chunkable_pattern(r"^a", 0) and chunkable_pattern(r"^a", re.M)
+
+def test_prefilter_counts_merge_across_blocks():
+    text = "plain words here\n" * 3000 + "id=42\n" + "a=1\n" * 3000
+    blocks = [text[lo:hi] for lo, hi in line_chunk_bounds(text, 20000)]
+    prefilters = [LiteralPrefilter.for_pattern(r"\w+=\d+", 0) for _ in blocks]
+    for prefilter, block in zip(prefilters, blocks):
+        list(prefilter.finditer(block))
+    counts = [prefilter.counts() for prefilter in prefilters]
+    merged = merge_prefilter_counts(counts)
+    assert merged.scanned == sum(count.scanned for count in counts) and merged.covered == sum(count.covered for count in counts)
+    assert merged.probe_time == pytest.approx(sum(count.probe_time for count in counts))
+    assert any(count.fell_back for count in counts) and not merged.fell_back # The sparse blocks still used it
+    stats = prefilters[0].stats(merged)
+    assert stats.literals == ["="] and 0 < stats.coverage < 1 and stats.speedup is not None
+    assert prefilters[0].stats(merge_prefilter_counts(count for count in counts if count.fell_back)).speedup is None
+
+def test_group_counter_is_exact_until_full_then_bounded():
+    rng = random.Random(9)
+    counter, truth = GroupCounter(1, capacity=50), {}
+    for _ in range(50000):
+        value = str(rng.randint(0, 9)) if rng.random() < 0.5 else str(rng.randint(0, 10 ** 6))
+        counter.add(value)
+        truth[value] = truth.get(value, 0) + 1
+    assert not counter.exact and len(counter.counts) <= 100
+    for value, count, error in counter.top(10):
+        assert count - error <= truth[value] <= count
+    small = GroupCounter(1)
+    for value in "abcabca":
+        small.add(value)
+    assert small.exact and small.top() == [("a", 3, 0), ("b", 2, 0), ("c", 2, 0)]
+
+def test_histogram_buckets():
+    histogram = Histogram(1)
+    for value in ["0", "1", "1.5", "3", "-2", "nan", "x", None]:
+        histogram.add(value)
+    assert (histogram.count, histogram.skipped, histogram.min, histogram.max) == (5, 3, -2.0, 3.0)
+    assert histogram.rows() == [(-4.0, -2.0, 1), (0.0, 0.0, 1), (1.0, 2.0, 2), (2.0, 4.0, 1)]
+
+def test_extract_rows_and_aggregates():
+    regex = re.compile(r"(?P<key>\w+)=(\d+)?")
+    text = "a=1 b=\nline a=22\n"
+    output = io.StringIO()
+    counter = GroupCounter(1)
+    count = extract(read_chunks(io.StringIO(text), 3), regex, RowWriter(output, extract_columns(regex), "csv"), [counter])
+    assert count == 3 and counter.top() == [("a", 2, 0), ("b", 1, 0)]
+    assert output.getvalue().splitlines() == ["line,column,offset,match,key,2", "1,1,0,a=1,a,1", "1,5,4,b=,b,", "2,6,12,a=22,a,22"]
+
+def test_row_writer_jsonl():
+    regex = re.compile(r"(?P<key>\w+)=(\d+)?")
+    output = io.StringIO()
+    extract(read_chunks(io.StringIO("a=1 b=\n"), 4), regex, RowWriter(output, extract_columns(regex), "jsonl"))
+    assert [json.loads(row) for row in output.getvalue().splitlines()] == [
+        {"line": 1, "column": 1, "offset": 0, "match": "a=1", "key": "a", "2": "1"},
+        {"line": 1, "column": 5, "offset": 4, "match": "b=", "key": "b", "2": None}]